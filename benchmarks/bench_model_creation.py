@@ -0,0 +1,84 @@
+"""
+Benchmark: BleakModel instance creation time and memory, at 1k and 10k models.
+
+Compares the shared, class-level state machine against the previous approach,
+where every instance built its own AsyncMachine (reproduced here with `add_model`
+on a fresh machine per instance). With the shared machine, a new model only holds
+its constructor arguments: the rest of its state is created on first use.
+
+Run from the root of this repository:
+```
+poetry run python benchmarks/bench_model_creation.py
+```
+"""
+
+import gc
+import logging
+import time
+import tracemalloc
+
+from transitions.extensions.asyncio import AsyncMachine
+
+from bleak_fsm import BleakModel
+
+
+def per_instance_machine(model):
+    """
+    What `_setup_state_machine` used to do in every `__init__`.
+    """
+    machine = AsyncMachine(
+        model=None, states=list(BleakModel.machine.states), initial="Init"
+    )
+    for event in BleakModel.machine.events.values():
+        for transitions in event.transitions.values():
+            for transition in transitions:
+                machine.add_transition(
+                    trigger=event.name,
+                    source=transition.source,
+                    dest=transition.dest,
+                    conditions=[c.func for c in transition.conditions if c.target],
+                    unless=[c.func for c in transition.conditions if not c.target],
+                    before=transition.before,
+                    after=transition.after,
+                )
+    # Trigger methods already exist on the class, so transitions skips binding them:
+    # the per-instance numbers are a lower bound of the old cost.
+    machine.add_model(model)
+    return machine
+
+
+def measure(count, legacy):
+    BleakModel.instances.clear()
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    models = []
+    for _ in range(count):
+        model = BleakModel()
+        if legacy:
+            model.legacy_machine = per_instance_machine(model)
+        models.append(model)
+    elapsed = time.perf_counter() - start
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del models
+    BleakModel.instances.clear()
+    gc.collect()
+    return elapsed, current
+
+
+def main():
+    logging.getLogger("transitions.core").setLevel(logging.ERROR)
+    measure(100, legacy=False)  # warm up
+    print(f"{'models':>8} {'machine':>14} {'total (s)':>10} {'per model (us)':>15} {'memory (MB)':>12} {'per model (KB)':>15}")
+    for count in (1_000, 10_000):
+        for legacy in (False, True):  # shared first, unaffected by the legacy garbage
+            elapsed, memory = measure(count, legacy)
+            print(
+                f"{count:>8} {'per-instance' if legacy else 'shared':>14} {elapsed:>10.3f} "
+                f"{elapsed / count * 1e6:>15.1f} {memory / 1e6:>12.1f} {memory / count / 1e3:>15.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
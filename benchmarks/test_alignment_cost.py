@@ -0,0 +1,44 @@
+"""
+Benchmark: merging a 4 Hz heart rate stream and a 50 Hz power stream (an hour of each)
+into 10 Hz frames with SampleAligner, as the notifications arrive.
+
+The number of frames is in `extra_info`.
+
+Run from the root of this repository:
+```
+poetry run pytest benchmarks/test_alignment_cost.py
+```
+"""
+
+import random
+
+import pytest
+
+from bleak_fsm import SampleAligner
+
+pytest.importorskip("pytest_benchmark")
+
+SECONDS = 3600
+
+
+def arrivals(rate, latency, seed):
+    rng = random.Random(seed)
+    return [k / rate + latency + rng.uniform(0.0, 0.03) for k in range(SECONDS * rate)]
+
+
+@pytest.mark.parametrize("method", ["nearest", "linear"])
+def test_align(benchmark, method):
+    heart_rate = [(time, "heart_rate", 60.0) for time in arrivals(4, 0.02, 1)]
+    power = [(time, "power", 200.0) for time in arrivals(50, 0.01, 2)]
+    samples = sorted(heart_rate + power)
+
+    def run():
+        aligner = SampleAligner(window=0.1, method=method)
+        streams = {name: aligner.add_stream(name) for name in ("heart_rate", "power")}
+        for time, name, value in samples:
+            streams[name].add(time, value)
+        return aligner
+
+    aligner = benchmark.pedantic(run, rounds=1)
+    benchmark.extra_info["samples"] = len(samples)
+    benchmark.extra_info["frames"] = aligner.frames
@@ -0,0 +1,73 @@
+"""
+Benchmark: CPU cost of logging on the notification path, at 100k notifications.
+
+Calls the start_notify callback that BleakModel builds for a ring buffer consumer, with:
+- "off": the default configuration. Nothing is logged or formatted per notification.
+- "trace": TRACE enabled, each notification formatted and written to an in-memory stream.
+- "eager_fstring": logging disabled, but a debug message built with an f-string per notification,
+  as the model did before it used lazy `%` arguments. The message is built and thrown away.
+
+Run from the root of this repository:
+```
+poetry run pytest benchmarks/test_logging_cost.py
+```
+"""
+
+import io
+import logging
+
+import pytest
+
+from bleak_fsm import TRACE, BleakModel
+
+pytest.importorskip("pytest_benchmark")
+
+HEART_RATE_MEASUREMENT_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
+NOTIFICATIONS = 100_000
+
+logger = logging.getLogger("bleak_fsm")
+
+
+@pytest.fixture
+def handler_for(monkeypatch):
+    """
+    Build the notify handler of a streaming-ready model with the "bleak_fsm" logger at `level`.
+    """
+    original_level = logger.level
+    monkeypatch.setattr(logger, "handlers", [])
+    monkeypatch.setattr(logger, "propagate", False)
+
+    def build(level):
+        logger.setLevel(level)
+        if level == TRACE:
+            logger.addHandler(logging.StreamHandler(io.StringIO()))
+        model = BleakModel()
+        model.target = "AA:BB:CC:DD:EE:FF"
+        model.ingest(HEART_RATE_MEASUREMENT_UUID, capacity=NOTIFICATIONS)
+        model.ring_buffers[HEART_RATE_MEASUREMENT_UUID].open()
+        return model, model._make_notify_handler(HEART_RATE_MEASUREMENT_UUID, blocking=False)
+
+    yield build
+    logger.setLevel(original_level)  # setLevel, not monkeypatch, so that the isEnabledFor cache is cleared
+
+
+@pytest.mark.parametrize("mode", ["off", "trace", "eager_fstring"])
+def test_notification_logging_cost(benchmark, handler_for, mode):
+    model, handler = handler_for(TRACE if mode == "trace" else logging.WARNING)
+    data = bytearray(b"\x00\x48")
+
+    if mode == "eager_fstring":
+        inner = handler
+
+        def handler(sender, data):
+            logger.debug(
+                f"Notification from {model.target} {HEART_RATE_MEASUREMENT_UUID}: {data.hex()}"
+            )
+            inner(sender, data)
+
+    def run():
+        for _ in range(NOTIFICATIONS):
+            handler(HEART_RATE_MEASUREMENT_UUID, data)
+
+    benchmark.pedantic(run, rounds=5)
+    benchmark.extra_info["notifications"] = NOTIFICATIONS
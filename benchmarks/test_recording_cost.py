@@ -0,0 +1,69 @@
+"""
+Benchmark: persisting 100k heart rate notifications, and reading them back.
+
+- "text_file": the README quickstart handler, opening a text file and appending an f-string per notification.
+- "recorder": a NotificationRecorder, written through the notify handler BleakModel builds for `record()`.
+- "read": iterating the recording with RecordingReader.
+
+File sizes are in `extra_info`.
+
+Run from the root of this repository:
+```
+poetry run pytest benchmarks/test_recording_cost.py
+```
+"""
+
+import os
+
+import pytest
+
+from bleak_fsm import BleakModel, NotificationRecorder, RecordingReader
+
+pytest.importorskip("pytest_benchmark")
+
+HEART_RATE_MEASUREMENT_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
+NOTIFICATIONS = 100_000
+DATA = bytearray(b"\x00\x48")
+
+
+def test_text_file(benchmark, tmp_path):
+    path = tmp_path / "hr_output.txt"
+
+    def handle_hr_measurement(sender, data):
+        open(path, "a").write(
+            f"Data received from {sender}: {data}\nHeart Rate: {data[1]} beats per minute\n"
+        )
+
+    def run():
+        for _ in range(NOTIFICATIONS):
+            handle_hr_measurement(HEART_RATE_MEASUREMENT_UUID, DATA)
+
+    benchmark.pedantic(run, rounds=1)
+    benchmark.extra_info["bytes"] = os.path.getsize(path)
+
+
+def record(path):
+    with NotificationRecorder(path) as recorder:
+        model = BleakModel()
+        model.target = "AA:BB:CC:DD:EE:FF"
+        model.record(HEART_RATE_MEASUREMENT_UUID, recorder)
+        handler = model._make_notify_handler(HEART_RATE_MEASUREMENT_UUID, blocking=False)
+        for _ in range(NOTIFICATIONS):
+            handler(HEART_RATE_MEASUREMENT_UUID, DATA)
+
+
+def test_recorder(benchmark, tmp_path):
+    path = tmp_path / "hr_output.bfsm"
+    benchmark.pedantic(record, args=(path,), rounds=1)
+    benchmark.extra_info["bytes"] = os.path.getsize(path)
+
+
+def test_read(benchmark, tmp_path):
+    path = tmp_path / "hr_output.bfsm"
+    record(path)
+
+    def run():
+        with RecordingReader(path) as reader:
+            assert sum(1 for _ in reader) == NOTIFICATIONS
+
+    benchmark.pedantic(run, rounds=5)
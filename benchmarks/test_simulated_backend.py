@@ -0,0 +1,225 @@
+"""
+Benchmarks of BleakModel on the simulated backend (bleak_fsm.simulation), using pytest-benchmark.
+
+Run from the root of this repository:
+```
+poetry run pytest benchmarks
+```
+"""
+
+import asyncio
+
+import pytest
+
+from bleak_fsm import BleakFleet, BleakModel, ServiceCache, SimulatedEnvironment
+
+pytest.importorskip("pytest_benchmark")
+
+HEART_RATE_SERVICE_UUID = "180d"
+HEART_RATE_MEASUREMENT_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
+
+
+def make_environment(device_count, rate=10.0, **kwargs):
+    environment = SimulatedEnvironment(seed=0, **kwargs)
+    environment.add_devices(
+        device_count,
+        name_prefix="HRM",
+        service_uuids=[HEART_RATE_SERVICE_UUID],
+        characteristics={HEART_RATE_MEASUREMENT_UUID: rate},
+    )
+    return environment
+
+
+def ingest_heart_rate(model, address):
+    model.ingest(HEART_RATE_MEASUREMENT_UUID)
+
+
+def register_all(environment):
+    BleakModel.bt_devices.clear()
+    for address, device in environment.devices.items():
+        BleakModel.bt_devices[address] = (device.ble_device, device.advertisement_data)
+
+
+@pytest.mark.parametrize("filtered", [False, True], ids=["unfiltered", "name_prefix"])
+def test_scan_ingest_rate(benchmark, filtered):
+    """
+    Advertisements per second through the detection callback, coalescer and registry.
+    """
+    advertisements = 100_000
+    environment = make_environment(5_000)
+    environment.add_devices(5_000, name_prefix="Phone")
+
+    async def ingest():
+        await BleakModel.start_scan(name_prefix="HRM" if filtered else None)
+        await asyncio.sleep(0)  # let the scan worker start the scanner
+        environment.scanners[0].burst(advertisements)
+        await BleakModel.stop_scan()
+        await asyncio.sleep(0)
+
+    with environment.install():
+        benchmark.pedantic(lambda: asyncio.run(ingest()), rounds=5)
+    benchmark.extra_info["advertisements"] = advertisements
+    benchmark.extra_info["devices_stored"] = len(BleakModel.bt_devices)
+    BleakModel.bt_devices.clear()
+
+
+def test_connect_throughput(benchmark):
+    """
+    Time to bring 100 devices with 20 ms connect latency to Streaming, 8 connects at a time.
+    """
+    environment = make_environment(100, connect_latency=0.02, latency_jitter=0.5)
+
+    async def connect_all():
+        fleet = BleakFleet(
+            environment.devices, configure=ingest_heart_rate, max_concurrent_connects=8
+        )
+        results = await fleet.start()
+        await fleet.clean_up()
+        return results
+
+    with environment.install():
+        register_all(environment)
+        results = benchmark.pedantic(
+            lambda: asyncio.run(connect_all()), setup=lambda: register_all(environment), rounds=3
+        )
+    assert all(result.ok for result in results.values())
+    BleakModel.bt_devices.clear()
+
+
+@pytest.mark.parametrize("cached", [False, True], ids=["full_discovery", "service_cache"])
+def test_connect_to_streaming_time(benchmark, tmp_path, monkeypatch, cached):
+    """
+    Time for 10 known devices to go from TargetSet to Streaming,
+    with service discovery costing 150 ms per service (3 services per device).
+    """
+    environment = make_environment(10, discovery_latency=0.15)
+    if cached:
+        cache = ServiceCache(tmp_path / "services.json")
+        for address, device in environment.devices.items():
+            cache.put(address, device.ble_device, device.advertisement_data, device.gatt_services)
+        monkeypatch.setattr(BleakModel, "service_cache", cache)
+
+    async def connect_all():
+        fleet = BleakFleet(
+            environment.devices, configure=ingest_heart_rate, max_concurrent_connects=10
+        )
+        results = await fleet.start()
+        await fleet.clean_up()
+        return results
+
+    with environment.install():
+        results = benchmark.pedantic(
+            lambda: asyncio.run(connect_all()), setup=lambda: register_all(environment), rounds=3
+        )
+    assert all(result.ok for result in results.values())
+    BleakModel.bt_devices.clear()
+
+
+@pytest.mark.parametrize("mode", ["awaited_writes", "send_command"])
+def test_control_loop_time(benchmark, mode):
+    """
+    Time for a control loop to push 100 setpoints, one every 5 ms, to a trainer
+    whose acknowledged writes take a 20 ms round trip.
+    "awaited_writes" awaits `write_gatt_char(..., response=True)` for each setpoint;
+    "send_command" queues them with send_command() and waits for the last one.
+    """
+    environment = make_environment(1, write_latency=0.02)
+    address = next(iter(environment.devices))
+    writes = []
+
+    async def control_loop():
+        model = BleakModel()
+        await model.set_target(address)
+        await model.connect()
+        for watts in range(100):
+            if mode == "awaited_writes":
+                await model.bleak_client.write_gatt_char(
+                    HEART_RATE_MEASUREMENT_UUID, bytes([watts]), response=True
+                )
+            else:
+                last = model.send_command(HEART_RATE_MEASUREMENT_UUID, bytes([watts]))
+            await asyncio.sleep(0.005)
+        if mode == "send_command":
+            assert await last
+        writes.append(len(model.bleak_client.writes))
+        await model.clean_up()
+
+    with environment.install():
+        benchmark.pedantic(
+            lambda: asyncio.run(control_loop()), setup=lambda: register_all(environment), rounds=3
+        )
+    benchmark.extra_info["writes"] = writes[-1]
+    BleakModel.bt_devices.clear()
+
+
+@pytest.mark.parametrize("consumer", ["on_measurement", "ring_buffer"])
+def test_notification_throughput(benchmark, consumer):
+    """
+    Notifications per second delivered from 10 devices at 2 kHz each for one second.
+    """
+    environment = make_environment(10, rate=2_000.0)
+    duration = 1.0
+
+    async def stream_all():
+        received = 0
+
+        def count(measurement):
+            nonlocal received
+            received += 1
+
+        def configure(model, address):
+            if consumer == "on_measurement":
+                model.on_measurement(HEART_RATE_MEASUREMENT_UUID, count)
+            else:
+                model.ingest(HEART_RATE_MEASUREMENT_UUID, capacity=8192)
+
+        fleet = BleakFleet(environment.devices, configure=configure)
+        await fleet.start()
+        await asyncio.sleep(duration)
+        await fleet.clean_up()
+        if consumer == "ring_buffer":
+            for model in fleet.models.values():
+                async for batch in model.ring_buffers[HEART_RATE_MEASUREMENT_UUID]:
+                    received += len(batch)
+        return received
+
+    with environment.install():
+        received = benchmark.pedantic(
+            lambda: asyncio.run(stream_all()), setup=lambda: register_all(environment), rounds=3
+        )
+    benchmark.extra_info["notifications_per_second"] = received / duration
+    BleakModel.bt_devices.clear()
+
+
+def test_teardown_time(benchmark):
+    """
+    Time to clean up 40 streaming devices that each take 100 ms to disconnect.
+    """
+    environment = make_environment(40, disconnect_latency=0.1)
+    fleet_holder = {}
+
+    async def start():
+        fleet = BleakFleet(
+            environment.devices, configure=ingest_heart_rate, max_concurrent_connects=40
+        )
+        await fleet.start()
+        return fleet
+
+    async def teardown():
+        return await fleet_holder["fleet"].clean_up()
+
+    def setup():
+        register_all(environment)
+        fleet_holder["loop"] = asyncio.new_event_loop()
+        fleet_holder["fleet"] = fleet_holder["loop"].run_until_complete(start())
+
+    def run():
+        try:
+            return fleet_holder["loop"].run_until_complete(teardown())
+        finally:
+            fleet_holder["loop"].close()
+
+    with environment.install():
+        results = benchmark.pedantic(run, setup=setup, rounds=3)
+    assert all(result.state == "Init" for result in results.values())
+    BleakModel.bt_devices.clear()
@@ -1 +1,18 @@
-from .bleak_model import BleakModel
+from .adapter import Adapter
+from .alignment import AlignedFrame, AlignedStream, ClockEstimate, SampleAligner
+from .bleak_model import TRACE, BleakModel
+from .coalescer import AdvertisementCoalescer, DeviceSubscription
+from .command_queue import CommandQueue
+from .decoders import decode, decode_batch, get_decoder, register_decoder
+from .events import DeviceSummary, Event, EventStream, Snapshot, StateChange
+from .fleet import BleakFleet, FleetResult
+from .metrics import InMemoryMetrics, MetricsSink, PrometheusExporter, StreamStats
+from .notification_queue import Notification, NotificationQueue
+from .polling import PollScheduler, PollStats
+from .recorder import NotificationRecorder, RecordedNotification, RecordingReader, ReplaySource
+from .registry import DeviceRecord, DeviceRegistry
+from .ring_buffer import NotificationRingBuffer, RingBatch
+from .service_cache import ServiceCache
+from .sharding import ModelProxy, ShardSupervisor
+from .simulation import SimulatedCharacteristic, SimulatedDevice, SimulatedEnvironment
+from .supervisor import TaskSupervisor
@@ -0,0 +1,346 @@
+"""
+This module contains the Adapter class, which represents one Bluetooth controller (e.g. "hci0"),
+and the placement policies that pick an adapter for a connection.
+
+Each adapter owns its own scanner, registry of discovered devices and connection limit.
+BleakModel uses `BleakModel.default_adapter` (the OS default controller) unless
+`BleakModel.adapters` lists several of them, or a model is bound to one:
+
+    BleakModel.adapters = [Adapter("hci0", max_connections=7), Adapter("hci1", max_connections=7)]
+    await BleakModel.start_scan()  # scans on every adapter
+    model = BleakModel()  # placed on an adapter at connect time, see BleakModel.placement
+    pinned = BleakModel(adapter=BleakModel.adapters[1])
+
+Connection capacity grows with the number of controllers:
+a model only connects through an adapter with a free connection slot.
+"""
+
+import asyncio
+import logging
+
+from .coalescer import AdvertisementCoalescer, DeviceSubscription
+from .registry import DeviceRegistry
+from .scan_filter import make_scan_filter
+from .supervisor import TaskSupervisor
+
+logger = logging.getLogger(__name__)
+
+
+class Adapter:
+    """
+    One Bluetooth controller. `name` is passed to the scanner and clients as `adapter=`
+    (BlueZ, e.g. "hci1"); None is the OS default. `max_connections` bounds the models
+    connected through it at once; None means no limit.
+
+    Backend classes and scan settings (`scanner_class`, `coalesce_interval`, `scan_stop_timeout`)
+    are read from `model_class` (BleakModel).
+    """
+
+    # If set, stop_scan() saves bt_devices to this file, see save_snapshot().
+    snapshot_path = None
+
+    def __init__(self, name=None, max_connections=None, bt_devices=None, model_class=None):
+        if model_class is None:
+            from .bleak_model import BleakModel as model_class
+        self.name = name
+        self.max_connections = max_connections
+        self.model_class = model_class
+        self._bt_devices = DeviceRegistry(max_size=4096) if bt_devices is None else bt_devices
+        self.connections = 0  # connection slots held by models, see acquire()
+
+        self._stop_scan_event = asyncio.Event()
+        # Owns the scan worker task, so that stop_scan() can wait for the scanner to be down.
+        self._scan_tasks = TaskSupervisor()
+        self.last_scan_error = None  # exception that ended the last scan, if any
+        self._coalescer = None
+        self._device_subscriptions = []  # see on_device_seen()
+        self._watched_devices = None  # registry whose removals are forwarded to the subscriptions
+
+        # Connect-on-discovery, see BleakModel.set_target(address, discover=True).
+        self._pending_targets = {}  # address -> set of futures resolved when the scanner sees it
+        self._scanning = False
+        self._auto_scan = False  # the running scan was started for pending targets, and stops when they're found
+
+    def __repr__(self):
+        return f"Adapter({self.name!r}, connections={self.connections}, max_connections={self.max_connections})"
+
+    @property
+    def bt_devices(self):
+        """
+        The DeviceRegistry of devices seen by this adapter's scanner.
+        """
+        return self._bt_devices
+
+    def backend_kwargs(self):
+        """
+        Keyword arguments that select this adapter in BleakScanner and BleakClient.
+        """
+        return {} if self.name is None else {"adapter": self.name}
+
+    def has_capacity(self):
+        return self.max_connections is None or self.connections < self.max_connections
+
+    def acquire(self):
+        """
+        Take a connection slot. Returns False if the adapter is full.
+        """
+        if not self.has_capacity():
+            return False
+        self.connections += 1
+        return True
+
+    def release(self):
+        self.connections = max(0, self.connections - 1)
+
+    def on_device_seen(
+        self,
+        callback,
+        min_interval=0.0,
+        rssi_delta=None,
+        name_changes=False,
+        manufacturer_data_changes=False,
+    ):
+        """
+        Subscribe to devices discovered by this adapter. See BleakModel.on_device_seen().
+        """
+        subscription = DeviceSubscription(
+            callback,
+            min_interval=min_interval,
+            rssi_delta=rssi_delta,
+            name_changes=name_changes,
+            manufacturer_data_changes=manufacturer_data_changes,
+        )
+        subscription._unsubscribe = self._device_subscriptions.remove
+        self._device_subscriptions.append(subscription)
+        return subscription
+
+    def _apply_advertisements(self, batch):
+        """
+        Sink of the advertisement coalescer: update bt_devices and notify subscribers.
+        """
+        bt_devices = self.bt_devices
+        if bt_devices is not self._watched_devices:
+            if self._watched_devices is not None:
+                self._watched_devices.remove_listener(self._device_changed)
+            bt_devices.add_listener(self._device_changed)
+            self._watched_devices = bt_devices
+        subscriptions = tuple(self._device_subscriptions)  # callbacks may unsubscribe
+        for device, advertisement_data in batch:
+            record = bt_devices.add(device, advertisement_data)
+            for subscription in subscriptions:
+                subscription.offer(record)
+
+    def _device_changed(self, change, record):
+        if change == "removed":
+            for subscription in self._device_subscriptions:
+                subscription.forget(record.address)
+
+    async def _start_scan(
+        self,
+        service_uuids=None,
+        name_prefix=None,
+        min_rssi=None,
+        address_allowlist=None,
+        clear=True,
+    ):
+        """
+        Worker that runs the BLE scan.
+        """
+        if clear:
+            self.bt_devices.clear()  # clear the list
+        for subscription in self._device_subscriptions:
+            subscription.reset()
+
+        if self._coalescer is not None:
+            self._coalescer.clear()
+        self._coalescer = AdvertisementCoalescer(
+            self._apply_advertisements, interval=self.model_class.coalesce_interval
+        )
+        push = self._coalescer.push
+        accept = make_scan_filter(
+            name_prefix=name_prefix,
+            min_rssi=min_rssi,
+            address_allowlist=address_allowlist,
+        )
+        pending = self._pending_targets
+
+        def detection_callback(device, advertisement_data):
+            # pending targets skip the filters and the coalescing delay
+            if pending and device.address in pending:
+                self._target_found(device, advertisement_data)
+            elif accept is None or accept(device, advertisement_data):
+                push(device, advertisement_data)
+
+        async with self.model_class.scanner_class(
+            detection_callback,
+            service_uuids=list(service_uuids) if service_uuids else None,
+            **self.backend_kwargs(),
+        ) as scanner:
+            await self._stop_scan_event.wait()  # continues to scan until stop_scan_event is set
+        self._coalescer.flush()
+        return True
+
+    async def start_scan(
+        self,
+        service_uuids=None,
+        name_prefix=None,
+        min_rssi=None,
+        address_allowlist=None,
+        clear=True,
+    ):
+        """
+        Non-blocking start of the BLE scan on this adapter. See BleakModel.start_scan().
+        """
+        # a previous scan must be fully down before the next scanner starts.
+        # A scan running for pending targets is restarted with these filters, and keeps looking for them
+        # (they bypass the filters, but not `service_uuids`, which the backend applies) until stop_scan().
+        self._auto_scan = False
+        self._stop_scan_event.set()
+        await self._scan_tasks.shutdown("scan", grace=self.model_class.scan_stop_timeout)
+        self._spawn_scan(
+            service_uuids=service_uuids,
+            name_prefix=name_prefix,
+            min_rssi=min_rssi,
+            address_allowlist=address_allowlist,
+            clear=clear,
+        )
+        return True
+
+    def _spawn_scan(self, **kwargs):
+        # A fresh event per scan, created before the worker starts,
+        # so that a stop_scan() issued right away isn't lost, and so that it belongs to the running loop.
+        self._stop_scan_event = asyncio.Event()
+        self._scanning = True
+        self.last_scan_error = None
+        self._scan_tasks.spawn(
+            self._start_scan(**kwargs), name="scan", on_error=self._on_scan_error
+        )
+
+    def _on_scan_error(self, name, error):
+        """
+        The scan worker raised (e.g. no Bluetooth adapter). Models waiting to discover a target
+        stop waiting, and their connect() fails.
+        """
+        logger.error("The scan on %s failed. Error: %r", self.name or "the default adapter", error)
+        self.last_scan_error = error
+        self._scanning = False
+        self._auto_scan = False
+        self._drop_pending_targets()
+
+    def _drop_pending_targets(self):
+        """
+        Resolve the futures of pending targets with None, since no scan will see them.
+        """
+        pending = list(self._pending_targets.values())
+        self._pending_targets.clear()
+        for futures in pending:
+            for future in futures:
+                if not future.done():
+                    future.set_result(None)
+
+    async def stop_scan(self):
+        """
+        Stop the BLE scan, and wait until the scanner is stopped.
+        Models waiting to discover a target stop waiting, and their connect() fails.
+        """
+        self._stop_scan_event.set()
+        self._scanning = False
+        self._auto_scan = False
+        self._drop_pending_targets()
+        await self._scan_tasks.shutdown("scan", grace=self.model_class.scan_stop_timeout)
+        if self._coalescer is not None:
+            self._coalescer.flush()  # make everything seen so far visible in bt_devices
+        if self.snapshot_path is not None:
+            self.save_snapshot()
+        return True
+
+    def _expect(self, address):
+        """
+        Future resolved with the DeviceRecord of `address` when the scanner sees it.
+        Starts a scan (without clearing bt_devices) if none is running.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending_targets.setdefault(address, set()).add(future)
+        if not self._scanning:
+            self._spawn_scan(clear=False)
+            self._auto_scan = True
+        return future
+
+    def _forget(self, address, future):
+        """
+        Stop waiting for `address` with `future`. Stops a scan started for pending targets
+        once there are none left.
+        """
+        futures = self._pending_targets.get(address)
+        if futures is not None:
+            futures.discard(future)
+            if not futures:
+                del self._pending_targets[address]
+        if not self._pending_targets and self._scanning and self._auto_scan:
+            self._stop_scan_event.set()
+            self._scanning = False
+            self._auto_scan = False
+
+    def _target_found(self, device, advertisement_data):
+        """
+        A pending target advertised: store it right away (bypassing the coalescer)
+        and wake up the models waiting for it.
+        """
+        self._apply_advertisements(((device, advertisement_data),))
+        record = self.bt_devices.get(device.address)
+        for future in list(self._pending_targets.get(device.address, ())):
+            if not future.done():
+                future.set_result(record)
+            self._forget(device.address, future)
+
+    def save_snapshot(self, path=None):
+        """
+        Save address, name, RSSI, service UUIDs and last-seen time of bt_devices
+        to `path` (default: `snapshot_path`). Returns False if it couldn't be written.
+        """
+        path = path or self.snapshot_path
+        try:
+            self.bt_devices.save(path)
+            return True
+        except Exception as e:
+            logger.warning("Could not save the device snapshot to %s. Error: %s", path, e)
+            return False
+
+    def load_snapshot(self, path=None, max_age=None):
+        """
+        Add the devices saved by save_snapshot() to bt_devices. See BleakModel.load_snapshot().
+        Returns the number of devices loaded.
+        """
+        path = path or self.snapshot_path
+        try:
+            return self.bt_devices.load(path, max_age=max_age)
+        except Exception as e:
+            logger.warning("Could not load the device snapshot from %s. Error: %s", path, e)
+            return 0
+
+
+def _rssi(adapter, address):
+    record = adapter.bt_devices.get(address)
+    rssi = None if record is None else record.rssi
+    return float("-inf") if rssi is None else rssi
+
+
+def least_connections(adapters, address):
+    """
+    Placement policy: the adapter with the fewest connections. Ties go to the best RSSI.
+    """
+    return min(adapters, key=lambda adapter: (adapter.connections, -_rssi(adapter, address)))
+
+
+def best_rssi(adapters, address):
+    """
+    Placement policy: the adapter that received the target's last advertisement the strongest.
+    Ties go to the fewest connections.
+    """
+    return min(adapters, key=lambda adapter: (-_rssi(adapter, address), adapter.connections))
+
+
+PLACEMENT_POLICIES = {
+    "least_connections": least_connections,
+    "best_rssi": best_rssi,
+}
@@ -0,0 +1,266 @@
+"""
+This module contains the SampleAligner class, which merges the streams of several devices
+(e.g. heart rate from one sensor, power from another) into time-aligned frames as notifications arrive,
+instead of aligning them in a post-processing pass.
+
+Streams are fed by `BleakModel.align()` with the host arrival time (time.monotonic) of each notification.
+Arrival times include the latency of each link, which varies with its connection interval,
+so a ClockEstimate per stream tracks the device's sending cadence and places every sample
+at its estimated send time, estimating on the way how far arrivals lag behind (`offset`)
+and how much they scatter (`jitter`).
+
+A frame is emitted every `window` seconds of host time, as soon as every stream has a sample
+at or past the frame time (or `max_delay` seconds later, for streams that fell silent).
+Each stream's value is taken from its nearest sample, or interpolated linearly between the two
+around the frame time. The work is O(1) per sample (amortized), plus O(streams) per frame.
+"""
+
+import logging
+import math
+import numbers
+from collections import deque, namedtuple
+
+from .notification_queue import NotificationQueue
+
+logger = logging.getLogger(__name__)
+
+ALIGNMENT_METHODS = ("nearest", "linear")
+
+# `time` is the host time (time.monotonic) of the frame, `values` maps stream names to values,
+# None for streams without a sample within the tolerance.
+AlignedFrame = namedtuple("AlignedFrame", ["time", "values"])
+
+
+class ClockEstimate:
+    """
+    Cadence of a device's notifications, estimated from their arrival times with exponential
+    moving averages (weight `gain`, after `warmup` notifications).
+
+    `interval` is the time between notifications, `offset` the lag of arrivals behind the
+    estimated send times, and `jitter` the standard deviation of that lag. Arrival times only bound
+    the latency from below, so `offset` is relative to the least delayed arrivals, not absolute.
+    """
+
+    __slots__ = ("gain", "warmup", "count", "interval", "offset", "_variance", "_last_arrival", "_last")
+
+    def __init__(self, gain=0.05, warmup=3):
+        self.gain = gain
+        self.warmup = warmup
+        self.count = 0
+        self.interval = 0.0
+        self.offset = 0.0
+        self._variance = 0.0
+        self._last_arrival = None
+        self._last = None  # estimated send time of the previous notification
+
+    @property
+    def jitter(self):
+        return math.sqrt(self._variance)
+
+    def correct(self, arrival):
+        """
+        Return the estimated send time of a notification that arrived at `arrival`.
+        """
+        self.count += 1
+        if self._last is None:
+            self._last_arrival = self._last = arrival
+            return arrival
+        steps = 1
+        if self.count <= self.warmup or self.interval <= 0.0:
+            time = arrival
+        else:
+            # more than one interval if notifications were lost
+            steps = max(1, round((arrival - self._last) / self.interval))
+            predicted = self._last + steps * self.interval
+            residual = arrival - predicted
+            # an early arrival is the least delayed one yet; late ones nudge the estimate
+            time = arrival if residual < 0 else predicted + self.gain * residual
+        weight = max(self.gain, 1 / (self.count - 1))
+        self.interval += weight * ((arrival - self._last_arrival) / steps - self.interval)
+        lag = arrival - time
+        delta = lag - self.offset
+        self.offset += weight * delta
+        self._variance = (1 - weight) * (self._variance + weight * delta * delta)
+        self._last_arrival = arrival
+        self._last = time
+        return time
+
+    def __repr__(self):
+        return (
+            f"ClockEstimate(interval={self.interval:.4f}, offset={self.offset:.4f}, "
+            f"jitter={self.jitter:.4f})"
+        )
+
+
+class AlignedStream:
+    """
+    One input of a SampleAligner, created by `SampleAligner.add_stream()`.
+    Notifications are decoded by `decoder` (if any) and mapped through `value` (if given).
+    """
+
+    __slots__ = ("aligner", "name", "decoder", "value", "clock", "samples", "latest", "count")
+
+    def __init__(self, aligner, name, decoder=None, value=None):
+        self.aligner = aligner
+        self.name = name
+        self.decoder = decoder
+        self.value = value
+        self.clock = ClockEstimate()
+        self.samples = deque()  # (time, value), from the last one before the next frame
+        self.latest = None  # time of the newest sample
+        self.count = 0
+
+    def add(self, timestamp, data):
+        """
+        Feed a notification payload that arrived at `timestamp`.
+        """
+        try:
+            value = data if self.decoder is None else self.decoder.decode(data)
+            if self.value is not None:
+                value = self.value(value)
+        except Exception as e:
+            logger.error(
+                "An error occurred while decoding a sample of %s. Error: %s", self.name, e
+            )
+            return
+        self.count += 1
+        self.aligner._add(self, timestamp, value)
+
+    def _value_at(self, time, method, tolerance):
+        samples = self.samples
+        while len(samples) >= 2 and samples[1][0] <= time:
+            samples.popleft()
+        if not samples:
+            return None
+        if samples[0][0] <= time:
+            before = samples[0]
+            after = samples[1] if len(samples) >= 2 else None
+        else:
+            before, after = None, samples[0]
+        if method == "linear" and before is not None and after is not None:
+            (t0, v0), (t1, v1) = before, after
+            if _is_number(v0) and _is_number(v1):
+                if tolerance is None or (time - t0 <= tolerance and t1 - time <= tolerance):
+                    return v0 + (v1 - v0) * (time - t0) / (t1 - t0)
+        candidates = [sample for sample in (before, after) if sample is not None]
+        sample_time, value = min(candidates, key=lambda sample: abs(sample[0] - time))
+        if tolerance is not None and abs(sample_time - time) > tolerance:
+            return None
+        return value
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+class SampleAligner:
+    """
+    Merges streams into AlignedFrame tuples every `window` seconds.
+
+    `method` is "nearest" or "linear" (values that aren't numbers fall back to the nearest sample).
+    With `tolerance` (seconds), a stream whose samples are all further than that from a frame
+    gets None in it. Frames wait up to `max_delay` seconds (of arrival time) for the slowest stream.
+    With `correct_clocks`, samples are placed at their estimated send time (see ClockEstimate)
+    rather than their arrival time.
+
+    Frames are passed to `on_frame` and to the queues returned by `iter_frames()`.
+    """
+
+    def __init__(
+        self,
+        window=0.1,
+        method="nearest",
+        tolerance=None,
+        max_delay=1.0,
+        correct_clocks=True,
+        on_frame=None,
+    ):
+        if method not in ALIGNMENT_METHODS:
+            raise ValueError(f"method must be one of {ALIGNMENT_METHODS}, got {method!r}")
+        self.window = window
+        self.method = method
+        self.tolerance = tolerance
+        self.max_delay = max_delay
+        self.correct_clocks = correct_clocks
+        self.on_frame = on_frame
+        self.streams = {}  # name -> AlignedStream
+        self.frames = 0  # emitted so far
+        self._next = None  # time of the next frame
+        self._ready = 0  # streams with a sample at or past the next frame
+        self._queues = []
+
+    def add_stream(self, name, decoder=None, value=None):
+        """
+        Add an input, and return its AlignedStream. See BleakModel.align().
+        """
+        if name in self.streams:
+            raise ValueError(f"A stream named {name!r} was already added")
+        stream = self.streams[name] = AlignedStream(self, name, decoder=decoder, value=value)
+        return stream
+
+    def iter_frames(self, maxsize=256, overflow="drop_oldest"):
+        """
+        Consume frames with `async for frame in aligner.iter_frames(): ...`, through a NotificationQueue.
+        Iteration ends when the aligner is closed.
+        """
+        if overflow == "block":
+            raise ValueError("Frames are emitted from notification handlers, which can't wait")
+        queue = NotificationQueue(maxsize=maxsize, overflow=overflow)
+        self._queues.append(queue)
+        return queue
+
+    def clock_estimates(self):
+        """
+        ClockEstimate of each stream, by name.
+        """
+        return {name: stream.clock for name, stream in self.streams.items()}
+
+    def _add(self, stream, arrival, value):
+        time = stream.clock.correct(arrival) if self.correct_clocks else arrival
+        stream.samples.append((time, value))
+        if self._next is None:
+            self._next = math.ceil(time / self.window) * self.window
+        if (stream.latest is None or stream.latest < self._next) and time >= self._next:
+            self._ready += 1
+        stream.latest = time
+        while self._ready == len(self.streams) or arrival >= self._next + self.max_delay:
+            self._emit()
+
+    def _emit(self):
+        time = self._next
+        values = {
+            name: stream._value_at(time, self.method, self.tolerance)
+            for name, stream in self.streams.items()
+        }
+        frame = AlignedFrame(time, values)
+        self.frames += 1
+        self._next = time + self.window
+        self._ready = sum(
+            1
+            for stream in self.streams.values()
+            if stream.latest is not None and stream.latest >= self._next
+        )
+        if self.on_frame is not None:
+            try:
+                self.on_frame(frame)
+            except Exception as e:
+                logger.error("An error occurred while handling an aligned frame. Error: %s", e)
+        for queue in self._queues:
+            queue.put(frame)
+
+    def flush(self):
+        """
+        Emit the frames up to the newest sample of any stream, without waiting for the others.
+        """
+        latest = [stream.latest for stream in self.streams.values() if stream.latest is not None]
+        while latest and self._next <= max(latest):
+            self._emit()
+
+    def close(self):
+        """
+        Flush, and end the iteration of the frame queues.
+        """
+        self.flush()
+        for queue in self._queues:
+            queue.close()
+        self._queues = []
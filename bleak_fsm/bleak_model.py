@@ -10,17 +10,101 @@ You are responsible for dealing with transitions that weren't successful.
 """
 
 import asyncio
+import functools
 import logging
+import random
+import time
+import weakref
 
 from bleak import BleakClient, BleakScanner
+from bleak.uuids import normalize_uuid_str
+
+from .adapter import PLACEMENT_POLICIES, Adapter
+from .coalescer import DeviceSubscription
+from .command_queue import CommandQueue
+from .decoders import get_decoder
+from .metrics import MetricsSink, StreamStats
+from .notification_queue import Notification, NotificationQueue
+from .polling import PollScheduler, PollStats
+from .recorder import ReplaySource
+from .registry import DeviceRegistry
+from .ring_buffer import NotificationRingBuffer
+from .service_cache import record_hash, service_table
+from .supervisor import TaskSupervisor
 
 # typing
-from transitions.extensions.asyncio import AsyncMachine
+from transitions.core import MachineError
+from transitions.extensions.asyncio import AsyncEventData, AsyncMachine
 from bleak.backends.device import BLEDevice
 from bleak.backends.scanner import AdvertisementData
 
+logger = logging.getLogger(__name__)
+
+# Below DEBUG. Only at this level is anything logged per notification:
+# logging.getLogger("bleak_fsm").setLevel(bleak_fsm.TRACE)
+TRACE = 5
+logging.addLevelName(TRACE, "TRACE")
+
+# Disconnections left to finish in the background by cancelled transitions, see _abandon_connection().
+_detached = set()
+
+
+def _per_instance(factory):
+    """
+    A class attribute that gives each instance its own `factory()`, created on first access.
+    Most models never use most of their optional state, so BleakModel() doesn't build it.
+    """
+    return functools.cached_property(lambda self: factory())
+
+
+def _detach(coroutine, description):
+    """
+    Run `coroutine` without waiting for it, logging its failure.
+    """
+    task = asyncio.ensure_future(coroutine)
+    _detached.add(task)
+
+    def done(task):
+        _detached.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Failed %s in the background. Error: %r", description, task.exception())
+
+    task.add_done_callback(done)
+    return task
+
 
-class BleakModel:
+class _BleakModelType(type):
+    """
+    Metaclass of BleakModel. Makes `bt_devices` a class property, so that assigning a plain dict
+    (`BleakModel.bt_devices = {address: (device, advertisement_data)}`, as in earlier versions)
+    loads it into the registry instead of replacing the registry with the dict.
+    Assigning a DeviceRegistry replaces the registry.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        registry = namespace.get("bt_devices")
+        if isinstance(registry, DeviceRegistry):
+            namespace["_bt_devices"] = registry
+            # instances read the registry of their class
+            namespace["bt_devices"] = property(lambda self: type(self).bt_devices)
+        return super().__new__(mcs, name, bases, namespace)
+
+    @property
+    def bt_devices(cls):
+        return cls._bt_devices
+
+    @bt_devices.setter
+    def bt_devices(cls, devices):
+        if isinstance(devices, DeviceRegistry):
+            cls._bt_devices = devices
+            return
+        registry = cls._bt_devices
+        registry.clear()
+        for address, (device, advertisement_data) in dict(devices).items():
+            registry[address] = (device, advertisement_data)
+
+
+class BleakModel(metaclass=_BleakModelType):
     """
     This class is a transitions.AsyncModel wrapper around the BleakScanner class.
     It is used to scan and receive data for Bluetooth Low Energy devices,
@@ -35,13 +119,132 @@ class BleakModel:
     dealing with transitions that weren't successful.
     """
 
-    # class variable to store all instances of BleakModel, for easy cleanup
-    instances = []
+    # class variable to track live instances of BleakModel, for easy cleanup.
+    # Weak references, so that models that are no longer used can be garbage collected.
+    # Instances leave the set when cleaned up back to Init, and re-join on set_target().
+    instances = weakref.WeakSet()
+
+    # class variable to store the discovered devices, shared with `default_adapter`.
+    # Bounded so that long scans in busy environments don't grow memory without limit.
+    # Replace with DeviceRegistry(max_size=..., ttl=...) to tune eviction.
+    # Assigning a dict of address -> (BLEDevice, AdvertisementData) loads it into the registry.
+    bt_devices = DeviceRegistry(max_size=4096)
 
-    # class variable to store the discovered devices, since we can only have one BleakScanner
-    bt_devices = {}
+    # If set, stop_scan() saves bt_devices to this file, and load_snapshot() reads it.
+    # Restored devices can be targeted right away, without scanning first.
+    snapshot_path = None
 
-    _stop_scan_event = asyncio.Event()  # class variable to stop the scan
+    # Bluetooth controllers (see bleak_fsm.adapter). `default_adapter` is the OS default one,
+    # with bt_devices as its registry. List several Adapters in `adapters` to scan on all of them
+    # and place each connection on one according to `placement` ("least_connections", "best_rssi",
+    # or a callable taking the candidate adapters and the address). Bind a model with BleakModel(adapter=...).
+    default_adapter = None  # set below the class
+    adapters = []
+    placement = "least_connections"
+
+    scan_stop_timeout = 2.0  # seconds stop_scan() waits for the scanner before cancelling it
+
+    # Bluetooth backend. Point these at bleak_fsm.simulation classes
+    # (or use SimulatedEnvironment.install) to run without a Bluetooth adapter.
+    scanner_class = BleakScanner
+    client_class = BleakClient
+
+    # Optional ServiceCache (see bleak_fsm.service_cache). When set, reconnecting to a known device
+    # only discovers the services the model needs.
+    service_cache = None
+
+    # Advertisements are deduplicated per address and applied to bt_devices
+    # in batches every `coalesce_interval` seconds. Set to 0 to apply each one immediately.
+    coalesce_interval = 0.05
+
+    # Transition timings and stream counters are reported here (see bleak_fsm.metrics).
+    # The default sink discards them. Assign to an instance to keep its metrics separate.
+    metrics = MetricsSink()
+
+    # Optional EventStream (see bleak_fsm.events). When set, every state change is published to it.
+    events = None
+
+    # Runs the periodic reads of poll() for all models, off a single timer wheel (see bleak_fsm.polling).
+    poll_scheduler = PollScheduler()
+
+    # --- Per-model state, overridden on the instance when it changes ---
+    target = None
+    bleak_client: BleakClient = None
+    ble_device: BLEDevice = None
+    advertisement_data: AdvertisementData = None
+    wrapped_client = None
+    _device_key = None  # service cache key of the device, see _connect_client()
+    _holds_connection = False  # whether we took one of self.adapter's connection slots
+    _discovery = None  # future resolved when the target is discovered by any adapter
+    _discovery_deadline = None
+    _expected_disconnect = False
+    _resume_state = None
+    _reconnect_task = None
+    _confirm_task = None  # looks up a device restored from a snapshot, see _set_target()
+    last_error = None  # the exception of the last failed background task
+    # Why the last transition failed: "timeout", "exception", "missing_device" or "no_capacity"
+    _failure_reason = None
+
+    # --- The following must be defined by user after instantiation ---
+    # Callable that sets self.wrapped_client.
+    # If you use anything besides BleakClient, you must define this.
+    wrap = staticmethod(lambda client: client)
+    # Callable that takes in the wrapped client and starts notifications.
+    enable_notifications = None
+    # Callable that takes in the wrapped client and stops notifications.
+    disable_notifications = None
+    # Callable that takes in the wrapped client and returns the measurement handler.
+    # It 'sets' the 'setter'.
+    set_measurement_handler = None
+
+    # --- Created on first use, see _per_instance ---
+    _discovery_futures = _per_instance(dict)  # adapter -> future resolved when its scanner sees the target
+    # --- Optional: batched ingestion, see ingest() ---
+    ring_buffers = _per_instance(dict)  # characteristic UUID -> NotificationRingBuffer
+    # --- Optional: built-in decoding, see on_measurement() ---
+    measurement_handlers = _per_instance(dict)  # characteristic UUID -> (decoder, callback)
+    # --- Optional: merging with other devices' streams, see align() ---
+    aligned_streams = _per_instance(dict)  # characteristic UUID -> AlignedStream
+    # --- Optional: recording to a binary log, see record() ---
+    recorders = _per_instance(dict)  # characteristic UUID -> NotificationRecorder
+    # --- Optional: reading characteristics that don't notify, see poll() ---
+    poll_periods = _per_instance(dict)  # characteristic UUID -> seconds
+    poll_stats = _per_instance(dict)  # characteristic UUID -> PollStats
+    _polls = _per_instance(dict)  # characteristic UUID -> PollEntry, while Streaming
+    # --- Optional: async iteration, see iter_notifications() ---
+    _notification_queues = _per_instance(dict)  # characteristic UUID -> list of NotificationQueue
+    # characteristic UUID -> whether its start_notify callback is a coroutine ("block" policy)
+    _notifying = _per_instance(dict)
+    # characteristic UUID -> StreamStats, for characteristics consumed by the above. See report_stream_stats().
+    stream_stats = _per_instance(dict)
+    _stop_streaming_event = _per_instance(asyncio.Event)
+
+    @functools.cached_property
+    def reconnect_metrics(self):
+        return {
+            "reconnects": 0,  # successful reconnections
+            "failures": 0,  # times the attempt budget was exhausted
+            "attempts": 0,  # total connection attempts while reconnecting
+            "last_latency": None,  # seconds from connection loss to resumed state
+            "total_latency": 0.0,
+        }
+
+    @functools.cached_property
+    def commands(self):
+        """
+        GATT writes of send_command(), in a CommandQueue.
+        """
+        return CommandQueue(
+            self._write_command, window=self._command_window, on_result=self._record_command
+        )
+
+    @functools.cached_property
+    def tasks(self):
+        """
+        Background tasks of this model: "stream", "reconnect", "confirm", "commands", "poll".
+        An exception in one of them triggers `fault()` (see _on_task_error) and is kept in `last_error`.
+        """
+        return TaskSupervisor()
 
     async def __aenter__(self):
         """
@@ -55,81 +258,162 @@ class BleakModel:
         await self.clean_up()
 
     @classmethod
-    async def clean_up_all(cls):
+    async def clean_up_all(cls, timeout=None):
         """
         Go to Init state from all states for all instances of BleakModel.
         Call when handling exceptions or when program is exiting.
+        Instances are cleaned up concurrently, within `timeout` seconds overall if given
+        (see clean_up()), e.g. to bound the time a SIGTERM handler takes.
         """
-        for instance in cls.instances:
-            await instance.clean_up()
-        return True
+        results = await asyncio.gather(
+            *(instance.clean_up(timeout=timeout) for instance in list(cls.instances))
+        )
+        return all(results)
+
+    @classmethod
+    def _adapter_pool(cls):
+        """
+        The adapters that scan and take connections of models that aren't bound to one.
+        """
+        return list(cls.adapters) or [cls.default_adapter]
 
     @classmethod
-    async def _start_scan(cls):
+    def on_device_seen(
+        cls,
+        callback,
+        min_interval=0.0,
+        rssi_delta=None,
+        name_changes=False,
+        manufacturer_data_changes=False,
+    ):
         """
-        Worker that runs the BLE scan.
+        Subscribe to discovered devices.
+        `callback` is called with a DeviceRecord after each coalesced batch is applied to bt_devices
+        (of every adapter, if `adapters` is set).
+
+        `min_interval` throttles deliveries per device (seconds).
+        `rssi_delta`, `name_changes` and `manufacturer_data_changes` restrict deliveries
+        to updates where that attribute changed. See DeviceSubscription.
+
+        Returns the DeviceSubscription. Call its `cancel()` method to unsubscribe.
         """
-        cls.bt_devices = {}  # clear the list
-        cls._stop_scan_event.clear()  # clear the stop_scan_event
+        subscription = DeviceSubscription(
+            callback,
+            min_interval=min_interval,
+            rssi_delta=rssi_delta,
+            name_changes=name_changes,
+            manufacturer_data_changes=manufacturer_data_changes,
+        )
+        adapters = cls._adapter_pool()
 
-        def detection_callback(device, advertisement_data):
-            cls.bt_devices.update({device.address: (device, advertisement_data)})
+        def unsubscribe(subscription):
+            for adapter in adapters:
+                if subscription in adapter._device_subscriptions:
+                    adapter._device_subscriptions.remove(subscription)
 
-        async with BleakScanner(detection_callback) as scanner:
-            await cls._stop_scan_event.wait()  # continues to scan until stop_scan_event is set
-        return True
+        subscription._unsubscribe = unsubscribe
+        for adapter in adapters:
+            adapter._device_subscriptions.append(subscription)
+        return subscription
 
     @classmethod
-    async def start_scan(cls):
+    async def start_scan(
+        cls,
+        service_uuids=None,
+        name_prefix=None,
+        min_rssi=None,
+        address_allowlist=None,
+        clear=True,
+    ):
         """
-        Non-blocking start of the BLE scan.
+        Non-blocking start of the BLE scan (on every adapter, if `adapters` is set).
+        bt_devices is emptied first, unless `clear` is False.
+
+        Optional filters restrict which devices end up in bt_devices:
+        `service_uuids` is passed to BleakScanner, so filtering happens in the OS/adapter.
+        `name_prefix` (string or tuple of strings), `min_rssi` (dBm) and `address_allowlist`
+        are checked before an advertisement is stored.
         """
-        loop = asyncio.get_event_loop()
-        loop.set_exception_handler(
-            lambda loop, context: logging.error(
-                f"Exception: {context.get('exception')}"
+        results = await asyncio.gather(
+            *(
+                adapter.start_scan(
+                    service_uuids=service_uuids,
+                    name_prefix=name_prefix,
+                    min_rssi=min_rssi,
+                    address_allowlist=address_allowlist,
+                    clear=clear,
+                )
+                for adapter in cls._adapter_pool()
             )
         )
-        asyncio.create_task(cls._start_scan())
-        return True
+        return all(results)
 
     @classmethod
     async def stop_scan(cls):
         """
-        Stop the BLE scan.
+        Stop the BLE scan, and wait until the scanner is stopped.
         """
-        cls._stop_scan_event.set()
-        return True
+        results = await asyncio.gather(
+            *(adapter.stop_scan() for adapter in cls._adapter_pool())
+        )
+        return all(results)
+
+    @classmethod
+    def save_snapshot(cls, path=None):
+        """
+        Save address, name, RSSI, service UUIDs and last-seen time of bt_devices
+        to `path` (default: `snapshot_path`). Returns False if it couldn't be written.
+        """
+        return cls.default_adapter.save_snapshot(path)
 
-    def _setup_state_machine(self):
+    @classmethod
+    def load_snapshot(cls, path=None, max_age=None):
         """
-        Initialize the state machine.
+        Add the devices saved by save_snapshot() to bt_devices, so that set_target() accepts them
+        without a scan. `max_age` (seconds) skips devices last seen longer ago than that.
+        They are confirmed with a targeted lookup when targeted. Returns the number of devices loaded.
         """
-        states = ["Init", "TargetSet", "Connected", "Streaming"]
+        return cls.default_adapter.load_snapshot(path, max_age=max_age)
 
-        self.machine = AsyncMachine(model=self, states=states, initial="Init")
-        self.machine.add_transition(
+    # The state machine is built once and shared by all instances (see _setup_state_machine).
+    # Instances only hold their own `state`, which starts out as this class attribute.
+    machine: AsyncMachine = None
+    state = "Init"
+
+    @classmethod
+    def _setup_state_machine(cls):
+        """
+        Initialize the state machine, shared by all instances of the class.
+
+        Models aren't registered with `add_model`, which would bind a partial per trigger
+        to every instance. Instead, the trigger methods (`connect()`, `is_Streaming()`, ...)
+        are defined once on the class and dispatch to the shared machine.
+        """
+        states = ["Init", "TargetSet", "Connected", "Streaming", "Reconnecting"]
+
+        cls.machine = AsyncMachine(model=None, states=states, initial="Init")
+        cls.machine.add_transition(
             trigger="set_target",
             source="Init",
             dest="TargetSet",
             conditions="_set_target",
         )
 
-        self.machine.add_transition(
+        cls.machine.add_transition(
             trigger="unset_target",
             source="TargetSet",
             dest="Init",
             before="_unset_target",
         )
 
-        self.machine.add_transition(
+        cls.machine.add_transition(
             trigger="connect",
             source="TargetSet",
             dest="Connected",
             conditions="_connect_to_device_with_timeout",
         )
 
-        self.machine.add_transition(
+        cls.machine.add_transition(
             trigger="stream",
             source="Connected",
             dest="Streaming",
@@ -138,7 +422,7 @@ class BleakModel:
             after="_nonblocking_stream",
         )
 
-        self.machine.add_transition(
+        cls.machine.add_transition(
             trigger="disconnect",
             source="Connected",
             dest="TargetSet",
@@ -148,159 +432,1263 @@ class BleakModel:
         # After a stream is stopped, we can't go back to Connected
         # because we can't re-use the BleakClient object.
         # Therefore we need to go one more back to TargetSet,
-        self.machine.add_transition(
+        cls.machine.add_transition(
             trigger="disconnect",
             source="Streaming",
             dest="TargetSet",
             before="_stop_stream_and_disconnect_from_device",
         )
 
-    def __init__(self, connection_timeout=5.0, logging_level=logging.WARNING):
-        logging.basicConfig(level=logging_level)
+        # The peripheral dropped the connection without us asking for it.
+        # See _on_bleak_disconnect() and _reconnect().
+        cls.machine.add_transition(
+            trigger="connection_lost",
+            source=["Connected", "Streaming"],
+            dest="Reconnecting",
+        )
 
-        self._setup_state_machine()
+        cls.machine.add_transition(
+            trigger="reconnected",
+            source="Reconnecting",
+            dest="Streaming",
+            conditions="_resuming_stream",
+        )
+
+        cls.machine.add_transition(
+            trigger="reconnected",
+            source="Reconnecting",
+            dest="Connected",
+        )
+
+        cls.machine.add_transition(
+            trigger="reconnect_failed",
+            source="Reconnecting",
+            dest="TargetSet",
+            before="_restore_device",
+        )
+
+        cls.machine.add_transition(
+            trigger="disconnect",
+            source="Reconnecting",
+            dest="TargetSet",
+            before="_cancel_reconnect",
+        )
+
+        # A background task of the model raised. See _on_task_error().
+        cls.machine.add_transition(
+            trigger="fault",
+            source=["Connected", "Streaming", "Reconnecting"],
+            dest="TargetSet",
+            before="_handle_fault",
+        )
+
+        cls._add_trigger_methods()
+
+    @classmethod
+    def _add_trigger_methods(cls):
+        """
+        Define trigger, `may_<trigger>` and `is_<state>` methods on the class,
+        equivalent to the ones transitions would add to each model instance.
+        """
+        machine = cls.machine
+
+        def make_trigger(event):
+            async def trigger(self, *args, timeout=None, **kwargs):
+                self._failure_reason = None
+                address = self.target
+                started = time.perf_counter()
+                source = self.state
+                try:
+                    # In a task of its own, since the machine swallows the cancellation of its caller
+                    transition = asyncio.ensure_future(event.trigger(self, *args, **kwargs))
+                    try:
+                        done, _ = await asyncio.wait({transition}, timeout=timeout)
+                    except asyncio.CancelledError:
+                        if await self._cancel_transition(transition, event.name, source):
+                            self._record_transition(
+                                event.name, address, started, "cancelled", "cancelled"
+                            )
+                        raise
+                    if not done:
+                        logger.warning(
+                            "%s of %s timed out after %s s", event.name, address, timeout
+                        )
+                        if await self._cancel_transition(transition, event.name, source):
+                            self._failure_reason = "timeout"
+                            self._record_transition(
+                                event.name, address, started, "cancelled", "timeout"
+                            )
+                            return False
+                    try:
+                        result = transition.result()
+                    except MachineError:
+                        self._record_transition(
+                            event.name, address, started, "error", "invalid_transition"
+                        )
+                        raise
+                    except Exception:
+                        self._record_transition(
+                            event.name, address, started, "error", "exception"
+                        )
+                        raise
+                    if result:
+                        self._record_transition(event.name, address, started, "success")
+                    else:
+                        self._record_transition(
+                            event.name,
+                            address,
+                            started,
+                            "failure",
+                            self._failure_reason or "unknown",
+                        )
+                    return result
+                finally:
+                    if self.events is not None and self.state != source:
+                        self.events.state_changed(
+                            self.target or address, source, self.state, event.name
+                        )
+
+            trigger.__name__ = event.name
+            trigger.__doc__ = (
+                f"Trigger the `{event.name}` transition. Returns True if it happened. "
+                "With `timeout` (seconds), a transition that takes longer is cancelled, "
+                "rolled back to a consistent state, and False is returned."
+            )
+            return trigger
+
+        def make_may(trigger_name):
+            async def may(self, *args, **kwargs):
+                # Built on the public `get_triggers()` and condition checks rather than
+                # `AsyncMachine._can_trigger`, which is private to transitions.
+                if trigger_name not in machine.get_triggers(self.state):
+                    return False
+                event = machine.events[trigger_name]
+                event_data = AsyncEventData(
+                    machine.get_state(self.state), event, machine, self, args, kwargs
+                )
+                for transition in event.transitions[self.state]:
+                    event_data.transition = transition
+                    for condition in transition.conditions:
+                        if not await condition.check(event_data):
+                            break
+                    else:
+                        return True
+                return False
+
+            may.__name__ = f"may_{trigger_name}"
+            return may
+
+        def make_is(state_name):
+            def is_state(self):
+                return self.state == state_name
+
+            is_state.__name__ = f"is_{state_name}"
+            return is_state
+
+        for name, event in machine.events.items():
+            if name not in cls.__dict__:
+                setattr(cls, name, make_trigger(event))
+            if f"may_{name}" not in cls.__dict__:
+                setattr(cls, f"may_{name}", make_may(name))
+        for state_name in machine.states:
+            if f"is_{state_name}" not in cls.__dict__:
+                setattr(cls, f"is_{state_name}", make_is(state_name))
+
+    def __init__(
+        self,
+        connection_timeout=5.0,
+        logging_level=None,
+        reconnect_attempts=5,
+        reconnect_backoff=0.25,
+        reconnect_backoff_max=5.0,
+        discovery_timeout=30.0,
+        adapter=None,
+        command_window=4,
+    ):
+        # Sets the level of the "bleak_fsm" logger (shared by all models) if given.
+        # Configuring handlers is left to the application, e.g. with logging.basicConfig().
+        if logging_level is not None:
+            logging.getLogger("bleak_fsm").setLevel(logging_level)
 
         self.connection_timeout = connection_timeout  # seconds
+        # The Adapter this model connects through. If not given, one of BleakModel.adapters
+        # (or default_adapter) is picked by the placement policy on each connect().
+        self.adapter = adapter
+        self._pinned = adapter is not None
+        # With set_target(address, discover=True), how long connect() waits
+        # (counted from set_target) for the scanner to see the device.
+        self.discovery_timeout = discovery_timeout
 
-        self.bleak_client: BleakClient = None
-        self.ble_device: BLEDevice = None
-        self.advertisement_data: AdvertisementData = None
-        self.target = None
-        self._stop_streaming_event = asyncio.Event()
-
-        self.wrapped_client = None
-
-        # --- The following must be defined by user after instantiation ---
-        # Callable that sets self.wrapped_client.
-        # If you use anything besides BleakClient, you must define this.
-        self.wrap = lambda client: client
-        # Callable that takes in the wrapped client and starts notifications.
-        self.enable_notifications = None
-        # Callable that takes in the wrapped client and stops notifications.
-        self.disable_notifications = None
-        # Callable that takes in the wrapped client and returns the measurement handler.
-        # It 'sets' the 'setter'.
-        self.set_measurement_handler = None
-
-        BleakModel.instances.append(self)
-
-    async def clean_up(self):
-        logging.info("Cleaning up.")
+        # When the peripheral drops the connection, retry up to `reconnect_attempts` times.
+        # The first retry is immediate, then the delay starts at `reconnect_backoff` seconds
+        # and doubles (with jitter) up to `reconnect_backoff_max`. 0 attempts disables reconnecting.
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_backoff = reconnect_backoff
+        self.reconnect_backoff_max = reconnect_backoff_max
+        # Up to `command_window` writes without response of send_command() are in flight at once.
+        self._command_window = command_window
+
+        # Everything else starts from the class-level defaults above,
+        # or is created on first use (see _per_instance), so that a model costs a few attributes.
+
+        BleakModel.instances.add(self)
+
+    def _record_transition(self, trigger, address, started, outcome, reason=None):
+        """
+        Report the duration and outcome ("success", "failure", "error" or "cancelled") of a transition
+        to the metrics sink.
+        """
+        labels = {
+            "trigger": trigger,
+            "outcome": outcome,
+            "reason": reason or "",
+            "address": self.target or address or "",
+        }
+        self.metrics.observe(
+            "transition_duration_seconds", time.perf_counter() - started, labels
+        )
+        self.metrics.increment("transitions_total", 1, labels)
+
+    def report_stream_stats(self):
+        """
+        Push the notification counters, rates and jitter of each streamed characteristic to the metrics sink.
+        Called when the stream stops; call it periodically (e.g. before a scrape) for live values.
+        """
+        for characteristic_uuid, stats in self.stream_stats.items():
+            stats.report(
+                self.metrics,
+                {"address": self.target or "", "characteristic": characteristic_uuid},
+            )
+
+    @classmethod
+    def report_all_stream_stats(cls):
+        for instance in list(cls.instances):
+            instance.report_stream_stats()
+
+    async def clean_up(self, timeout=None):
+        """
+        Go back to Init from any state. With `timeout` (seconds), a disconnection that doesn't
+        finish in time is abandoned: the model drops the connection without waiting for the
+        peripheral, and still ends up in Init.
+        """
+        logger.info("Cleaning up.")
         self._stop_streaming_event.set()
+        address = self.target
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        abandoned = False
+
+        async def disconnect():
+            remaining = None if deadline is None else max(0.0, deadline - loop.time())
+            if not await self.disconnect(timeout=remaining):
+                return self._failure_reason == "timeout"
+            return False
 
         try:
-            if self.state == "Streaming":
-                await self.disconnect()
+            if self.state in ("Streaming", "Reconnecting"):
+                abandoned = await disconnect()
             if self.state == "Connected":
-                await self.disconnect()
+                abandoned = await disconnect() or abandoned
             if self.state == "TargetSet":
                 await self.unset_target()
         except Exception as e:
-            logging.error(f"An error occurred during cleanup: {str(e)}")
+            logger.error("An error occurred during cleanup: %s", e)
+            self._record_transition("clean_up", address, started, "failure", "exception")
             return False
+        await self.tasks.shutdown()
 
+        if abandoned:
+            self._failure_reason = "timeout"
+            self._record_transition("clean_up", address, started, "cancelled", "timeout")
+        else:
+            self._failure_reason = None
+            self._record_transition("clean_up", address, started, "success")
+        BleakModel.instances.discard(self)
         return True
 
-    def _set_target(self, address):
+    async def _cancel_transition(self, transition, trigger, source):
+        """
+        Cancel the task running a transition, and roll back what it left behind.
+        Returns False if the transition completed anyway (the state changed before it was cancelled).
+        """
+        transition.cancel()
+        await asyncio.wait({transition})
+        if not transition.cancelled():
+            transition.exception()  # retrieved, so that it isn't logged as never retrieved
+        if self.state != source:
+            return False
+        logger.warning("Cancelled %s of %s in state %s", trigger, self.target, source)
+        self._roll_back(trigger)
+        return True
+
+    def _roll_back(self, trigger):
+        """
+        Leave a consistent state after `trigger` was cancelled before the state changed.
+        Nothing here waits for the peripheral.
+
+        Cancelled setup transitions leave the model where it was: a cancelled `connect` drops
+        the half-made connection, and a cancelled `stream` stops the notifications it started.
+        Cancelled teardown transitions (`disconnect`, `fault`) are completed locally:
+        the connection is dropped in the background and the model goes to TargetSet.
+        """
+        if trigger == "connect":
+            self._stop_discovery()
+            self._abandon_connection()
+        elif trigger == "stream":
+            self._abandon_stream()
+        elif trigger in ("disconnect", "fault"):
+            if self._reconnect_task is not None:
+                self._reconnect_task.cancel()
+                self._reconnect_task = None
+            if self.state == "Streaming":
+                self._abandon_stream()
+            if self.state == "Streaming" or (
+                self.state == "Reconnecting" and self._resuming_stream()
+            ):
+                self._end_stream()
+            self._abandon_connection()
+            self.machine.set_state("TargetSet", model=self)
+
+    def _abandon_stream(self):
+        """
+        Stop the notifications and polls of the stream without waiting for the peripheral.
+        """
+        self._stop_streaming_event.set()
+        self._cancel_polls()
+        client = self.bleak_client
+        for characteristic_uuid in self._notifying:
+            if client is not None and client.is_connected:
+                _detach(
+                    client.stop_notify(characteristic_uuid),
+                    f"stopping notifications for {characteristic_uuid}",
+                )
+        self._notifying = {}
+        for buffer in self.ring_buffers.values():
+            buffer.close()
+
+    def _end_stream(self):
+        """
+        End the stream for its consumers: stop the polls, report the stream stats, and end
+        the iteration of the ring buffers and notification queues.
+        Called on every way out of Streaming, and out of Reconnecting when the stream was to resume.
+        """
+        self._stop_streaming_event.set()
+        self._cancel_polls()
+        self.report_stream_stats()
+        for buffer in self.ring_buffers.values():
+            buffer.close()
+        for queues in self._notification_queues.values():
+            for queue in queues:
+                queue.close()
+            queues.clear()
+
+    def _abandon_connection(self):
+        """
+        Release what the connection holds, and disconnect in the background.
+        """
+        self._expected_disconnect = True
+        self.commands.close()
+        self._cancel_polls()
+        self._put_back_device()
+        client = self.bleak_client
+        if client is not None and client.is_connected:
+            _detach(
+                asyncio.wait_for(client.disconnect(), self.connection_timeout),
+                f"disconnecting from {self.target}",
+            )
+
+    def _put_back_device(self):
+        """
+        Release the adapter, and put the device back in its list of discovered devices.
+        A device that is still listed (e.g. a connect timed out while looking for a device restored
+        from a snapshot) keeps its record, with the cached name, RSSI and services.
+        """
+        registry = (self.adapter or BleakModel.default_adapter).bt_devices
+        self._release_adapter()
+        if self.ble_device is not None and self.target is not None and self.target not in registry:
+            registry[self.target] = (self.ble_device, self.advertisement_data)
+
+    def _spawn(self, coroutine, name):
+        return self.tasks.spawn(coroutine, name=name, on_error=self._on_task_error)
+
+    def _on_task_error(self, name, error):
+        """
+        A background task raised. Turn it into a state event:
+        a connected model goes back to TargetSet through `fault()`.
+        """
+        logger.error("Background task %s of %s failed. Error: %r", name, self.target, error)
+        self.last_error = error
+        if name != "fault" and self.state in ("Connected", "Streaming", "Reconnecting"):
+            self._spawn(self.fault(), "fault")
+
+    async def _handle_fault(self):
+        """
+        Tear down whatever was running when a background task failed.
+        """
+        if self.state == "Streaming":
+            return await self._stop_stream_and_disconnect_from_device()
+        if self.state == "Reconnecting":
+            return await self._cancel_reconnect()
+        return await self._disconnect_from_device()
+
+    def _set_target(self, address, discover=False):
+        """
+        With `discover=True`, an address that hasn't been seen yet is accepted:
+        a scan is started if none is running, and connect() waits for the device to advertise.
+        """
         try:
-            if address in BleakModel.bt_devices:
+            adapters = self._adapters()
+            holder = next(
+                (adapter for adapter in adapters if address in adapter.bt_devices), None
+            )
+            if holder is not None:
                 self.target = address
+                BleakModel.instances.add(self)  # in case it was cleaned up before
+                if holder.bt_devices.get(address).cached:
+                    # known from a snapshot: find it in the background, connect() waits for the result
+                    self._confirm_task = self._spawn(
+                        self._confirm_device(address, holder), "confirm"
+                    )
+                return True
+            elif discover:
+                self.target = address
+                BleakModel.instances.add(self)
+                self._discovery = self._expect_everywhere(address, adapters)
+                self._discovery_deadline = (
+                    asyncio.get_running_loop().time() + self.discovery_timeout
+                )
                 return True
             else:
-                logging.error(f"Address {address} not found in discovered devices")
+                logger.error("Address %s not found in discovered devices", address)
+                self._failure_reason = "missing_device"
                 return False
         except Exception as e:
-            logging.error(f"An error occurred while setting the target. Error: {e}")
+            logger.error("An error occurred while setting the target. Error: %s", e)
+            self._failure_reason = "exception"
             return False
 
+    def _adapters(self):
+        """
+        The adapters this model may connect through.
+        """
+        return [self.adapter] if self._pinned else BleakModel._adapter_pool()
+
+    def _place(self):
+        """
+        Pick the adapter for the connection among those that have seen the target
+        and have a free connection slot, and take the slot. Returns the adapter, or None.
+        """
+        candidates = [adapter for adapter in self._adapters() if self.target in adapter.bt_devices]
+        if not candidates:
+            logger.error("Address %s not found in discovered devices", self.target)
+            self._failure_reason = "missing_device"
+            return None
+        available = [adapter for adapter in candidates if adapter.has_capacity()]
+        if not available:
+            logger.error("No adapter has a free connection slot for %s", self.target)
+            self._failure_reason = "no_capacity"
+            return None
+        placement = BleakModel.placement
+        policy = PLACEMENT_POLICIES[placement] if isinstance(placement, str) else placement
+        adapter = available[0] if len(available) == 1 else policy(available, self.target)
+        adapter.acquire()
+        self.adapter = adapter
+        self._holds_connection = True
+        return adapter
+
+    def _release_adapter(self):
+        if self._holds_connection:
+            self._holds_connection = False
+            self.adapter.release()
+
     def _unset_target(self):
+        self._stop_discovery()
         self.target = None
+        if self._confirm_task is not None:
+            self._confirm_task.cancel()
+            self._confirm_task = None
+
+    def _expect_everywhere(self, address, adapters):
+        """
+        Future resolved with the DeviceRecord of `address` when the scanner of any of `adapters`
+        sees it, or with None once all of their scans stopped without seeing it.
+        """
+        discovery = asyncio.get_running_loop().create_future()
+        futures = self._discovery_futures = {
+            adapter: adapter._expect(address) for adapter in adapters
+        }
+
+        def on_done(future):
+            if discovery.done():
+                return
+            record = None if future.cancelled() else future.result()
+            if record is not None:
+                discovery.set_result(record)
+            elif all(future.done() for future in futures.values()):
+                discovery.set_result(None)
+
+        for future in futures.values():
+            future.add_done_callback(on_done)
+        return discovery
+
+    def _stop_discovery(self):
+        if self._discovery is not None:
+            self._discovery.cancel()
+            self._discovery = None
+        for adapter, future in self._discovery_futures.items():
+            future.cancel()
+            adapter._forget(self.target, future)
+        self._discovery_futures = {}
+
+    async def _wait_for_discovery(self):
+        """
+        Wait until the scanner sees the target, or the discovery deadline passes.
+        """
+        discovery = self._discovery
+        remaining = self._discovery_deadline - asyncio.get_running_loop().time()
+        try:
+            record = await asyncio.wait_for(
+                asyncio.shield(discovery), max(0.0, remaining)
+            )
+        except asyncio.CancelledError:
+            if not discovery.cancelled():
+                raise
+            return False  # the target was unset (e.g. by clean_up) while we waited
+        except asyncio.TimeoutError:
+            logger.error(
+                "Bluetooth device %s wasn't discovered within %s s",
+                self.target,
+                self.discovery_timeout,
+            )
+            self._failure_reason = "missing_device"
+            self._stop_discovery()
+            return False
+        errors = [
+            adapter.last_scan_error
+            for adapter in self._discovery_futures
+            if adapter.last_scan_error is not None
+        ]
+        self._stop_discovery()  # the other adapters stop looking
+        if record is None:
+            logger.error(
+                "Bluetooth device %s can't be discovered, the scan stopped. Error: %r",
+                self.target,
+                errors[0] if errors else None,
+            )
+            self._failure_reason = "exception" if errors else "missing_device"
+            return False
+        return True
+
+    async def _confirm_device(self, address, adapter):
+        """
+        Look up a device restored from a snapshot with a targeted scan on `adapter`.
+        Returns its BLEDevice, or None if it isn't nearby.
+        """
+        try:
+            device = await self.scanner_class.find_device_by_address(
+                address, timeout=self.connection_timeout, **adapter.backend_kwargs()
+            )
+        except Exception as e:
+            logger.warning("An error occurred while looking for %s. Error: %s", address, e)
+            return None
+        if device is None:
+            logger.warning("Device %s from the snapshot was not found nearby", address)
+            return None
+        record = adapter.bt_devices.get(address)
+        if record is not None and record.cached:
+            record.device = device
+        return device
 
     async def _connect_to_device_with_timeout(self):
         """
-        Connect to the device with a timeout (seconds)
+        Connect to the device with a timeout (seconds),
+        after waiting for it to be discovered if it was targeted with `discover=True`.
         """
+        if self._discovery is not None and not await self._wait_for_discovery():
+            return False
+        previous_client = self.bleak_client
         try:
             return await asyncio.wait_for(
                 self._connect_to_device(), timeout=self.connection_timeout
             )
 
         except asyncio.TimeoutError:
-            logging.warning(f"Timed out while connecting to {self.target}")
-            # We must disconnect so that the device is returned to the list of discovered devices
-            await self._disconnect_from_device()
+            logger.warning("Timed out while connecting to %s", self.target)
+            self._failure_reason = "timeout"
+            # The device must go back to the list of discovered devices. The timeout may have fired
+            # before a client was created (e.g. while looking for a device restored from a snapshot).
+            self._put_back_device()
+            client = self.bleak_client
+            if client is not None and client is not previous_client:
+                self._expected_disconnect = True
+                try:
+                    await client.disconnect()
+                except Exception as e:
+                    logger.warning(
+                        "An error occurred while dropping the connection to %s. Error: %s",
+                        self.target,
+                        e,
+                    )
             return False
 
     async def _connect_to_device(self):
-        if len(BleakModel.bt_devices) == 0:
-            logging.error("No devices found")
+        if not any(len(adapter.bt_devices) for adapter in self._adapters()):
+            logger.error("No devices found")
+            self._failure_reason = "missing_device"
+            return False
+        adapter = self._place()
+        if adapter is None:
             return False
+        if adapter.bt_devices.get(self.target).cached:
+            if await self._confirmed_device() is None:
+                logger.error("Bluetooth device %s not found nearby", self.target)
+                self._failure_reason = "missing_device"
+                self._release_adapter()
+                return False
         try:
-            self.ble_device, self.advertisement_data = BleakModel.bt_devices.pop(
+            record = adapter.bt_devices.pop(
                 self.target
             )  # remove the device from the list to avoid connecting to it multiple times
+            self.ble_device, self.advertisement_data = record
+            self._device_key = record_hash(record)  # see _connect_client()
         except Exception as e:
-            logging.error(
-                f"""
-                Bluetooth device {self.target} not found in scanned list.
-                It could be powered off, connected to another device, or to another BleakModel.
-                Error: {e}
+            self._release_adapter()
+            logger.error(
                 """
+                Bluetooth device %s not found in scanned list.
+                It could be powered off, connected to another device, or to another BleakModel.
+                Error: %s
+                """,
+                self.target,
+                e,
             )
+            self._failure_reason = "missing_device"
             return False
         try:
-            self.bleak_client = BleakClient(self.ble_device)
+            self._expected_disconnect = False
             # we don't use the async context manager because
             # we want to access the client object from the disconnect function
-
-            connected = await self.bleak_client.connect()
+            connected = await self._connect_client()
             if connected:
-                logging.info(f"Connected to {self.target}")
+                logger.info("Connected to %s", self.target)
 
                 self.wrapped_client = self.wrap(self.bleak_client)
 
                 return True
             else:
-                logging.warning(f"Failed to connect to {self.target}")
+                logger.warning("Failed to connect to %s", self.target)
         except Exception as e:
-            logging.error(
-                f"An error occurred while connecting to {self.target}. Error: {e}"
+            logger.error(
+                "An error occurred while connecting to %s. Error: %s", self.target, e
             )
+            self._failure_reason = "exception"
+            adapter.bt_devices[self.target] = (self.ble_device, self.advertisement_data)
+            self._release_adapter()
             return False
         return True
 
+    async def _confirmed_device(self):
+        """
+        The BLEDevice found by the background lookup started in _set_target(), waiting for it if needed.
+        A lookup that found nothing is retried.
+        """
+        task = self._confirm_task
+        if task is None or task.cancelled() or (task.done() and task.result() is None):
+            task = self._confirm_task = self._spawn(
+                self._confirm_device(self.target, self.adapter), "confirm"
+            )
+        # shielded, so that a connection timeout doesn't cancel the lookup for the next attempt
+        device = await asyncio.shield(task)
+        self._confirm_task = None
+        return device
+
+    async def _connect_client(self):
+        """
+        Create self.bleak_client and connect it.
+        If the service cache knows the device, its cached services are passed to the backend
+        (all of them, since commands may be sent to any characteristic). If a characteristic
+        we consume turns out to be missing, the cache entry is invalidated and we reconnect
+        with full discovery.
+        """
+        cache = self.service_cache
+        backend_kwargs = self.adapter.backend_kwargs()
+        cached = (
+            None
+            if cache is None
+            else cache.get(self.target, key=self._device_key)
+        )
+        if cached is not None:
+            wanted = {normalize_uuid_str(uuid) for uuid in self._builtin_characteristics()}
+            self.bleak_client = self.client_class(
+                self.ble_device,
+                disconnected_callback=self._on_bleak_disconnect,
+                services=list(cached),
+                winrt={"use_cached_services": True},
+                **backend_kwargs,
+            )
+            connected = await self.bleak_client.connect(dangerous_use_bleak_cache=True)
+            if connected and self._has_characteristics(wanted):
+                return True
+            logger.info("Cached services of %s are stale, rediscovering", self.target)
+            cache.invalidate(self.target)
+            if connected:
+                self._expected_disconnect = True
+                await self.bleak_client.disconnect()
+                self._expected_disconnect = False
+
+        self.bleak_client = self.client_class(
+            self.ble_device, disconnected_callback=self._on_bleak_disconnect, **backend_kwargs
+        )
+        connected = await self.bleak_client.connect()
+        if connected and cache is not None:
+            try:
+                cache.put(
+                    self.target,
+                    self.ble_device,
+                    self.advertisement_data,
+                    self.bleak_client.services,
+                    key=self._device_key,
+                )
+            except Exception as e:
+                logger.warning("Could not cache the services of %s. Error: %s", self.target, e)
+        return connected
+
+    def _has_characteristics(self, characteristic_uuids):
+        try:
+            table = service_table(self.bleak_client.services)
+        except Exception:
+            return False
+        discovered = {uuid for characteristics in table.values() for uuid in characteristics}
+        return discovered.issuperset(characteristic_uuids)
+
     async def _disconnect_from_device(self):
         try:
-            BleakModel.bt_devices.update(
-                {self.target: (self.ble_device, self.advertisement_data)}
-            )  # put it back in the list
+            self._expected_disconnect = True
+            self.commands.close()
+            self._cancel_polls()
+            self._put_back_device()
             await self.bleak_client.disconnect()
-            logging.info(f"Disconnected from {self.target}")
+            logger.info("Disconnected from %s", self.target)
             return True
         except Exception as e:
-            logging.error(f"An error occurred while disconnecting. Error: {e}")
+            logger.error("An error occurred while disconnecting. Error: %s", e)
             return False
 
-    async def _setup_stream(self):
+    def _on_bleak_disconnect(self, client):
+        """
+        Passed to BleakClient as `disconnected_callback`.
+        Starts reconnecting if the disconnection wasn't requested through this model.
+        """
+        if (
+            client is not self.bleak_client
+            or self._expected_disconnect
+            or self.state not in ("Connected", "Streaming")
+        ):
+            return
+        logger.warning("Lost connection to %s", self.target)
+        self._reconnect_task = self._spawn(self._reconnect(), "reconnect")
+
+    def _resuming_stream(self):
+        return self._resume_state == "Streaming"
+
+    async def _reconnect(self):
+        """
+        Retry the connection with jittered exponential backoff until it succeeds
+        or `reconnect_attempts` is exhausted, then leave the Reconnecting state.
+        """
+        lost_at = time.monotonic()
+        self._resume_state = self.state
+        await self.connection_lost()
+
+        delay = self.reconnect_backoff
+        for attempt in range(self.reconnect_attempts):
+            if attempt > 0:
+                await asyncio.sleep(random.uniform(delay / 2, delay))
+                delay = min(delay * 2, self.reconnect_backoff_max)
+            self.reconnect_metrics["attempts"] += 1
+            try:
+                resumed = await asyncio.wait_for(
+                    self._reconnect_once(), timeout=self.connection_timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning("Timed out while reconnecting to %s", self.target)
+                resumed = False
+            if resumed:
+                latency = time.monotonic() - lost_at
+                self.reconnect_metrics["reconnects"] += 1
+                self.reconnect_metrics["last_latency"] = latency
+                self.reconnect_metrics["total_latency"] += latency
+                self.metrics.observe(
+                    "reconnect_latency_seconds", latency, {"address": self.target}
+                )
+                logger.info(
+                    "Reconnected to %s after %d attempt(s) in %.3f s",
+                    self.target,
+                    attempt + 1,
+                    latency,
+                )
+                await self.reconnected()
+                return True
+
+        self.reconnect_metrics["failures"] += 1
+        self.metrics.increment("reconnect_failures_total", 1, {"address": self.target})
+        logger.error(
+            "Giving up on reconnecting to %s after %d attempt(s)",
+            self.target,
+            self.reconnect_attempts,
+        )
+        await self.reconnect_failed()
+        return False
+
+    async def _reconnect_once(self):
+        """
+        One reconnection attempt: new BleakClient, wrap, and re-enable notifications if we were streaming.
+        """
         try:
-            self._stop_streaming_event.clear()
-            if not isinstance(self.wrapped_client, BleakClient):
-                logging.info(
-                    f"""Wrapped client is not a BleakClient object. 
+            self._expected_disconnect = False
+            if not await self._connect_client():
+                return False
+            self.wrapped_client = self.wrap(self.bleak_client)
+            if self._resume_state == "Streaming":
+                await self._start_notifications()
+            return True
+        except Exception as e:
+            logger.warning(
+                "An error occurred while reconnecting to %s. Error: %s", self.target, e
+            )
+            return False
+
+    async def _cancel_reconnect(self):
+        """
+        Stop the reconnection loop (user asked to disconnect while Reconnecting).
+        """
+        await self.tasks.shutdown("reconnect")  # unless we are being called from it
+        self._reconnect_task = None
+        self._stop_streaming_event.set()
+        if self._resuming_stream():
+            self._end_stream()
+        return await self._disconnect_from_device()
+
+    def _restore_device(self):
+        """
+        Put the device back in the list of discovered devices after giving up on it.
+        """
+        if self._resuming_stream():
+            self._end_stream()
+        self.commands.close()
+        self._cancel_polls()
+        self._put_back_device()
+
+    def ingest(
+        self,
+        characteristic_uuid,
+        capacity=1024,
+        max_payload=64,
+        overflow="drop_oldest",
+        max_waiting=None,
+    ):
+        """
+        Store notifications from `characteristic_uuid` in a NotificationRingBuffer
+        instead of (or in addition to) calling a handler for each one.
+        Takes effect on the next `stream()`. Returns the buffer; read it with
+        `async for batch in buffer: ...`. With `overflow="block"`, `max_waiting` bounds
+        the notifications waiting for room (see NotificationRingBuffer).
+
+        If only ring buffers are used, `enable_notifications`, `disable_notifications`
+        and `set_measurement_handler` may be left unset.
+        """
+        buffer = NotificationRingBuffer(
+            capacity=capacity, max_payload=max_payload, overflow=overflow, max_waiting=max_waiting
+        )
+        self.ring_buffers[characteristic_uuid] = buffer
+        return buffer
+
+    def on_measurement(self, characteristic_uuid, callback, decoder=None):
+        """
+        Call `callback` with each notification from `characteristic_uuid`, decoded by
+        the built-in decoder for that characteristic (see bleak_fsm.decoders), or by `decoder`.
+        Use this instead of writing a handler and setting `set_measurement_handler`.
+        Takes effect on the next `stream()`. Returns False if no decoder is available.
+        """
+        if decoder is None:
+            decoder = get_decoder(characteristic_uuid)
+        if decoder is None:
+            logger.error("No decoder registered for %s", characteristic_uuid)
+            return False
+        self.measurement_handlers[characteristic_uuid] = (decoder, callback)
+        return True
+
+    def align(self, characteristic_uuid, aligner, name, value=None, decoder=None):
+        """
+        Feed the notifications from `characteristic_uuid` to `aligner`, a SampleAligner
+        (see bleak_fsm.alignment), as its stream `name`. They are decoded by the built-in decoder
+        for the characteristic (or `decoder`; raw payloads if there is none), then mapped through
+        `value`, e.g. `lambda measurement: measurement.heart_rate`.
+        Takes effect on the next `stream()`. Returns the AlignedStream.
+        """
+        if decoder is None:
+            decoder = get_decoder(characteristic_uuid)
+        stream = aligner.add_stream(name, decoder=decoder, value=value)
+        self.aligned_streams[characteristic_uuid] = stream
+        return stream
+
+    def record(self, characteristic_uuid, recorder):
+        """
+        Append the raw notifications from `characteristic_uuid` (with their arrival time
+        and the target address) to `recorder`, a NotificationRecorder (see bleak_fsm.recorder).
+        Takes effect on the next `stream()`. Pass None to stop recording.
+        The recorder may be shared by several characteristics and models; closing it is up to you.
+        """
+        if recorder is None:
+            self.recorders.pop(characteristic_uuid, None)
+        else:
+            self.recorders[characteristic_uuid] = recorder
+
+    def poll(self, characteristic_uuid, period):
+        """
+        Read `characteristic_uuid` every `period` seconds while Streaming, for characteristics
+        that don't support notifications. The values go to the consumers of the characteristic
+        (on_measurement, ingest, record, iter_notifications) as if they had been notified,
+        and the read latencies to `poll_stats` and the metrics sink.
+        Reads of all models share BleakModel.poll_scheduler, which staggers them.
+        Takes effect on the next `stream()`. Pass None to stop polling.
+        """
+        if period is None:
+            self.poll_periods.pop(characteristic_uuid, None)
+        else:
+            self.poll_periods[characteristic_uuid] = period
+
+    async def replay(self, source, speed=None):
+        """
+        Feed a recording (a path or a ReplaySource) through the decoders, ring buffers, aligners,
+        queues and stream statistics of this model, as if it were streaming, e.g. to reprocess data
+        offline or to benchmark handlers. Notifications keep their recorded timestamps.
+        Only notifications of the target (if set) are replayed; `speed` paces them
+        (see ReplaySource), by default they are replayed as fast as possible.
+        Ring buffers and queues are closed at the end, like when a stream stops.
+        Returns the number of notifications replayed, or False if the model is streaming.
+        """
+        if self.state == "Streaming":
+            logger.error("Can't replay a recording while streaming")
+            return False
+        if not isinstance(source, ReplaySource):
+            source = ReplaySource(source, speed=speed, address=self.target)
+        now = [0.0]  # timestamp of the notification being replayed
+        self.stream_stats = {}
+        handlers = {}
+        for characteristic_uuid in self._builtin_characteristics():
+            buffer = self.ring_buffers.get(characteristic_uuid)
+            if buffer is not None:
+                buffer.open()
+            blocking = self._has_blocking_consumer(characteristic_uuid)
+            handler = self._make_notify_handler(
+                characteristic_uuid, blocking, clock=lambda: now[0], record=False
+            )
+            handlers[characteristic_uuid] = (handler, blocking)
+        count = 0
+        async for notification in source:
+            entry = handlers.get(notification.characteristic_uuid)
+            if entry is None:
+                continue
+            handler, blocking = entry
+            now[0] = notification.timestamp
+            if blocking:
+                await handler(None, notification.data)
+            else:
+                handler(None, notification.data)
+            count += 1
+        self.report_stream_stats()
+        for buffer in self.ring_buffers.values():
+            buffer.close()
+        for queues in self._notification_queues.values():
+            for queue in queues:
+                queue.close()
+            queues.clear()
+        return count
+
+    def iter_notifications(self, characteristic_uuid, maxsize=256, overflow="drop_oldest"):
+        """
+        Consume notifications from `characteristic_uuid` with `async for`:
+
+            async for sample in model.iter_notifications(uuid, maxsize=1000):
+                sample.timestamp, sample.data
+
+        Samples go through a bounded NotificationQueue; `overflow` picks what happens when
+        the consumer falls behind ("drop_oldest", "count_and_drop" or "block"),
+        and the queue's `queued` / `dropped` counters record it.
+        Iteration ends when the stream stops. Call `aclose()` on the queue to stop early.
+        Can be called before `stream()`, or while Streaming.
+        """
+        queues = self._notification_queues.setdefault(characteristic_uuid, [])
+
+        async def on_start():
+            await self._ensure_notifying(characteristic_uuid)
+
+        async def on_close():
+            if queue in queues:  # already gone if the stream stopped
+                queues.remove(queue)
+            await self._stop_notify_if_unused(characteristic_uuid)
+
+        queue = NotificationQueue(
+            maxsize=maxsize, overflow=overflow, on_start=on_start, on_close=on_close
+        )
+        queues.append(queue)
+        return queue
+
+    def _builtin_characteristics(self):
+        """
+        Characteristics consumed through decoders, ring buffers, aligners, recorders
+        or notification queues, or polled.
+        """
+        characteristics = dict.fromkeys(self.measurement_handlers)
+        characteristics.update(dict.fromkeys(self.ring_buffers))
+        characteristics.update(dict.fromkeys(self.aligned_streams))
+        characteristics.update(dict.fromkeys(self.recorders))
+        for characteristic_uuid, queues in self._notification_queues.items():
+            if queues:
+                characteristics[characteristic_uuid] = None
+        characteristics.update(dict.fromkeys(self.poll_periods))
+        return list(characteristics)
+
+    def _has_blocking_consumer(self, characteristic_uuid):
+        buffer = self.ring_buffers.get(characteristic_uuid)
+        if buffer is not None and buffer.overflow == "block":
+            return True
+        return any(
+            queue.overflow == "block"
+            for queue in self._notification_queues.get(characteristic_uuid, ())
+        )
+
+    def _make_notify_handler(
+        self, characteristic_uuid, blocking, clock=time.monotonic, record=True
+    ):
+        """
+        Build the start_notify callback that feeds the decoder, ring buffer, aligner, recorder and queues
+        of a characteristic.
+        It is a coroutine function only if one of them uses the "block" policy,
+        since bleak runs coroutine callbacks as a task per notification.
+        `clock` timestamps the notifications; replay() passes the recorded times.
+        """
+        decoder, callback = self.measurement_handlers.get(
+            characteristic_uuid, (None, None)
+        )
+        buffer = self.ring_buffers.get(characteristic_uuid)
+        aligned = self.aligned_streams.get(characteristic_uuid)
+        queues = self._notification_queues.setdefault(characteristic_uuid, [])
+        recorder = self.recorders.get(characteristic_uuid) if record else None
+        address = self.target
+        # kept across reconnects and handler rebuilds; reset by stream()
+        stats = self.stream_stats.get(characteristic_uuid)
+        if stats is None:
+            stats = self.stream_stats[characteristic_uuid] = StreamStats()
+
+        def handle_measurement(data):
+            try:
+                callback(decoder.decode(data))
+            except Exception as e:
+                logger.error(
+                    "An error occurred while handling a measurement from %s. Error: %s",
+                    characteristic_uuid,
+                    e,
+                )
+
+        if blocking:
+
+            async def handler(sender, data):
+                timestamp = clock()
+                stats.add(timestamp, len(data))
+                if recorder is not None:
+                    recorder.write(timestamp, address, characteristic_uuid, data)
+                if decoder is not None:
+                    handle_measurement(data)
+                if aligned is not None:
+                    aligned.add(timestamp, data)
+                if buffer is not None:
+                    await buffer.put_wait(data, timestamp)
+                sample = Notification(timestamp, characteristic_uuid, data)
+                for queue in tuple(queues):
+                    await queue.put_wait(sample)
+
+        else:
+
+            def handler(sender, data):
+                timestamp = clock()
+                stats.add(timestamp, len(data))
+                if recorder is not None:
+                    recorder.write(timestamp, address, characteristic_uuid, data)
+                if decoder is not None:
+                    handle_measurement(data)
+                if aligned is not None:
+                    aligned.add(timestamp, data)
+                if buffer is not None:
+                    buffer.put(data, timestamp)
+                if queues:
+                    sample = Notification(timestamp, characteristic_uuid, data)
+                    for queue in queues:
+                        queue.put(sample)
+
+        # Decided once per handler, so that per-notification logging costs nothing unless TRACE is on.
+        # Enabling TRACE takes effect on the next stream() (or reconnection).
+        if logger.isEnabledFor(TRACE):
+            return self._traced(handler, characteristic_uuid, blocking)
+        return handler
+
+    def _traced(self, handler, characteristic_uuid, blocking):
+        target = self.target
+
+        def trace(data):
+            logger.log(
+                TRACE, "Notification from %s %s: %s", target, characteristic_uuid, data.hex()
+            )
+
+        if blocking:
+
+            async def traced_handler(sender, data):
+                trace(data)
+                await handler(sender, data)
+
+        else:
+
+            def traced_handler(sender, data):
+                trace(data)
+                handler(sender, data)
+
+        return traced_handler
+
+    async def _start_notify(self, characteristic_uuid):
+        blocking = self._has_blocking_consumer(characteristic_uuid)
+        await self.bleak_client.start_notify(
+            characteristic_uuid, self._make_notify_handler(characteristic_uuid, blocking)
+        )
+        self._notifying[characteristic_uuid] = blocking
+
+    async def _ensure_notifying(self, characteristic_uuid):
+        """
+        Called when a consumer joins. Notifications start with the stream if we aren't Streaming yet.
+        """
+        if self.state != "Streaming":
+            return
+        if characteristic_uuid in self.poll_periods:
+            self._start_polling(characteristic_uuid)  # with a handler that includes the new consumer
+            return
+        blocking = self._notifying.get(characteristic_uuid)
+        if blocking is not None:
+            if blocking or not self._has_blocking_consumer(characteristic_uuid):
+                return
+            # the new consumer needs a coroutine callback
+            await self.bleak_client.stop_notify(characteristic_uuid)
+        await self._start_notify(characteristic_uuid)
+
+    async def _stop_notify_if_unused(self, characteristic_uuid):
+        if (
+            characteristic_uuid in self._notifying
+            and characteristic_uuid not in self._builtin_characteristics()
+        ):
+            del self._notifying[characteristic_uuid]
+            try:
+                await self.bleak_client.stop_notify(characteristic_uuid)
+            except Exception as e:
+                logger.warning(
+                    "An error occurred while stopping notifications for %s. Error: %s",
+                    characteristic_uuid,
+                    e,
+                )
+
+    def _start_polling(self, characteristic_uuid):
+        """
+        Register the periodic read of a polled characteristic with the poll scheduler,
+        replacing the previous one.
+        """
+        self._cancel_polls(characteristic_uuid)
+        blocking = self._has_blocking_consumer(characteristic_uuid)
+        handler = self._make_notify_handler(characteristic_uuid, blocking)
+        stats = self.poll_stats.get(characteristic_uuid)
+        if stats is None:
+            stats = self.poll_stats[characteristic_uuid] = PollStats()
+        labels = {"address": self.target or "", "characteristic": characteristic_uuid}
+
+        async def read():
+            if self.state != "Streaming":
+                return  # e.g. Reconnecting
+            started = time.monotonic()
+            try:
+                data = await asyncio.wait_for(
+                    self.bleak_client.read_gatt_char(characteristic_uuid),
+                    timeout=self.connection_timeout,
+                )
+            except Exception as e:
+                stats.failures += 1
+                self.metrics.increment("read_failures_total", 1, labels)
+                logger.warning(
+                    "Reading %s from %s failed. Error: %r", characteristic_uuid, self.target, e
+                )
+                return
+            latency = time.monotonic() - started
+            stats.reads += 1
+            stats.latency.observe(latency)
+            self.metrics.observe("read_latency_seconds", latency, labels)
+            if blocking:
+                await handler(characteristic_uuid, data)
+            else:
+                handler(characteristic_uuid, data)
+
+        self._polls[characteristic_uuid] = self.poll_scheduler.add(
+            self.poll_periods[characteristic_uuid], read, self._spawn, stats
+        )
+
+    def _cancel_polls(self, characteristic_uuid=None):
+        if characteristic_uuid is None:
+            polls = list(self._polls.values())
+            self._polls = {}
+        else:
+            poll = self._polls.pop(characteristic_uuid, None)
+            polls = [] if poll is None else [poll]
+        for poll in polls:
+            poll.cancel()
+
+    async def _start_notifications(self):
+        """
+        Start notifications through the user callbacks and/or the ring buffers and queues,
+        and the reads of polled characteristics.
+        """
+        builtin = self._builtin_characteristics()
+        if not builtin or self.enable_notifications is not None:
+            if not isinstance(self.wrapped_client, self.client_class):
+                logger.info(
+                    """Wrapped client is not a BleakClient object. 
                     Assuming it's a Pycycling object and calling `set_measurement_handler`.
                     """
                 )
                 self.set_measurement_handler(self.wrapped_client)
             await self.enable_notifications(self.wrapped_client)
+        self._notifying = {}
+        for characteristic_uuid in builtin:
+            buffer = self.ring_buffers.get(characteristic_uuid)
+            if buffer is not None:
+                buffer.open()
+            if characteristic_uuid in self.poll_periods:
+                self._start_polling(characteristic_uuid)
+            else:
+                await self._start_notify(characteristic_uuid)
+
+    async def _setup_stream(self):
+        try:
+            self._stop_streaming_event.clear()
+            self.stream_stats = {}
+            await self._start_notifications()
             return True
         except Exception as e:
-            logging.error(
-                f"""
+            self._failure_reason = "exception"
+            logger.error(
+                """
                 An error occurred while setting up the stream.\n
                 Double-check that the enable_notifications and set_measurement_handler methods are set, 
                 and that they take in a BleakClient or similar (Pycycling) object."
-                Error: {e}
-                """
+                Error: %s
+                """,
+                e,
             )
             return False
 
@@ -309,23 +1697,66 @@ class BleakModel:
         Run _stream_from_device in a detached coroutine.
         Allowing users to `await model.stream()` without blocking.
         """
-        asyncio.create_task(self._stop_streaming_event.wait())
+        self._spawn(self._stop_streaming_event.wait(), "stream")
         # We checked as best we could that the stream is correctly set up in _setup_stream()
         # And since we can't know at this point if the stream is actually working,
         # We have to assume it is and return True.
         return True
 
-    async def send_command(self, command):
-        raise NotImplementedError("Todo: Implement this method")
+    def send_command(
+        self, characteristic_uuid, data, response=False, deadline=None, coalesce=True
+    ):
+        """
+        Queue a write of `data` to `characteristic_uuid`, and return a future resolved with True
+        once it is written, or False if it wasn't (see bleak_fsm.command_queue).
+        Only valid while Connected or Streaming; `await` the future to wait for the write.
+
+        Writes without response (the default) are pipelined. `response=True` waits for the
+        acknowledgement before the next command is sent. `deadline` (seconds) drops the command
+        if it can't be written in time. With `coalesce`, a command replaces the one still waiting
+        for the same characteristic, which resolves to False.
+        """
+        if self.state not in ("Connected", "Streaming"):
+            logger.error("Can't send a command to %s while %s", self.target, self.state)
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(False)
+            return future
+        self.commands.open()
+        if all(task.done() for task in self.tasks.tasks("commands")):
+            self._spawn(self.commands.run(), "commands")
+        return self.commands.submit(
+            characteristic_uuid,
+            data,
+            response=response,
+            deadline=deadline,
+            coalesce=coalesce,
+        )
+
+    async def _write_command(self, characteristic_uuid, data, response):
+        await self.bleak_client.write_gatt_char(characteristic_uuid, data, response=response)
+
+    def _record_command(self, outcome, latency):
+        labels = {"address": self.target or "", "outcome": outcome}
+        self.metrics.increment("commands_total", 1, labels)
+        if latency is not None:
+            self.metrics.observe("command_latency_seconds", latency, {"address": self.target or ""})
 
     async def _stop_stream_from_device(self):
         try:
             self._stop_streaming_event.set()
-            await self.disable_notifications(self.wrapped_client)
-            logging.info("Stopped streaming")
+            builtin = self._builtin_characteristics()
+            for characteristic_uuid in self._notifying:
+                await self.bleak_client.stop_notify(characteristic_uuid)
+            self._notifying = {}
+            self._cancel_polls()
+            await self.tasks.shutdown("poll")  # reads in flight, before the consumers close
+            self._end_stream()
+            if not builtin or self.disable_notifications is not None:
+                await self.disable_notifications(self.wrapped_client)
+            logger.info("Stopped streaming")
             return True
         except Exception as e:
-            logging.error(f"An error occurred while stopping streaming: {e}")
+            logger.error("An error occurred while stopping streaming: %s", e)
             return False
 
     async def _stop_stream_and_disconnect_from_device(self):
@@ -339,7 +1770,26 @@ class BleakModel:
             await self._disconnect_from_device()
             return True
         except Exception as e:
-            logging.warning(
-                f"An error occurred while stopping streaming. Continuing to disconnect from device. Error: {e}"
+            logger.warning(
+                "An error occurred while stopping streaming. Continuing to disconnect from device. Error: %s",
+                e,
             )
             return False
+
+
+class _DefaultAdapter(Adapter):
+    """
+    The OS default controller. Its registry and snapshot path are BleakModel's class attributes.
+    """
+
+    @property
+    def bt_devices(self):
+        return self.model_class.bt_devices
+
+    @property
+    def snapshot_path(self):
+        return self.model_class.snapshot_path
+
+
+BleakModel.default_adapter = _DefaultAdapter(model_class=BleakModel)
+BleakModel._setup_state_machine()
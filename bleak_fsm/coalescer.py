@@ -0,0 +1,173 @@
+"""
+This module contains the advertisement coalescing stage that sits between
+the BleakScanner detection callback and the device registry,
+as well as the subscriptions handed out by `BleakModel.on_device_seen`.
+
+A device advertises many times per second, and most of those advertisements are identical.
+Instead of updating the registry for every advertisement, the detection callback
+only stores the latest advertisement per address, and the registry and subscribers
+are updated in one batch every `interval` seconds.
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AdvertisementCoalescer:
+    """
+    Deduplicates advertisements per address and hands them to `sink` in batches.
+
+    `sink` is a callable that takes a list of `(device, advertisement_data)` tuples.
+    If `interval` is 0 or None, every advertisement is passed through immediately.
+    """
+
+    def __init__(self, sink, interval=0.05):
+        self.sink = sink
+        self.interval = interval
+        self._pending = {}  # address -> (device, advertisement_data), latest wins
+        self._timer = None
+
+    def push(self, device, advertisement_data):
+        if not self.interval:
+            self.sink([(device, advertisement_data)])
+            return
+        self._pending[device.address] = (device, advertisement_data)
+        if self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.interval, self.flush)
+
+    def flush(self):
+        """
+        Apply all pending advertisements now.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch = list(self._pending.values())
+        self._pending = {}
+        self.sink(batch)
+
+    def clear(self):
+        """
+        Drop pending advertisements without applying them.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pending = {}
+
+
+class DeviceSubscription:
+    """
+    A subscriber to device updates, with its own throttling and change filters.
+
+    `min_interval` (seconds): deliver at most one update per device per interval.
+    `rssi_delta`: deliver when RSSI moved by at least this many dBm since the last delivery.
+    `name_changes`: deliver when the advertised name changed.
+    `manufacturer_data_changes`: deliver when the manufacturer data changed.
+
+    If none of the change filters are set, every (throttled) update is delivered.
+    If any are set, an update is only delivered when at least one of them fires.
+    The first update for a device is always delivered.
+
+    The last delivery is remembered for at most `max_devices` devices (the least recently
+    delivered are forgotten first), and forgotten when the device leaves the registry.
+    """
+
+    def __init__(
+        self,
+        callback,
+        min_interval=0.0,
+        rssi_delta=None,
+        name_changes=False,
+        manufacturer_data_changes=False,
+        max_devices=4096,
+        clock=time.monotonic,
+    ):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.rssi_delta = rssi_delta
+        self.name_changes = name_changes
+        self.manufacturer_data_changes = manufacturer_data_changes
+        self.max_devices = max_devices
+        self._clock = clock
+        self._changes_only = (
+            rssi_delta is not None or name_changes or manufacturer_data_changes
+        )
+        # address -> (delivered_at, rssi, name, manufacturer_data) of the last delivery
+        self._delivered = {}
+        self.active = True
+        self._unsubscribe = None
+
+    def cancel(self):
+        """
+        Stop receiving updates.
+        """
+        self.active = False
+        if self._unsubscribe is not None:
+            self._unsubscribe(self)
+            self._unsubscribe = None
+
+    def reset(self):
+        """
+        Forget what has been delivered, so that every device is reported again.
+        """
+        self._delivered.clear()
+
+    def forget(self, address):
+        """
+        Forget what has been delivered for `address`, so that its next update is delivered.
+        """
+        self._delivered.pop(address, None)
+
+    def offer(self, record):
+        """
+        Deliver `record` to the callback if it passes the throttle and change filters.
+        Returns True if it was delivered.
+        """
+        if not self.active:
+            return False
+        now = self._clock()
+        manufacturer_data = getattr(record.advertisement_data, "manufacturer_data", None)
+        previous = self._delivered.get(record.address)
+
+        if previous is not None:
+            delivered_at, rssi, name, previous_manufacturer_data = previous
+            if now - delivered_at < self.min_interval:
+                return False
+            if self._changes_only:
+                changed = (
+                    (
+                        self.rssi_delta is not None
+                        and record.rssi is not None
+                        and (rssi is None or abs(record.rssi - rssi) >= self.rssi_delta)
+                    )
+                    or (self.name_changes and record.name != name)
+                    or (
+                        self.manufacturer_data_changes
+                        and manufacturer_data != previous_manufacturer_data
+                    )
+                )
+                if not changed:
+                    return False
+
+        delivered = self._delivered
+        delivered.pop(record.address, None)  # keep dict order least recently delivered first
+        delivered[record.address] = (
+            now,
+            record.rssi,
+            record.name,
+            dict(manufacturer_data) if manufacturer_data else manufacturer_data,
+        )
+        if len(delivered) > self.max_devices:
+            del delivered[next(iter(delivered))]
+        try:
+            self.callback(record)
+        except Exception as e:
+            logger.error("An error occurred in an on_device_seen callback. Error: %s", e)
+        return True
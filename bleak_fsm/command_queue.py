@@ -0,0 +1,169 @@
+"""
+This module contains the CommandQueue class, which sends GATT writes for `BleakModel.send_command()`.
+
+Awaiting each `write_gatt_char` in turn costs a round trip per command. The queue instead:
+
+- pipelines writes without response, keeping up to `window` of them in flight,
+- coalesces a command with the one still waiting for the same characteristic
+  (only the latest setpoint matters), which then resolves to False,
+- drops commands whose deadline passed before they could be written,
+- sends writes with response one at a time, after the writes queued before them.
+
+Each command gets a future resolved with True once written, or False if it was superseded,
+expired, failed, or the queue was closed (the model disconnected).
+"""
+
+import asyncio
+import itertools
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+OUTCOMES = ("written", "superseded", "expired", "failed", "dropped")
+
+
+class Command:
+    __slots__ = ("characteristic_uuid", "data", "response", "deadline", "submitted", "future")
+
+    def __init__(self, characteristic_uuid, data, response, deadline, submitted, future):
+        self.characteristic_uuid = characteristic_uuid
+        self.data = data
+        self.response = response
+        self.deadline = deadline  # event loop time, or None
+        self.submitted = submitted
+        self.future = future
+
+
+class CommandQueue:
+    """
+    Per-model queue of GATT writes. `write(characteristic_uuid, data, response)` is the coroutine
+    that performs a write; `on_result(outcome, latency)`, if given, is called for every command
+    (`latency` is seconds from submission to the end of the write, None unless written).
+    `counts` keeps the number of commands per outcome ("written", "superseded", "expired",
+    "failed", "dropped").
+    """
+
+    def __init__(self, write, window=4, on_result=None):
+        self.write = write
+        self.window = window
+        self.on_result = on_result
+        self.counts = dict.fromkeys(OUTCOMES, 0)
+        self.closed = False
+        self._pending = OrderedDict()  # characteristic UUID (or a unique key) -> Command
+        self._unique_keys = itertools.count()
+        self._in_flight = set()
+        self._changed = asyncio.Event()
+
+    def __len__(self):
+        return len(self._pending) + len(self._in_flight)
+
+    def submit(self, characteristic_uuid, data, response=False, deadline=None, coalesce=True):
+        """
+        Queue a write and return its future. See BleakModel.send_command().
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        command = Command(
+            characteristic_uuid,
+            bytes(data),
+            response,
+            None if deadline is None else now + deadline,
+            now,
+            loop.create_future(),
+        )
+        if self.closed:
+            self._resolve(command, "dropped")
+            return command.future
+        key = characteristic_uuid if coalesce else (next(self._unique_keys),)
+        previous = self._pending.get(key)
+        if previous is not None:
+            self._resolve(previous, "superseded")
+        self._pending[key] = command  # a replaced command keeps its place in line
+        self._changed.set()
+        return command.future
+
+    def _resolve(self, command, outcome, latency=None):
+        self.counts[outcome] += 1
+        if not command.future.done():
+            command.future.set_result(outcome == "written")
+        if self.on_result is not None:
+            self.on_result(outcome, latency)
+
+    def open(self):
+        self.closed = False
+
+    def close(self):
+        """
+        Stop taking commands. Those still waiting resolve to False; writes in flight finish.
+        """
+        self.closed = True
+        for command in self._pending.values():
+            self._resolve(command, "dropped")
+        self._pending.clear()
+        self._changed.set()
+
+    async def _wait_for_change_or_write(self):
+        """
+        Wait until a command is submitted (or the queue closed), or a write in flight finishes.
+        """
+        change = asyncio.ensure_future(self._changed.wait())
+        try:
+            await asyncio.wait(self._in_flight | {change}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            change.cancel()
+
+    async def run(self):
+        """
+        Dispatch commands until the queue is closed.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                self._changed.clear()  # before looking, so that no submission is missed
+                if not self._pending:
+                    if self.closed and not self._in_flight:
+                        break  # reopening before this keeps the same dispatcher running
+                    await self._wait_for_change_or_write()
+                    continue
+                command = next(iter(self._pending.values()))
+                # writes with response go alone, after everything queued before them
+                limit = 1 if command.response else self.window
+                if len(self._in_flight) >= limit:
+                    await self._wait_for_change_or_write()
+                    continue  # the head of the line may have been replaced meanwhile
+                self._pending.popitem(last=False)
+                if command.future.done():
+                    continue  # cancelled by the caller
+                if command.deadline is not None and loop.time() >= command.deadline:
+                    self._resolve(command, "expired")
+                    continue
+                task = asyncio.ensure_future(self._write(command))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+                if command.response:
+                    await asyncio.wait({task})
+        finally:
+            for task in self._in_flight:
+                task.cancel()
+
+    async def _write(self, command):
+        loop = asyncio.get_running_loop()
+        write = self.write(command.characteristic_uuid, command.data, command.response)
+        try:
+            if command.deadline is None:
+                await write
+            else:
+                await asyncio.wait_for(write, max(0.0, command.deadline - loop.time()))
+        except asyncio.TimeoutError:
+            self._resolve(command, "expired")
+        except asyncio.CancelledError:
+            self._resolve(command, "dropped")
+            raise
+        except Exception as e:
+            logger.warning(
+                "Writing to %s failed. Error: %s", command.characteristic_uuid, e
+            )
+            self._resolve(command, "failed")
+        else:
+            self._resolve(command, "written", loop.time() - command.submitted)
@@ -0,0 +1,391 @@
+"""
+This module contains decoders for standard GATT characteristics,
+so that deployments don't each need a hand-written per-packet handler.
+
+Decoders are registered by characteristic UUID. Each one compiles a `struct` layout
+once per distinct flags value, and decodes either:
+- a single notification into a namedtuple (`decode`), or
+- a whole NotificationRingBuffer batch into NumPy columns in one call (`decode_batch`).
+  Fields that are absent in a packet are NaN. Variable-length fields (RR intervals) are batch-excluded.
+
+NumPy is an optional dependency, only needed for `decode_batch`.
+"""
+
+import struct
+from collections import namedtuple
+
+from bleak.uuids import normalize_uuid_str
+
+HEART_RATE_MEASUREMENT_UUID = normalize_uuid_str("2a37")
+BATTERY_LEVEL_UUID = normalize_uuid_str("2a19")
+RSC_MEASUREMENT_UUID = normalize_uuid_str("2a53")
+CSC_MEASUREMENT_UUID = normalize_uuid_str("2a5b")
+CYCLING_POWER_MEASUREMENT_UUID = normalize_uuid_str("2a63")
+
+# struct format character -> NumPy little-endian dtype
+_NUMPY_DTYPES = {"B": "u1", "H": "<u2", "h": "<i2", "I": "<u4"}
+
+
+def _require_numpy():
+    try:
+        import numpy as np
+    except ImportError as e:
+        raise ImportError(
+            "decode_batch() requires NumPy. Install it with `pip install numpy`."
+        ) from e
+    return np
+
+
+class MeasurementDecoder:
+    """
+    Base class for flag-driven GATT measurement layouts.
+
+    Subclasses set `Record` (a namedtuple), `flags_format` ("B", "H", or "" for no flags)
+    and implement `layout(flags)`, returning `(name, struct_format, scale)` tuples
+    for the fields present with those flags. Field names starting with an underscore
+    are intermediate values, to be combined by `finish` / `finish_batch`.
+    """
+
+    Record = None
+    flags_format = "B"
+
+    def __init__(self):
+        self._compiled = {}  # flags -> (struct.Struct, layout)
+
+    def layout(self, flags):
+        raise NotImplementedError
+
+    def finish(self, flags, values, data, offset):
+        """
+        Fill in fields derived from the flags or from bytes past `offset` (the end of the fixed layout).
+        """
+
+    def finish_batch(self, flags, rows, columns):
+        """
+        Vectorized counterpart of `finish` for the rows of a batch sharing `flags`.
+        """
+
+    def _compile(self, flags):
+        compiled = self._compiled.get(flags)
+        if compiled is None:
+            layout = self.layout(flags)
+            compiled = (
+                struct.Struct(
+                    "<" + self.flags_format + "".join(fmt for _, fmt, _ in layout)
+                ),
+                layout,
+            )
+            self._compiled[flags] = compiled
+        return compiled
+
+    def _flags(self, data):
+        if self.flags_format == "B":
+            return data[0]
+        if self.flags_format == "H":
+            return data[0] | (data[1] << 8)
+        return 0
+
+    def decode(self, data):
+        """
+        Decode one notification payload into a `Record`.
+        """
+        flags = self._flags(data)
+        unpacker, layout = self._compile(flags)
+        raw = unpacker.unpack_from(data)
+        if self.flags_format:
+            raw = raw[1:]
+        values = dict.fromkeys(self.Record._fields)
+        for (name, _, scale), value in zip(layout, raw):
+            values[name] = value if scale == 1 else value * scale
+        self.finish(flags, values, data, unpacker.size)
+        return self.Record(*(values[field] for field in self.Record._fields))
+
+    @property
+    def batch_fields(self):
+        return [field for field in self.Record._fields if field != "rr_intervals"]
+
+    def decode_batch(self, batch):
+        """
+        Decode a RingBatch into a dict of NumPy float64 columns (plus "timestamp").
+        Packets sharing a flags value are decoded together through a structured dtype view.
+        Packets too short for their layout are left as NaN.
+        """
+        np = _require_numpy()
+        timestamps, lengths, payloads = batch.to_numpy()
+        count = len(batch)
+        columns = {field: np.full(count, np.nan) for field in self.batch_fields}
+        columns["timestamp"] = np.array(timestamps, dtype=np.float64)
+        if count == 0:
+            return columns
+
+        if self.flags_format == "B":
+            all_flags = payloads[:, 0].astype(np.uint16)
+        elif self.flags_format == "H":
+            all_flags = payloads[:, 0].astype(np.uint16) | (
+                payloads[:, 1].astype(np.uint16) << 8
+            )
+        else:
+            all_flags = np.zeros(count, dtype=np.uint16)
+
+        for flags in np.unique(all_flags):
+            flags = int(flags)
+            unpacker, layout = self._compile(flags)
+            if unpacker.size > payloads.shape[1]:
+                continue
+            rows = np.nonzero((all_flags == flags) & (lengths >= unpacker.size))[0]
+            if len(rows) == 0:
+                continue
+            dtype = []
+            if self.flags_format:
+                dtype.append(("_flags", _NUMPY_DTYPES[self.flags_format]))
+            dtype += [(name, _NUMPY_DTYPES[fmt]) for name, fmt, _ in layout]
+            records = (
+                np.ascontiguousarray(payloads[rows, : unpacker.size])
+                .view(np.dtype(dtype))
+                .reshape(-1)
+            )
+            for name, _, scale in layout:
+                column = columns.setdefault(name, np.full(count, np.nan))
+                column[rows] = records[name] * scale
+            self.finish_batch(flags, rows, columns)
+
+        for name in [name for name in columns if name.startswith("_")]:
+            del columns[name]
+        return columns
+
+
+HeartRateMeasurement = namedtuple(
+    "HeartRateMeasurement",
+    ["heart_rate", "sensor_contact", "energy_expended", "rr_intervals"],
+)
+
+
+class HeartRateMeasurementDecoder(MeasurementDecoder):
+    """
+    Heart Rate Measurement (0x2A37).
+    `heart_rate` in bpm, `energy_expended` in kJ, `rr_intervals` in seconds,
+    `sensor_contact` is None when the sensor doesn't support contact detection.
+    """
+
+    Record = HeartRateMeasurement
+
+    def layout(self, flags):
+        fields = [("heart_rate", "H" if flags & 0x01 else "B", 1)]
+        if flags & 0x08:
+            fields.append(("energy_expended", "H", 1))
+        return fields
+
+    def finish(self, flags, values, data, offset):
+        if flags & 0x04:
+            values["sensor_contact"] = bool(flags & 0x02)
+        if flags & 0x10:
+            count = (len(data) - offset) // 2
+            values["rr_intervals"] = [
+                rr / 1024 for rr in struct.unpack_from(f"<{count}H", data, offset)
+            ]
+        else:
+            values["rr_intervals"] = []
+
+    def finish_batch(self, flags, rows, columns):
+        if flags & 0x04:
+            columns["sensor_contact"][rows] = 1.0 if flags & 0x02 else 0.0
+
+
+BatteryLevel = namedtuple("BatteryLevel", ["battery_level"])
+
+
+class BatteryLevelDecoder(MeasurementDecoder):
+    """
+    Battery Level (0x2A19), in percent.
+    """
+
+    Record = BatteryLevel
+    flags_format = ""
+
+    def layout(self, flags):
+        return [("battery_level", "B", 1)]
+
+
+RSCMeasurement = namedtuple(
+    "RSCMeasurement",
+    ["speed", "cadence", "stride_length", "total_distance", "running"],
+)
+
+
+class RSCMeasurementDecoder(MeasurementDecoder):
+    """
+    Running Speed and Cadence Measurement (0x2A53).
+    `speed` in m/s, `cadence` in steps/min, `stride_length` and `total_distance` in m.
+    """
+
+    Record = RSCMeasurement
+
+    def layout(self, flags):
+        fields = [("speed", "H", 1 / 256), ("cadence", "B", 1)]
+        if flags & 0x01:
+            fields.append(("stride_length", "H", 1 / 100))
+        if flags & 0x02:
+            fields.append(("total_distance", "I", 1 / 10))
+        return fields
+
+    def finish(self, flags, values, data, offset):
+        values["running"] = bool(flags & 0x04)
+
+    def finish_batch(self, flags, rows, columns):
+        columns["running"][rows] = 1.0 if flags & 0x04 else 0.0
+
+
+CSCMeasurement = namedtuple(
+    "CSCMeasurement",
+    [
+        "cumulative_wheel_revolutions",
+        "last_wheel_event_time",
+        "cumulative_crank_revolutions",
+        "last_crank_event_time",
+    ],
+)
+
+
+class CSCMeasurementDecoder(MeasurementDecoder):
+    """
+    Cycling Speed and Cadence Measurement (0x2A5B).
+    Event times are raw 1/1024 s ticks, which roll over; take differences modulo 65536.
+    """
+
+    Record = CSCMeasurement
+
+    def layout(self, flags):
+        fields = []
+        if flags & 0x01:
+            fields += [
+                ("cumulative_wheel_revolutions", "I", 1),
+                ("last_wheel_event_time", "H", 1),
+            ]
+        if flags & 0x02:
+            fields += [
+                ("cumulative_crank_revolutions", "H", 1),
+                ("last_crank_event_time", "H", 1),
+            ]
+        return fields
+
+
+CyclingPowerMeasurement = namedtuple(
+    "CyclingPowerMeasurement",
+    [
+        "instantaneous_power",
+        "pedal_power_balance",
+        "accumulated_torque",
+        "cumulative_wheel_revolutions",
+        "last_wheel_event_time",
+        "cumulative_crank_revolutions",
+        "last_crank_event_time",
+        "maximum_force_magnitude",
+        "minimum_force_magnitude",
+        "maximum_torque_magnitude",
+        "minimum_torque_magnitude",
+        "maximum_angle",
+        "minimum_angle",
+        "top_dead_spot_angle",
+        "bottom_dead_spot_angle",
+        "accumulated_energy",
+    ],
+)
+
+
+class CyclingPowerMeasurementDecoder(MeasurementDecoder):
+    """
+    Cycling Power Measurement (0x2A63).
+    Power in W, `pedal_power_balance` in %, torques in Nm, forces in N, angles in degrees,
+    `accumulated_energy` in kJ. Wheel event times are 1/2048 s ticks, crank event times 1/1024 s ticks.
+    """
+
+    Record = CyclingPowerMeasurement
+    flags_format = "H"
+
+    def layout(self, flags):
+        fields = [("instantaneous_power", "h", 1)]
+        if flags & 0x0001:
+            fields.append(("pedal_power_balance", "B", 1 / 2))
+        if flags & 0x0004:
+            fields.append(("accumulated_torque", "H", 1 / 32))
+        if flags & 0x0010:
+            fields += [
+                ("cumulative_wheel_revolutions", "I", 1),
+                ("last_wheel_event_time", "H", 1),
+            ]
+        if flags & 0x0020:
+            fields += [
+                ("cumulative_crank_revolutions", "H", 1),
+                ("last_crank_event_time", "H", 1),
+            ]
+        if flags & 0x0040:
+            fields += [
+                ("maximum_force_magnitude", "h", 1),
+                ("minimum_force_magnitude", "h", 1),
+            ]
+        if flags & 0x0080:
+            fields += [
+                ("maximum_torque_magnitude", "h", 1 / 32),
+                ("minimum_torque_magnitude", "h", 1 / 32),
+            ]
+        if flags & 0x0100:
+            # two 12-bit angles packed into 3 bytes
+            fields += [("_angles0", "B", 1), ("_angles1", "B", 1), ("_angles2", "B", 1)]
+        if flags & 0x0200:
+            fields.append(("top_dead_spot_angle", "H", 1))
+        if flags & 0x0400:
+            fields.append(("bottom_dead_spot_angle", "H", 1))
+        if flags & 0x0800:
+            fields.append(("accumulated_energy", "H", 1))
+        return fields
+
+    def finish(self, flags, values, data, offset):
+        if flags & 0x0100:
+            values["maximum_angle"] = values["_angles0"] | (
+                (values["_angles1"] & 0x0F) << 8
+            )
+            values["minimum_angle"] = (values["_angles1"] >> 4) | (
+                values["_angles2"] << 4
+            )
+
+    def finish_batch(self, flags, rows, columns):
+        if flags & 0x0100:
+            a0 = columns["_angles0"][rows].astype(int)
+            a1 = columns["_angles1"][rows].astype(int)
+            a2 = columns["_angles2"][rows].astype(int)
+            columns["maximum_angle"][rows] = a0 | ((a1 & 0x0F) << 8)
+            columns["minimum_angle"][rows] = (a1 >> 4) | (a2 << 4)
+
+
+# --- Registry ---
+
+DECODERS = {
+    HEART_RATE_MEASUREMENT_UUID: HeartRateMeasurementDecoder(),
+    BATTERY_LEVEL_UUID: BatteryLevelDecoder(),
+    RSC_MEASUREMENT_UUID: RSCMeasurementDecoder(),
+    CSC_MEASUREMENT_UUID: CSCMeasurementDecoder(),
+    CYCLING_POWER_MEASUREMENT_UUID: CyclingPowerMeasurementDecoder(),
+}
+
+
+def register_decoder(characteristic_uuid, decoder):
+    """
+    Add or replace the decoder for a characteristic. `decoder` needs `decode(data)`,
+    and `decode_batch(batch)` if it is used with ring buffers.
+    """
+    DECODERS[normalize_uuid_str(characteristic_uuid)] = decoder
+
+
+def get_decoder(characteristic_uuid):
+    """
+    The decoder for a characteristic (16-bit or 128-bit UUID string), or None.
+    """
+    return DECODERS.get(normalize_uuid_str(characteristic_uuid))
+
+
+def decode(characteristic_uuid, data):
+    return DECODERS[normalize_uuid_str(characteristic_uuid)].decode(data)
+
+
+def decode_batch(characteristic_uuid, batch):
+    return DECODERS[normalize_uuid_str(characteristic_uuid)].decode_batch(batch)
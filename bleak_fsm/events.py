@@ -0,0 +1,204 @@
+"""
+This module contains the EventStream class, which publishes what changes in a fleet
+(state transitions, devices discovered or lost) for dashboards and other frontends.
+
+Instead of reading `model.state` and `BleakModel.bt_devices` on every tick and serializing
+BLEDevice / AdvertisementData objects, a frontend takes a `snapshot()` once and then follows
+the stream of events with sequence numbers greater than the snapshot's `version`.
+
+Snapshots are immutable and versioned: the dicts behind a snapshot are never modified again,
+and are copied only on the first change after a snapshot was taken (copy-on-write).
+Taking a snapshot when nothing changed returns the previous one.
+
+Events and snapshots only contain plain values (strings, numbers, tuples), so they serialize
+cheaply, e.g. with `json.dumps(event._asdict())`.
+"""
+
+import itertools
+import logging
+import time
+from collections import deque, namedtuple
+from types import MappingProxyType
+
+from .notification_queue import NotificationQueue
+
+logger = logging.getLogger(__name__)
+
+# `seq` increases by one per event; a gap means the consumer missed events and should take a new snapshot.
+# `kind` is "state", "device_added", "device_updated" or "device_removed".
+# `data` is a StateChange for "state" events, a DeviceSummary for the others.
+Event = namedtuple("Event", ["seq", "time", "kind", "address", "data"])
+
+# `trigger` moved a model from `source` to `dest`.
+StateChange = namedtuple("StateChange", ["source", "dest", "trigger"])
+
+# `last_seen` is wall-clock time; `registry` the name given to EventStream.watch().
+DeviceSummary = namedtuple(
+    "DeviceSummary", ["address", "name", "rssi", "service_uuids", "last_seen", "registry"]
+)
+
+# `states` maps the address of every targeted model to its state,
+# `devices` the address of every discovered device to its DeviceSummary.
+Snapshot = namedtuple("Snapshot", ["version", "states", "devices"])
+
+
+class EventStream:
+    """
+    Sequenced events and snapshots of model states and device registries.
+    Assign one to `BleakModel.events` to publish state transitions, and `watch()` the registries
+    to publish their diffs.
+
+    The last `history` events are kept, so that a subscriber can catch up from a snapshot.
+    A device is "updated" only when its name, RSSI or services change; RSSI changes smaller
+    than `rssi_delta` (dBm) are ignored, since RSSI fluctuates by a few dBm between advertisements.
+    Pass `rssi_delta=0` to publish every RSSI change.
+    """
+
+    def __init__(self, history=1024, rssi_delta=5):
+        self.rssi_delta = rssi_delta
+        self.version = 0  # sequence number of the last event
+        self._sequence = itertools.count(1)
+        self._history = deque(maxlen=history)
+        self._queues = []
+        self._states = {}
+        self._devices = {}
+        self._snapshot = Snapshot(0, MappingProxyType(self._states), MappingProxyType(self._devices))
+        # whether the dicts above are referenced by the current snapshot, and must be copied before writing
+        self._states_shared = True
+        self._devices_shared = True
+
+    # --- Publishing ---
+
+    def _publish(self, kind, address, data):
+        seq = next(self._sequence)
+        self.version = seq
+        event = Event(seq, time.time(), kind, address, data)
+        self._history.append(event)
+        for queue in self._queues:
+            queue.put(event)
+        return event
+
+    def state_changed(self, address, source, dest, trigger):
+        """
+        Called by BleakModel after a transition that changed its state.
+        """
+        if address is None:
+            return
+        if self._states_shared:
+            self._states = dict(self._states)
+            self._states_shared = False
+        if dest == "Init":
+            self._states.pop(address, None)
+        else:
+            self._states[address] = dest
+        self._publish("state", address, StateChange(source, dest, trigger))
+
+    def watch(self, registry, name="default"):
+        """
+        Publish the devices added to, updated in and removed from `registry`, a DeviceRegistry
+        (e.g. BleakModel.bt_devices, or the `bt_devices` of an Adapter). Devices already in it are
+        published as added. Returns a function that stops watching.
+        """
+        clock = registry._clock
+
+        def on_change(change, record):
+            wall_now = time.time()
+            summary = DeviceSummary(
+                record.address,
+                record.name,
+                record.rssi,
+                record.service_uuids,
+                wall_now - (clock() - record.last_seen),
+                name,
+            )
+            self._device_changed(change, summary)
+
+        for record in list(registry._records.values()):
+            on_change("added", record)
+        registry.add_listener(on_change)
+        return lambda: registry.remove_listener(on_change)
+
+    def _device_changed(self, change, summary):
+        address = summary.address
+        previous = self._devices.get(address)
+        if change == "removed":
+            if previous is None or previous.registry != summary.registry:
+                return  # known through another registry
+            kind = "device_removed"
+        elif previous is None:
+            kind = "device_added"
+        else:
+            if (
+                previous.name == summary.name
+                and previous.service_uuids == summary.service_uuids
+                and (
+                    previous.rssi == summary.rssi
+                    or (
+                        previous.rssi is not None
+                        and summary.rssi is not None
+                        and abs(previous.rssi - summary.rssi) < self.rssi_delta
+                    )
+                )
+            ):
+                return
+            kind = "device_updated"
+        if self._devices_shared:
+            self._devices = dict(self._devices)
+            self._devices_shared = False
+        if kind == "device_removed":
+            del self._devices[address]
+        else:
+            self._devices[address] = summary
+        self._publish(kind, address, summary)
+
+    # --- Consuming ---
+
+    def snapshot(self):
+        """
+        The current Snapshot. Cheap: nothing is copied until something changes.
+        """
+        if self._snapshot.version != self.version:
+            self._snapshot = Snapshot(
+                self.version, MappingProxyType(self._states), MappingProxyType(self._devices)
+            )
+            self._states_shared = True
+            self._devices_shared = True
+        return self._snapshot
+
+    def since(self, seq):
+        """
+        The kept events with a sequence number greater than `seq`, oldest first.
+        """
+        if not self._history or seq >= self._history[-1].seq:
+            return []
+        start = max(0, seq - self._history[0].seq + 1)
+        return list(itertools.islice(self._history, start, None))
+
+    def subscribe(self, since=None, maxsize=1024, overflow="drop_oldest"):
+        """
+        Follow the events with `async for event in events.subscribe(since=snapshot.version): ...`.
+        With `since`, the kept events after that sequence number are delivered first.
+        Returns a NotificationQueue; call its `aclose()` to unsubscribe.
+        """
+        if overflow == "block":
+            raise ValueError("Events are published from state callbacks, which can't wait")
+        queues = self._queues
+
+        async def on_close():
+            if queue in queues:
+                queues.remove(queue)
+
+        queue = NotificationQueue(maxsize=maxsize, overflow=overflow, on_close=on_close)
+        if since is not None:
+            for event in self.since(since):
+                queue.put(event)
+        queues.append(queue)
+        return queue
+
+    def close(self):
+        """
+        End the iteration of all subscribers.
+        """
+        for queue in self._queues:
+            queue.close()
+        self._queues = []
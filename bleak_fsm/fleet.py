@@ -0,0 +1,155 @@
+"""
+This module contains the BleakFleet class, which drives many BleakModel instances at once.
+
+Each device still has its own BleakModel and state machine.
+The fleet runs their transitions concurrently, limiting how many connection attempts
+hit the adapter at the same time, and reports the outcome per device
+instead of a single boolean.
+"""
+
+import asyncio
+import logging
+import time
+
+from .bleak_model import BleakModel
+
+logger = logging.getLogger(__name__)
+
+
+class FleetResult:
+    """
+    Outcome of a fleet operation for one device.
+
+    `stage` is the last transition that was attempted ("set_target", "connect", "stream", "clean_up").
+    `reason` is None on success, "failed" if the transition returned False,
+    "timeout" if it didn't finish in time, or the text of the exception that was raised.
+    """
+
+    __slots__ = ("address", "ok", "state", "stage", "reason", "duration")
+
+    def __init__(self, address, ok, state, stage, reason=None, duration=0.0):
+        self.address = address
+        self.ok = ok
+        self.state = state
+        self.stage = stage
+        self.reason = reason
+        self.duration = duration
+
+    def __repr__(self):
+        return (
+            f"FleetResult(address={self.address!r}, ok={self.ok!r}, state={self.state!r}, "
+            f"stage={self.stage!r}, reason={self.reason!r}, duration={self.duration:.3f})"
+        )
+
+
+class BleakFleet:
+    """
+    Brings a list of devices to the Streaming state concurrently, and tears them down in parallel.
+
+    `configure` is called with `(model, address)` for every model created,
+    and should set `wrap`, `enable_notifications`, `disable_notifications`
+    and `set_measurement_handler` as you would for a single BleakModel.
+
+    `max_concurrent_connects` caps parallel connection attempts,
+    since most adapters fail when too many connects are in flight.
+
+    No scan is needed beforehand: targets are set with `discover=True`, so connect() waits
+    (up to each model's `discovery_timeout`) for devices that haven't been seen yet.
+    """
+
+    def __init__(
+        self,
+        addresses,
+        configure=None,
+        max_concurrent_connects=3,
+        connection_timeout=5.0,
+        teardown_timeout=5.0,
+        model_factory=BleakModel,
+    ):
+        self.addresses = list(addresses)
+        self.max_concurrent_connects = max_concurrent_connects
+        self.teardown_timeout = teardown_timeout
+        self.models = {}
+        for address in self.addresses:
+            model = model_factory(connection_timeout=connection_timeout)
+            if configure is not None:
+                configure(model, address)
+            self.models[address] = model
+        self._connect_semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.clean_up()
+
+    async def start(self):
+        """
+        Run set_target -> connect -> stream on every device.
+        Returns a dict of address -> FleetResult.
+        """
+        self._connect_semaphore = asyncio.Semaphore(self.max_concurrent_connects)
+        results = await asyncio.gather(
+            *(self._start_one(address) for address in self.addresses)
+        )
+        return {result.address: result for result in results}
+
+    async def clean_up(self, timeout=None):
+        """
+        Clean up every device in parallel, each with its own timeout (seconds).
+        Returns a dict of address -> FleetResult.
+        """
+        if timeout is None:
+            timeout = self.teardown_timeout
+        results = await asyncio.gather(
+            *(self._clean_up_one(address, timeout) for address in self.addresses)
+        )
+        return {result.address: result for result in results}
+
+    async def _start_one(self, address):
+        model = self.models[address]
+        start = time.monotonic()
+        stage = "set_target"
+        try:
+            # addresses that haven't been scanned yet are discovered by connect()
+            if model.state == "Init" and not await model.set_target(address, discover=True):
+                return self._result(address, False, stage, "failed", start)
+
+            stage = "connect"
+            if model.state == "TargetSet":
+                async with self._connect_semaphore:
+                    if not await model.connect():
+                        return self._result(address, False, stage, "failed", start)
+
+            stage = "stream"
+            if model.state == "Connected" and not await model.stream():
+                return self._result(address, False, stage, "failed", start)
+        except Exception as e:
+            logger.error("An error occurred while starting %s. Error: %s", address, e)
+            return self._result(address, False, stage, str(e), start)
+        ok = model.state == "Streaming"
+        return self._result(address, ok, stage, None if ok else "failed", start)
+
+    async def _clean_up_one(self, address, timeout):
+        model = self.models[address]
+        start = time.monotonic()
+        try:
+            # the model abandons a disconnection that doesn't finish in time, and still reaches Init
+            ok = await model.clean_up(timeout=timeout)
+        except Exception as e:
+            logger.error("An error occurred while cleaning up %s. Error: %s", address, e)
+            return self._result(address, False, "clean_up", str(e), start)
+        if ok and getattr(model, "_failure_reason", None) == "timeout":
+            logger.warning("Timed out while cleaning up %s", address)
+            return self._result(address, False, "clean_up", "timeout", start)
+        return self._result(address, ok, "clean_up", None if ok else "failed", start)
+
+    def _result(self, address, ok, stage, reason, start):
+        return FleetResult(
+            address,
+            ok,
+            self.models[address].state,
+            stage,
+            reason,
+            time.monotonic() - start,
+        )
@@ -0,0 +1,304 @@
+"""
+This module contains the metrics sinks that BleakModel reports to.
+
+BleakModel times every transition (duration, outcome, failure reason),
+and counts notifications, bytes and inter-arrival jitter per streamed characteristic.
+It reports them to `BleakModel.metrics` (or a per-instance `model.metrics`),
+which is a no-op MetricsSink unless you set one:
+
+    metrics = InMemoryMetrics()
+    BleakModel.metrics = metrics
+    ...
+    print(metrics.histogram("transition_duration_seconds", trigger="connect", ...).quantile(0.9))
+    print(PrometheusExporter(metrics).render())
+
+Implement the three methods of MetricsSink to forward them to another system.
+"""
+
+import asyncio
+import bisect
+import math
+
+# seconds; covers everything from a notification gap to a slow connect
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class MetricsSink:
+    """
+    Receives metrics from BleakModel. The base class discards them.
+    `labels` is a dict of label name to value.
+    """
+
+    def increment(self, name, amount=1, labels=None):
+        """
+        Add `amount` to a counter.
+        """
+
+    def observe(self, name, value, labels=None):
+        """
+        Record one observation in a histogram.
+        """
+
+    def set_gauge(self, name, value, labels=None):
+        """
+        Set the current value of a gauge.
+        """
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. `counts[i]` counts observations <= `buckets[i]`
+    (and above the previous bound); the last entry counts observations above every bound.
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else math.nan
+
+    def quantile(self, q):
+        """
+        Estimate the `q` quantile (0 to 1) by interpolating within the bucket it falls in.
+        """
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower  # above the last bound: all we know is the lower bound
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+class InMemoryMetrics(MetricsSink):
+    """
+    Keeps counters, gauges and histograms in memory, for inspection or Prometheus export.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counters = {}  # (name, labels) -> value
+        self.gauges = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+
+    def increment(self, name, amount=1, labels=None):
+        key = (name, _label_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=None):
+        key = (name, _label_key(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def set_gauge(self, name, value, labels=None):
+        self.gauges[(name, _label_key(labels))] = value
+
+    def counter(self, name, **labels):
+        return self.counters.get((name, _label_key(labels)), 0)
+
+    def gauge(self, name, **labels):
+        return self.gauges.get((name, _label_key(labels)))
+
+    def histogram(self, name, **labels):
+        return self.histograms.get((name, _label_key(labels)))
+
+    def find(self, name, **labels):
+        """
+        All histograms named `name` whose labels include `labels`, as a list of (labels dict, Histogram).
+        """
+        wanted = set(labels.items())
+        return [
+            (dict(key), histogram)
+            for (histogram_name, key), histogram in self.histograms.items()
+            if histogram_name == name and wanted.issubset(key)
+        ]
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in items
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class PrometheusExporter:
+    """
+    Renders an InMemoryMetrics in the Prometheus text exposition format,
+    and optionally serves it over HTTP.
+    """
+
+    def __init__(self, metrics, namespace="bleak_fsm"):
+        self.metrics = metrics
+        self.namespace = namespace
+
+    def _name(self, name):
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def render(self):
+        lines = []
+        for kind, samples in (
+            ("counter", self.metrics.counters),
+            ("gauge", self.metrics.gauges),
+        ):
+            declared = set()
+            for (name, labels), value in sorted(samples.items()):
+                full_name = self._name(name)
+                if full_name not in declared:
+                    lines.append(f"# TYPE {full_name} {kind}")
+                    declared.add(full_name)
+                lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+
+        declared = set()
+        for (name, labels), histogram in sorted(
+            self.metrics.histograms.items(), key=lambda item: item[0]
+        ):
+            full_name = self._name(name)
+            if full_name not in declared:
+                lines.append(f"# TYPE {full_name} histogram")
+                declared.add(full_name)
+            cumulative = 0
+            for bound, bucket_count in zip(
+                histogram.buckets + (math.inf,), histogram.counts
+            ):
+                cumulative += bucket_count
+                le = _format_value(bound)
+                lines.append(
+                    f"{full_name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}"
+                )
+            lines.append(
+                f"{full_name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}"
+            )
+            lines.append(f"{full_name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host="127.0.0.1", port=9464, before_render=None):
+        """
+        Serve the metrics over HTTP on every path. Returns the asyncio server.
+        Only local clients can connect by default; pass `host="0.0.0.0"` to accept scrapes
+        from other machines. `before_render` is called before each scrape,
+        e.g. `BleakModel.report_all_stream_stats`.
+        """
+
+        async def handle(reader, writer):
+            try:
+                await reader.readuntil(b"\r\n\r\n")
+                if before_render is not None:
+                    before_render()
+                body = self.render().encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: text/plain; version=0.0.4\r\n"
+                    + f"Content-Length: {len(body)}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
+
+
+class StreamStats:
+    """
+    Per-characteristic notification counters, updated in O(1) per notification.
+    Inter-arrival jitter is the standard deviation of the time between notifications
+    (Welford's online algorithm).
+    """
+
+    __slots__ = (
+        "count",
+        "bytes",
+        "first",
+        "last",
+        "mean_interval",
+        "_m2",
+        "_reported_count",
+        "_reported_bytes",
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self.first = None
+        self.last = None
+        self.mean_interval = 0.0
+        self._m2 = 0.0
+        self._reported_count = 0
+        self._reported_bytes = 0
+
+    def add(self, timestamp, size):
+        if self.last is None:
+            self.first = timestamp
+        else:
+            interval = timestamp - self.last
+            intervals = self.count  # number of intervals including this one
+            delta = interval - self.mean_interval
+            self.mean_interval += delta / intervals
+            self._m2 += delta * (interval - self.mean_interval)
+        self.last = timestamp
+        self.count += 1
+        self.bytes += size
+
+    @property
+    def jitter(self):
+        intervals = self.count - 1
+        return math.sqrt(self._m2 / (intervals - 1)) if intervals > 1 else 0.0
+
+    @property
+    def elapsed(self):
+        return self.last - self.first if self.count > 1 else 0.0
+
+    @property
+    def notifications_per_second(self):
+        return (self.count - 1) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def report(self, sink, labels):
+        """
+        Push counters (as increments since the last report) and rate/jitter gauges to `sink`.
+        """
+        sink.increment("notifications_total", self.count - self._reported_count, labels)
+        sink.increment("notification_bytes_total", self.bytes - self._reported_bytes, labels)
+        self._reported_count = self.count
+        self._reported_bytes = self.bytes
+        sink.set_gauge("notifications_per_second", self.notifications_per_second, labels)
+        sink.set_gauge("notification_bytes_per_second", self.bytes_per_second, labels)
+        sink.set_gauge("notification_jitter_seconds", self.jitter, labels)
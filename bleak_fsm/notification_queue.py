@@ -0,0 +1,131 @@
+"""
+This module contains the NotificationQueue class, returned by `BleakModel.iter_notifications()`.
+
+It is a bounded queue of notifications that is consumed with `async for`,
+so that downstream consumers can be plain coroutines.
+When the consumer falls behind, the overflow policy decides whether samples are dropped
+or the producer waits, and counters record what happened.
+"""
+
+import asyncio
+from collections import deque, namedtuple
+
+from .ring_buffer import OVERFLOW_POLICIES
+
+# `timestamp` is the host arrival time (time.monotonic), `data` the raw payload.
+Notification = namedtuple("Notification", ["timestamp", "characteristic", "data"])
+
+
+class NotificationQueue:
+    """
+    Bounded queue of Notification tuples.
+
+    `overflow` is one of "drop_oldest", "count_and_drop" or "block", as for NotificationRingBuffer.
+    With "block", at most `max_waiting` producers (by default `maxsize`) wait for room.
+    `queued` counts samples accepted into the queue, `dropped` samples discarded.
+
+    Iteration ends when the stream stops (the queue is closed) and the queue is drained.
+    Call `aclose()` to stop consuming early.
+    """
+
+    def __init__(
+        self, maxsize=256, overflow="drop_oldest", on_start=None, on_close=None, max_waiting=None
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}"
+            )
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.max_waiting = maxsize if max_waiting is None else max_waiting
+        self.queued = 0
+        self.dropped = 0
+        self.closed = False
+
+        self._items = deque()
+        self._waiting = 0  # producers waiting for room
+        self._data_ready = asyncio.Event()
+        self._space_ready = asyncio.Event()
+        # Coroutine functions called on first read / on aclose(), set by BleakModel.
+        self._on_start = on_start
+        self._on_close = on_close
+
+    def __len__(self):
+        return len(self._items)
+
+    # --- Producer side ---
+
+    def put(self, item):
+        """
+        Add a sample without waiting. Returns False if it was dropped.
+        """
+        if len(self._items) >= self.maxsize:
+            if self.overflow == "drop_oldest":
+                self._items.popleft()
+                self.dropped += 1
+            else:
+                self.dropped += 1
+                return False
+        self._items.append(item)
+        self.queued += 1
+        self._data_ready.set()
+        return True
+
+    async def put_wait(self, item):
+        """
+        Like `put`, but with the "block" policy waits for room instead of dropping.
+        """
+        if self.overflow == "block" and len(self._items) >= self.maxsize:
+            if self._waiting >= self.max_waiting:
+                self.dropped += 1
+                return False
+            self._waiting += 1
+            try:
+                while len(self._items) >= self.maxsize and not self.closed:
+                    self._space_ready.clear()
+                    await self._space_ready.wait()
+            finally:
+                self._waiting -= 1
+        return self.put(item)
+
+    # --- Consumer side ---
+
+    async def get(self):
+        """
+        Wait for the next sample. Raises StopAsyncIteration once closed and drained.
+        """
+        if self._on_start is not None:
+            on_start, self._on_start = self._on_start, None
+            await on_start()
+        while not self._items:
+            if self.closed:
+                raise StopAsyncIteration
+            self._data_ready.clear()
+            await self._data_ready.wait()
+        item = self._items.popleft()
+        self._space_ready.set()
+        return item
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+    def close(self):
+        """
+        End the stream: wake up the consumer and producers.
+        """
+        self.closed = True
+        self._data_ready.set()
+        self._space_ready.set()
+
+    async def aclose(self):
+        """
+        Stop consuming: unsubscribe from the model and end iteration.
+        """
+        self.close()
+        self._items.clear()
+        if self._on_close is not None:
+            on_close, self._on_close = self._on_close, None
+            await on_close()
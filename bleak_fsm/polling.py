@@ -0,0 +1,162 @@
+"""
+This module contains the PollScheduler class, which reads characteristics that don't notify
+on a fixed period, for `BleakModel.poll()`.
+
+All polled reads of all models run off one timer wheel (a single task, ticking every `tick` seconds),
+instead of a sleeping task per read. A new entry starts in the least busy tick of its first period,
+so that reads of many devices with the same period are staggered instead of arriving in bursts,
+and at most `max_concurrent_reads` reads are in flight at once.
+"""
+
+import asyncio
+import inspect
+import logging
+
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class PollStats:
+    """
+    Counters of a polled characteristic. `latency` is a Histogram of read round trips (seconds);
+    `skipped` counts periods where the previous read was still running.
+    """
+
+    __slots__ = ("reads", "failures", "skipped", "latency")
+
+    def __init__(self):
+        self.reads = 0
+        self.failures = 0
+        self.skipped = 0
+        self.latency = Histogram()
+
+    def __repr__(self):
+        return (
+            f"PollStats(reads={self.reads}, failures={self.failures}, skipped={self.skipped}, "
+            f"mean_latency={self.latency.mean:.4f})"
+        )
+
+
+class PollEntry:
+    """
+    A periodic read registered with PollScheduler.add(). Call `cancel()` to stop it.
+    """
+
+    __slots__ = ("scheduler", "period_ticks", "read", "spawn", "stats", "due", "busy", "cancelled")
+
+    def __init__(self, scheduler, period_ticks, read, spawn, stats):
+        self.scheduler = scheduler
+        self.period_ticks = period_ticks
+        self.read = read
+        self.spawn = spawn
+        self.stats = stats
+        self.due = 0  # tick of the next read
+        self.busy = False
+        self.cancelled = False
+
+    def cancel(self):
+        if not self.cancelled:
+            self.cancelled = True
+            self.scheduler._entries -= 1
+
+    def _fire(self):
+        if self.busy:
+            self.stats.skipped += 1
+            return
+        self.busy = True
+        self.spawn(self._read(), "poll")
+
+    async def _read(self):
+        try:
+            async with self.scheduler._reads:
+                if not self.cancelled:
+                    result = self.read()
+                    if inspect.isawaitable(result):
+                        await result
+        finally:
+            self.busy = False
+
+
+class PollScheduler:
+    """
+    Timer wheel of `slots` slots, advancing one slot every `tick` seconds.
+    Periods are rounded to whole ticks; entries due further out than one revolution
+    wait in their slot until their tick comes.
+    """
+
+    def __init__(self, tick=0.01, slots=512, max_concurrent_reads=4):
+        self.tick = tick
+        self.slots = slots
+        self.max_concurrent_reads = max_concurrent_reads
+        self._wheel = [[] for _ in range(slots)]
+        self._entries = 0  # live (not cancelled) entries
+        self._now = 0  # current tick
+        self._task = None
+        self._reads = None
+
+    def __len__(self):
+        return self._entries
+
+    def add(self, period, read, spawn, stats=None):
+        """
+        Call `read()` (a coroutine function) every `period` seconds, through `spawn(coroutine, name)`.
+        Returns the PollEntry.
+        """
+        self._ensure_running()
+        period_ticks = max(1, round(period / self.tick))
+        entry = PollEntry(
+            self, period_ticks, read, spawn, PollStats() if stats is None else stats
+        )
+        # stagger: start in the least busy slot of the first period
+        first = self._now + 1
+        offset = min(
+            range(min(period_ticks, self.slots)),
+            key=lambda offset: len(self._wheel[(first + offset) % self.slots]),
+        )
+        entry.due = first + offset
+        self._wheel[entry.due % self.slots].append(entry)
+        self._entries += 1
+        return entry
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._task.get_loop() is loop:
+            return
+        if self._task is not None and self._task.get_loop() is not loop:
+            # left over from an event loop that is gone
+            self._wheel = [[] for _ in range(self.slots)]
+            self._entries = 0
+        self._reads = asyncio.Semaphore(self.max_concurrent_reads)
+        self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        started = loop.time() - self._now * self.tick
+        while self._entries > 0:
+            self._now += 1
+            delay = started + self._now * self.tick - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # when running late, missed ticks are processed right away, each entry firing once
+            self._advance()
+        self._wheel = [[] for _ in range(self.slots)]
+        self._task = None
+
+    def _advance(self):
+        now = self._now
+        index = now % self.slots
+        entries = self._wheel[index]
+        self._wheel[index] = []
+        for entry in entries:
+            if entry.cancelled:
+                continue
+            if entry.due > now:
+                self._wheel[index].append(entry)  # due in a later revolution
+                continue
+            entry.due = now + entry.period_ticks
+            self._wheel[entry.due % self.slots].append(entry)
+            try:
+                entry._fire()
+            except Exception as e:
+                logger.error("An error occurred while starting a polled read. Error: %s", e)
@@ -0,0 +1,248 @@
+"""
+This module contains the NotificationRecorder class, which appends raw notifications to a compact
+binary log, the RecordingReader class, which reads such a log through a memory map,
+and the ReplaySource class, which plays a log back (see `BleakModel.replay()`).
+
+    with NotificationRecorder("session.bfsm") as recorder:
+        model.record(HEART_RATE_MEASUREMENT_UUID, recorder)
+        await model.stream()
+        ...
+
+    with RecordingReader("session.bfsm") as reader:
+        for notification in reader:
+            notification.wall_time, notification.address, notification.data
+
+File format: the magic bytes `BFSMREC1`, then records of
+`<u32 length><u8 type><body of length - 1 bytes>` (little endian):
+
+- type 0, notification: `<f64 timestamp><u16 address id><u16 characteristic id>` then the payload
+- type 1, string: `<u16 id>` then UTF-8 text, defining an id used by the records that follow
+- type 2, session: `<f64 epoch offset>`, written each time a recorder opens the file.
+  `timestamp + epoch offset` is the wall-clock time (timestamps are time.monotonic(), like
+  everywhere else in bleak_fsm), and string ids restart.
+
+A record cut short by a crash ends the log; everything before it is readable.
+"""
+
+import asyncio
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+
+MAGIC = b"BFSMREC1"
+NOTIFICATION, STRING, SESSION = 0, 1, 2
+MAX_STRINGS = 0xFFFF
+
+_PREFIX = struct.Struct("<IB")  # length (of type + body), type
+_NOTIFICATION = struct.Struct("<dHH")
+_STRING = struct.Struct("<H")
+_SESSION = struct.Struct("<d")
+
+RecordedNotification = namedtuple(
+    "RecordedNotification",
+    ["timestamp", "wall_time", "address", "characteristic_uuid", "data"],
+)
+
+
+class NotificationRecorder:
+    """
+    Appends notifications to `path`. `write()` only packs the record into a memory buffer;
+    a background thread writes the buffer to the file every `flush_interval` seconds,
+    or as soon as it holds `buffer_size` bytes. Close it (or use `with`) to write the rest.
+    """
+
+    def __init__(self, path, flush_interval=0.5, buffer_size=1 << 16):
+        self.path = os.path.expanduser(path)
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.notifications = 0  # written so far
+        self.bytes_written = 0
+        self._file = open(self.path, "ab")
+        self._buffer = bytearray()
+        self._lock = threading.Lock()  # guards the buffer
+        self._write_lock = threading.Lock()  # keeps chunks in order in the file
+        self._wake = threading.Event()
+        self._closed = False
+        self._ids = {}  # string -> id, for this session
+        if self._file.tell() == 0:
+            self._buffer += MAGIC
+        self._start_session()
+        self._thread = threading.Thread(
+            target=self._run, name="bleak_fsm-recorder", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _start_session(self):
+        self._ids.clear()
+        self._buffer += _PREFIX.pack(_SESSION.size + 1, SESSION)
+        self._buffer += _SESSION.pack(time.time() - time.monotonic())
+
+    def _define(self, *strings):
+        """
+        Assign ids to strings seen for the first time, starting a new session when the ids run out.
+        """
+        ids = self._ids
+        new = [text for text in strings if text not in ids]
+        if len(ids) + len(new) > MAX_STRINGS:
+            self._start_session()
+            new = list(dict.fromkeys(strings))
+        for text in new:
+            string_id = ids[text] = len(ids)
+            encoded = text.encode()
+            self._buffer += _PREFIX.pack(_STRING.size + 1 + len(encoded), STRING)
+            self._buffer += _STRING.pack(string_id)
+            self._buffer += encoded
+        return [ids[text] for text in strings]
+
+    def write(self, timestamp, address, characteristic_uuid, data):
+        """
+        Record one notification. `timestamp` is time.monotonic() seconds.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            ids = self._ids
+            address_id = ids.get(address)
+            characteristic_id = ids.get(characteristic_uuid)
+            if address_id is None or characteristic_id is None:
+                address_id, characteristic_id = self._define(address, characteristic_uuid)
+            buffer = self._buffer
+            buffer += _PREFIX.pack(_NOTIFICATION.size + 1 + len(data), NOTIFICATION)
+            buffer += _NOTIFICATION.pack(timestamp, address_id, characteristic_id)
+            buffer += data
+            self.notifications += 1
+            if len(buffer) >= self.buffer_size:
+                self._wake.set()
+
+    def _drain(self):
+        with self._write_lock:
+            with self._lock:
+                chunk = self._buffer
+                self._buffer = bytearray()
+            if chunk:
+                self._file.write(chunk)
+                self._file.flush()
+                self.bytes_written += len(chunk)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._drain()
+
+    def flush(self):
+        """
+        Write everything recorded so far to the file, from the calling thread.
+        """
+        self._drain()
+
+    def close(self):
+        if self._closed:
+            return
+        with self._lock:
+            self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self._drain()
+        self._file.close()
+
+
+class RecordingReader:
+    """
+    Reads a log written by NotificationRecorder through a read-only memory map.
+    Iterating yields RecordedNotification tuples in file order.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self._file = open(self.path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        )
+        if size and self._map[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a bleak_fsm recording")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __iter__(self):
+        view = self._map
+        end = len(view)
+        position = len(MAGIC)
+        strings = {}
+        offset = 0.0
+        while position + _PREFIX.size <= end:
+            length, kind = _PREFIX.unpack_from(view, position)
+            body = position + _PREFIX.size
+            position += 4 + length
+            if position > end:
+                break  # cut short
+            if kind == NOTIFICATION:
+                timestamp, address_id, characteristic_id = _NOTIFICATION.unpack_from(
+                    view, body
+                )
+                yield RecordedNotification(
+                    timestamp,
+                    timestamp + offset,
+                    strings[address_id],
+                    strings[characteristic_id],
+                    view[body + _NOTIFICATION.size : position],
+                )
+            elif kind == STRING:
+                (string_id,) = _STRING.unpack_from(view, body)
+                strings[string_id] = view[body + _STRING.size : position].decode()
+            elif kind == SESSION:
+                (offset,) = _SESSION.unpack_from(view, body)
+                strings = {}
+
+
+class ReplaySource:
+    """
+    Notifications of a recording, for `BleakModel.replay()`.
+    `speed` replays them paced as recorded (2.0 is twice as fast); None replays them as fast as possible.
+    `address` and `characteristics` restrict which notifications are replayed.
+    """
+
+    def __init__(self, path, speed=None, address=None, characteristics=None):
+        self.path = path
+        self.speed = speed
+        self.address = address
+        self.characteristics = None if characteristics is None else set(characteristics)
+
+    async def __aiter__(self):
+        started = None
+        with RecordingReader(self.path) as reader:
+            for notification in reader:
+                if self.address is not None and notification.address != self.address:
+                    continue
+                if (
+                    self.characteristics is not None
+                    and notification.characteristic_uuid not in self.characteristics
+                ):
+                    continue
+                if self.speed:
+                    now = time.monotonic()
+                    if started is None:
+                        started = (now, notification.wall_time)
+                    due = started[0] + (notification.wall_time - started[1]) / self.speed
+                    await asyncio.sleep(max(0.0, due - now))
+                yield notification
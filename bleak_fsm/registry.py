@@ -0,0 +1,418 @@
+"""
+This module contains the DeviceRegistry class, which stores the devices discovered by a scan.
+
+It replaces the plain `{address: (BLEDevice, AdvertisementData)}` dict that BleakModel used to keep.
+The registry is bounded (by number of devices and by time since last seen),
+and keeps secondary indexes on name, service UUID, RSSI and last-seen time,
+so that queries like "all heart rate devices seen in the last 10 seconds"
+don't need to walk every device ever discovered.
+
+The address-keyed mapping API (`in`, `[]`, `pop`, `items`, `len`, ...) is kept,
+and records unpack like the legacy `(device, advertisement_data)` tuple.
+
+The registry can be saved to a JSON snapshot and loaded in the next process,
+so that known devices can be targeted without scanning first.
+
+Listeners (see `add_listener`) are told about every device added, updated or removed,
+e.g. to publish registry diffs through bleak_fsm.events.
+"""
+
+import bisect
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+
+SNAPSHOT_VERSION = 1
+
+
+class DeviceRecord:
+    """
+    Compact record of a discovered device.
+
+    Behaves like the legacy `(device, advertisement_data)` tuple
+    when unpacked or indexed, so existing code keeps working.
+    """
+
+    __slots__ = (
+        "address",
+        "device",
+        "advertisement_data",
+        "name",
+        "rssi",
+        "service_uuids",
+        "last_seen",
+    )
+
+    def __init__(self, address, device, advertisement_data, last_seen):
+        self.address = address
+        self._fill(device, advertisement_data, last_seen)
+
+    def _fill(self, device, advertisement_data, last_seen):
+        self.device = device
+        self.advertisement_data = advertisement_data
+        self.name = getattr(advertisement_data, "local_name", None) or getattr(
+            device, "name", None
+        )
+        self.rssi = getattr(advertisement_data, "rssi", None)
+        self.service_uuids = tuple(
+            uuid.lower()
+            for uuid in (getattr(advertisement_data, "service_uuids", None) or ())
+        )
+        self.last_seen = last_seen
+
+    @property
+    def cached(self):
+        """
+        True for a record restored from a snapshot, which has no BLEDevice or AdvertisementData
+        until the device is seen again.
+        """
+        return self.device is None
+
+    def __iter__(self):
+        yield self.device
+        yield self.advertisement_data
+
+    def __getitem__(self, index):
+        return (self.device, self.advertisement_data)[index]
+
+    def __repr__(self):
+        return (
+            f"DeviceRecord(address={self.address!r}, name={self.name!r}, "
+            f"rssi={self.rssi!r}, last_seen={self.last_seen!r})"
+        )
+
+
+class DeviceRegistry:
+    """
+    Bounded, indexed store of discovered devices, keyed by address.
+
+    `max_size` caps the number of devices kept; the least recently seen device is evicted first.
+    `ttl` (seconds) evicts devices that haven't advertised for that long.
+    Either may be None to disable that bound.
+    """
+
+    def __init__(self, max_size=None, ttl=None, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+
+        # address -> DeviceRecord, ordered from least to most recently seen
+        self._records = OrderedDict()
+        # secondary indexes
+        self._by_name = {}  # name -> set of addresses
+        self._by_service = {}  # lowercase service UUID -> set of addresses
+        self._by_rssi = []  # sorted list of (rssi, address)
+        # callables taking ("added" | "updated" | "removed", DeviceRecord)
+        self._listeners = []
+
+    # --- Mapping API ---
+
+    def __contains__(self, address):
+        self.expire()
+        return address in self._records
+
+    def __getitem__(self, address):
+        self.expire()
+        return self._records[address]
+
+    def __setitem__(self, address, value):
+        """
+        Store a `DeviceRecord` or a `(device, advertisement_data)` tuple under `address`.
+        """
+        device, advertisement_data = value
+        self.add(device, advertisement_data, address=address)
+
+    def __delitem__(self, address):
+        record = self._records.pop(address)
+        self._unindex(record)
+        self._changed("removed", record)
+
+    def __len__(self):
+        self.expire()
+        return len(self._records)
+
+    def __iter__(self):
+        self.expire()
+        return iter(list(self._records))
+
+    def __repr__(self):
+        return f"DeviceRegistry({list(self._records.values())!r})"
+
+    def get(self, address, default=None):
+        self.expire()
+        return self._records.get(address, default)
+
+    def pop(self, address, *default):
+        self.expire()
+        if address not in self._records:
+            if default:
+                return default[0]
+            raise KeyError(address)
+        record = self._records.pop(address)
+        self._unindex(record)
+        self._changed("removed", record)
+        return record
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        self.expire()
+        return list(self._records.values())
+
+    def items(self):
+        self.expire()
+        return list(self._records.items())
+
+    def clear(self):
+        if self._listeners:
+            for record in list(self._records.values()):
+                self._changed("removed", record)
+        self._records.clear()
+        self._by_name.clear()
+        self._by_service.clear()
+        self._by_rssi.clear()
+
+    # --- Writing ---
+
+    def add(self, device, advertisement_data, address=None):
+        """
+        Insert or refresh a device from a scanner detection callback.
+        Returns the stored DeviceRecord.
+        """
+        if address is None:
+            address = device.address
+        now = self._clock()
+
+        record = self._records.get(address)
+        if record is None:
+            record = DeviceRecord(address, device, advertisement_data, now)
+            self._records[address] = record
+            change = "added"
+        else:
+            # re-use the record instead of allocating a new one for every advertisement
+            self._unindex(record)
+            record._fill(device, advertisement_data, now)
+            self._records.move_to_end(address)
+            change = "updated"
+        self._index(record)
+        self._changed(change, record)
+
+        self.expire(now)
+        self._evict()
+        return record
+
+    def _evict(self):
+        if self.max_size is not None:
+            while len(self._records) > self.max_size:
+                _, evicted = self._records.popitem(last=False)
+                self._unindex(evicted)
+                self._changed("removed", evicted)
+
+    def expire(self, now=None):
+        """
+        Evict devices that haven't been seen within `ttl` seconds.
+        Records are ordered by last-seen time, so this only touches expired records.
+        """
+        if self.ttl is None or not self._records:
+            return
+        if now is None:
+            now = self._clock()
+        cutoff = now - self.ttl
+        while self._records:
+            address, record = next(iter(self._records.items()))
+            if record.last_seen >= cutoff:
+                break
+            del self._records[address]
+            self._unindex(record)
+            self._changed("removed", record)
+
+    # --- Queries ---
+
+    def seen_within(self, seconds):
+        """
+        Records seen in the last `seconds`, most recent first.
+        """
+        self.expire()
+        cutoff = self._clock() - seconds
+        result = []
+        for record in reversed(self._records.values()):
+            if record.last_seen < cutoff:
+                break
+            result.append(record)
+        return result
+
+    def with_name(self, name):
+        self.expire()
+        return [self._records[a] for a in self._by_name.get(name, ())]
+
+    def with_service(self, service_uuid):
+        self.expire()
+        return [
+            self._records[a] for a in self._by_service.get(service_uuid.lower(), ())
+        ]
+
+    def with_min_rssi(self, min_rssi):
+        """
+        Records with RSSI >= `min_rssi`, strongest first.
+        """
+        self.expire()
+        start = bisect.bisect_left(self._by_rssi, (min_rssi,))
+        return [self._records[a] for _, a in reversed(self._by_rssi[start:])]
+
+    def find(self, service_uuid=None, name=None, min_rssi=None, seen_within=None):
+        """
+        Records matching all of the given criteria, most recently seen first.
+        Each criterion is answered from its own index, and the results are intersected.
+        """
+        self.expire()
+        candidates = None
+        if service_uuid is not None:
+            candidates = set(self._by_service.get(service_uuid.lower(), ()))
+        if name is not None:
+            addresses = self._by_name.get(name, set())
+            candidates = (
+                set(addresses) if candidates is None else candidates & addresses
+            )
+        if min_rssi is not None:
+            start = bisect.bisect_left(self._by_rssi, (min_rssi,))
+            addresses = {a for _, a in self._by_rssi[start:]}
+            candidates = addresses if candidates is None else candidates & addresses
+
+        if seen_within is not None:
+            recent = self.seen_within(seen_within)
+            if candidates is None:
+                return recent
+            return [r for r in recent if r.address in candidates]
+
+        if candidates is None:
+            records = list(self._records.values())
+        else:
+            records = [self._records[a] for a in candidates]
+        records.sort(key=lambda r: r.last_seen, reverse=True)
+        return records
+
+    # --- Snapshots ---
+
+    def snapshot(self, wall_now=None):
+        """
+        Compact, JSON-serializable list of known devices: address, name, RSSI, service UUIDs,
+        and last seen as wall-clock time (the registry clock doesn't survive a restart).
+        """
+        self.expire()
+        now = self._clock()
+        wall_now = time.time() if wall_now is None else wall_now
+        return [
+            {
+                "address": record.address,
+                "name": record.name,
+                "rssi": record.rssi,
+                "service_uuids": list(record.service_uuids),
+                "last_seen": wall_now - (now - record.last_seen),
+            }
+            for record in self._records.values()
+        ]
+
+    def restore(self, entries, max_age=None, wall_now=None):
+        """
+        Add the devices of a `snapshot()` as cached records, skipping addresses already known
+        and devices last seen more than `max_age` seconds ago. Returns the number restored.
+        """
+        now = self._clock()
+        wall_now = time.time() if wall_now is None else wall_now
+        restored = 0
+        for entry in entries:
+            age = max(0.0, wall_now - entry["last_seen"])
+            if (max_age is not None and age > max_age) or entry["address"] in self._records:
+                continue
+            record = DeviceRecord(entry["address"], None, None, now - age)
+            record.name = entry.get("name")
+            record.rssi = entry.get("rssi")
+            record.service_uuids = tuple(
+                uuid.lower() for uuid in entry.get("service_uuids", ())
+            )
+            self._records[record.address] = record
+            self._index(record)
+            self._changed("added", record)
+            restored += 1
+        if restored:
+            # keep the least-recently-seen-first order that expire() and eviction rely on
+            self._records = OrderedDict(
+                sorted(self._records.items(), key=lambda item: item[1].last_seen)
+            )
+            self.expire(now)
+            self._evict()
+        return restored
+
+    def save(self, path):
+        """
+        Write a snapshot to `path` (JSON). The file is replaced atomically.
+        """
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"version": SNAPSHOT_VERSION, "devices": self.snapshot()}, f)
+        os.replace(temporary, path)
+
+    def load(self, path, max_age=None):
+        """
+        Restore the snapshot saved at `path`. A missing file restores nothing.
+        Returns the number of devices restored.
+        """
+        try:
+            with open(os.path.expanduser(path)) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return 0
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            return 0
+        return self.restore(snapshot["devices"], max_age=max_age)
+
+    # --- Change listeners ---
+
+    def add_listener(self, listener):
+        """
+        Call `listener(change, record)` whenever a device is "added", "updated" or "removed"
+        (taken by a connection, expired or evicted). Expiry happens lazily, when the registry is used.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _changed(self, change, record):
+        for listener in self._listeners:
+            listener(change, record)
+
+    # --- Index maintenance ---
+
+    def _index(self, record):
+        if record.name is not None:
+            self._by_name.setdefault(record.name, set()).add(record.address)
+        for uuid in record.service_uuids:
+            self._by_service.setdefault(uuid, set()).add(record.address)
+        if record.rssi is not None:
+            bisect.insort(self._by_rssi, (record.rssi, record.address))
+
+    def _unindex(self, record):
+        if record.name is not None:
+            addresses = self._by_name.get(record.name)
+            if addresses is not None:
+                addresses.discard(record.address)
+                if not addresses:
+                    del self._by_name[record.name]
+        for uuid in record.service_uuids:
+            addresses = self._by_service.get(uuid)
+            if addresses is not None:
+                addresses.discard(record.address)
+                if not addresses:
+                    del self._by_service[uuid]
+        if record.rssi is not None:
+            key = (record.rssi, record.address)
+            i = bisect.bisect_left(self._by_rssi, key)
+            if i < len(self._by_rssi) and self._by_rssi[i] == key:
+                del self._by_rssi[i]
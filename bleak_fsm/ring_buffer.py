@@ -0,0 +1,239 @@
+"""
+This module contains the NotificationRingBuffer class, used by `BleakModel.ingest()`.
+
+Instead of calling a Python handler per notification, raw payloads and their arrival times
+are copied into preallocated storage, and consumers read them back in batches.
+A batch is a set of memoryviews into the buffer itself (no copy),
+optionally viewed as NumPy arrays.
+
+NumPy is an optional dependency, only needed for `RingBatch.to_numpy()`.
+"""
+
+import asyncio
+import time
+from array import array
+
+OVERFLOW_POLICIES = ("drop_oldest", "block", "count_and_drop")
+
+
+class RingBatch:
+    """
+    A contiguous run of notifications handed out by NotificationRingBuffer.
+
+    `timestamps` (float seconds, time.monotonic) and `lengths` are memoryviews with one entry per notification.
+    `data` is a memoryview of `count * max_payload` bytes; notification `i` is
+    `data[i * max_payload : i * max_payload + lengths[i]]`, also available as `payload(i)`.
+
+    The views point into the ring buffer and are only valid
+    until the next batch is requested from it.
+    """
+
+    __slots__ = ("count", "max_payload", "timestamps", "lengths", "data")
+
+    def __init__(self, count, max_payload, timestamps, lengths, data):
+        self.count = count
+        self.max_payload = max_payload
+        self.timestamps = timestamps
+        self.lengths = lengths
+        self.data = data
+
+    def __len__(self):
+        return self.count
+
+    def payload(self, index):
+        start = index * self.max_payload
+        return self.data[start : start + self.lengths[index]]
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.timestamps[i], self.payload(i)
+
+    def to_numpy(self):
+        """
+        Returns `(timestamps, lengths, payloads)` as NumPy arrays sharing memory with the buffer.
+        `payloads` has shape `(count, max_payload)`; bytes past `lengths[i]` in row `i` are stale.
+        """
+        try:
+            import numpy as np
+        except ImportError as e:
+            raise ImportError(
+                "RingBatch.to_numpy() requires NumPy. Install it with `pip install numpy`."
+            ) from e
+        timestamps = np.frombuffer(self.timestamps, dtype=np.float64)
+        lengths = np.frombuffer(self.lengths, dtype=np.uint16)
+        payloads = np.frombuffer(self.data, dtype=np.uint8).reshape(
+            self.count, self.max_payload
+        )
+        return timestamps, lengths, payloads
+
+
+class NotificationRingBuffer:
+    """
+    Fixed-size store of `capacity` notifications of up to `max_payload` bytes each.
+    Longer payloads are truncated (and counted in `truncated`).
+
+    `overflow` decides what happens when the buffer is full:
+    - "drop_oldest": the oldest unread notification is discarded to make room.
+      (If the consumer is still holding a batch, the new notification is discarded instead.)
+    - "count_and_drop": the new notification is discarded.
+    - "block": the producer waits for the consumer to make room.
+      Only asynchronous producers (`put_wait`, `async_handler`) can wait;
+      `put` behaves like "count_and_drop".
+      Bleak runs a task per notification for asynchronous callbacks, so at most `max_waiting`
+      producers wait at once (by default `capacity`); further notifications are dropped.
+    Discarded notifications are counted in `dropped`.
+    """
+
+    def __init__(self, capacity=1024, max_payload=64, overflow="drop_oldest", max_waiting=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}"
+            )
+        self.capacity = capacity
+        self.max_payload = max_payload
+        self.overflow = overflow
+        self.max_waiting = capacity if max_waiting is None else max_waiting
+
+        self._data = bytearray(capacity * max_payload)
+        self._view = memoryview(self._data)
+        self._lengths = array("H", [0]) * capacity
+        self._timestamps = array("d", [0.0]) * capacity
+
+        # Absolute counters; slot = counter % capacity.
+        self._write = 0  # notifications written
+        self._read = 0  # notifications released by the consumer
+        self._held = 0  # notifications handed out in the current batch
+        self._waiting = 0  # producers waiting for room
+
+        self.dropped = 0
+        self.truncated = 0
+        self.closed = False
+
+        self._data_ready = asyncio.Event()
+        self._space_ready = asyncio.Event()
+
+    def __len__(self):
+        """
+        Number of notifications not yet handed out to the consumer.
+        """
+        return self._write - self._read - self._held
+
+    # --- Producer side ---
+
+    def put(self, data, timestamp=None):
+        """
+        Copy one notification into the buffer. Returns False if it was dropped.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self._write - self._read >= self.capacity:
+            if self.overflow == "drop_oldest" and self._held == 0:
+                self._read += 1
+                self.dropped += 1
+            else:
+                self.dropped += 1
+                return False
+
+        slot = self._write % self.capacity
+        length = len(data)
+        if length > self.max_payload:
+            length = self.max_payload
+            data = memoryview(data)[:length]
+            self.truncated += 1
+        start = slot * self.max_payload
+        self._view[start : start + length] = data
+        self._lengths[slot] = length
+        self._timestamps[slot] = timestamp
+        self._write += 1
+        self._data_ready.set()
+        return True
+
+    async def put_wait(self, data, timestamp=None):
+        """
+        Like `put`, but with the "block" policy waits for room instead of dropping.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()  # arrival time, not the time we got room
+        if self.overflow == "block" and self._write - self._read >= self.capacity:
+            if self._waiting >= self.max_waiting:
+                self.dropped += 1
+                return False
+            self._waiting += 1
+            try:
+                while self._write - self._read >= self.capacity and not self.closed:
+                    self._space_ready.clear()
+                    await self._space_ready.wait()
+            finally:
+                self._waiting -= 1
+        return self.put(data, timestamp)
+
+    def handler(self, sender, data):
+        """
+        Notification callback for `BleakClient.start_notify`.
+        """
+        self.put(data)
+
+    async def async_handler(self, sender, data):
+        """
+        Notification callback for `BleakClient.start_notify`, for the "block" policy.
+        """
+        await self.put_wait(data, time.monotonic())
+
+    # --- Consumer side ---
+
+    async def get_batch(self, max_batch=None):
+        """
+        Wait for notifications and return them as a RingBatch of at most `max_batch` entries.
+        Releases the previous batch. Returns None once the buffer is closed and empty.
+        """
+        self._release()
+        while self._write == self._read:
+            if self.closed:
+                return None
+            self._data_ready.clear()
+            await self._data_ready.wait()
+
+        start = self._read % self.capacity
+        # a batch never wraps around, so it can be a single memoryview
+        count = min(self._write - self._read, self.capacity - start)
+        if max_batch is not None:
+            count = min(count, max_batch)
+        self._held = count
+        end = start + count
+        return RingBatch(
+            count,
+            self.max_payload,
+            memoryview(self._timestamps)[start:end],
+            memoryview(self._lengths)[start:end],
+            self._view[start * self.max_payload : end * self.max_payload],
+        )
+
+    async def batches(self, max_batch=None):
+        """
+        Async iterator of RingBatch, until the buffer is closed and drained.
+        """
+        while True:
+            batch = await self.get_batch(max_batch)
+            if batch is None:
+                return
+            yield batch
+
+    def __aiter__(self):
+        return self.batches()
+
+    def _release(self):
+        if self._held:
+            self._read += self._held
+            self._held = 0
+            self._space_ready.set()
+
+    def open(self):
+        self.closed = False
+
+    def close(self):
+        """
+        Wake up the consumer and producers; iteration ends once the buffer is drained.
+        """
+        self.closed = True
+        self._data_ready.set()
+        self._space_ready.set()
@@ -0,0 +1,59 @@
+"""
+This module builds the advertisement filter used by `BleakModel.start_scan`.
+
+Service UUIDs are filtered by BleakScanner itself.
+The remaining criteria are compiled once, when the scan starts, into a single predicate
+that runs at the top of the detection callback, before anything is stored or allocated.
+"""
+
+
+def make_scan_filter(name_prefix=None, min_rssi=None, address_allowlist=None):
+    """
+    Returns a predicate `(device, advertisement_data) -> bool`,
+    or None if no criteria were given (so the callback can skip the call entirely).
+
+    `name_prefix` may be a string or a tuple of strings.
+    `address_allowlist` is compared case-insensitively.
+    """
+    checks = []
+
+    # Cheapest and most selective checks first.
+    if address_allowlist is not None:
+        allowed = frozenset(address.upper() for address in address_allowlist)
+
+        def check_address(device, advertisement_data):
+            return device.address.upper() in allowed
+
+        checks.append(check_address)
+
+    if min_rssi is not None:
+
+        def check_rssi(device, advertisement_data):
+            rssi = advertisement_data.rssi
+            return rssi is not None and rssi >= min_rssi
+
+        checks.append(check_rssi)
+
+    if name_prefix is not None:
+        prefixes = (name_prefix,) if isinstance(name_prefix, str) else tuple(name_prefix)
+
+        def check_name(device, advertisement_data):
+            name = advertisement_data.local_name or device.name
+            return name is not None and name.startswith(prefixes)
+
+        checks.append(check_name)
+
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+
+    checks = tuple(checks)
+
+    def accept(device, advertisement_data):
+        for check in checks:
+            if not check(device, advertisement_data):
+                return False
+        return True
+
+    return accept
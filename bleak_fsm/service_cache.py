@@ -0,0 +1,156 @@
+"""
+This module contains the ServiceCache class, an opt-in on-disk cache of discovered GATT service tables.
+
+Full service discovery is the slow part of connecting. With a cache set on BleakModel,
+reconnecting to a known device passes the cached services to the backend instead of
+browsing for them, and asks it to reuse its own cache where it has one
+(`dangerous_use_bleak_cache` on BlueZ, `use_cached_services` on Windows):
+
+    BleakModel.service_cache = ServiceCache()  # ~/.cache/bleak_fsm/gatt_services.json
+
+Entries are keyed by address plus a hash of the stable parts of the advertisement
+(name and service UUIDs, which device registries keep, also for devices restored from a snapshot).
+When the hash doesn't match, or an expected characteristic is missing after connecting,
+the entry is invalidated and the device is discovered in full again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join("~", ".cache", "bleak_fsm", "gatt_services.json")
+
+
+def device_hash(name, service_uuids):
+    """
+    Hash of the advertised name and service UUIDs, which identify a device's firmware/profile.
+    """
+    identity = json.dumps([name, sorted(uuid.lower() for uuid in service_uuids)])
+    return hashlib.sha1(identity.encode()).hexdigest()
+
+
+def advertisement_hash(device, advertisement_data):
+    """
+    `device_hash` of an advertisement.
+    RSSI, TX power and data payloads change between advertisements and are left out.
+    """
+    name = getattr(advertisement_data, "local_name", None) or getattr(
+        device, "name", None
+    )
+    return device_hash(name, getattr(advertisement_data, "service_uuids", None) or ())
+
+
+def record_hash(record):
+    """
+    `device_hash` of a DeviceRecord, which keeps the name and service UUIDs
+    also when it was restored from a snapshot without an advertisement.
+    """
+    return device_hash(record.name, record.service_uuids)
+
+
+def service_table(services):
+    """
+    Serialize a BleakGATTServiceCollection (or any iterable of services with
+    `uuid` and `characteristics`) to `{service UUID: [characteristic UUID, ...]}`.
+    """
+    return {
+        str(service.uuid).lower(): [
+            str(characteristic.uuid).lower()
+            for characteristic in service.characteristics
+        ]
+        for service in services
+    }
+
+
+class ServiceCache:
+    """
+    GATT service tables by device address, persisted as one JSON file.
+    `max_age` (seconds) expires entries; None keeps them until invalidated.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_age=None):
+        self.path = os.path.expanduser(path)
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable service cache %s. Error: %s", self.path, e)
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # write then rename, so that a crash never leaves a truncated file
+            fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logger.warning("Could not write service cache %s. Error: %s", self.path, e)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, address):
+        return address in self._entries
+
+    def get(self, address, device=None, advertisement_data=None, key=None):
+        """
+        The cached `{service UUID: [characteristic UUID, ...]}` of `address`,
+        or None on a miss. A stale entry (advertisement hash changed, or too old) is invalidated.
+        `key` is the hash to check, if already known (see `record_hash`).
+        """
+        entry = self._entries.get(address)
+        if entry is None:
+            self.misses += 1
+            return None
+        if key is None:
+            key = advertisement_hash(device, advertisement_data)
+        if entry["key"] != key or (
+            self.max_age is not None and time.time() - entry["stored"] > self.max_age
+        ):
+            self.misses += 1
+            self.invalidate(address)
+            return None
+        self.hits += 1
+        return entry["services"]
+
+    def put(self, address, device, advertisement_data, services, key=None):
+        """
+        Store the service table discovered for `address`.
+        `services` is a table (see `get`) or a BleakGATTServiceCollection.
+        """
+        if not isinstance(services, dict):
+            services = service_table(services)
+        if key is None:
+            key = advertisement_hash(device, advertisement_data)
+        previous = self._entries.get(address)
+        if previous is not None and previous["key"] == key and previous["services"] == services:
+            return
+        self._entries[address] = {"key": key, "stored": time.time(), "services": services}
+        self._save()
+
+    def invalidate(self, address):
+        if self._entries.pop(address, None) is not None:
+            self.invalidations += 1
+            self._save()
+
+    def clear(self):
+        self._entries.clear()
+        self._save()
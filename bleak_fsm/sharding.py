@@ -0,0 +1,477 @@
+"""
+This module contains the ShardSupervisor class, which runs BleakModel instances
+in worker processes, and the ModelProxy class, which drives one of them from the parent.
+
+A single event loop runs both the Bluetooth callbacks and the measurement handlers on one core.
+With many devices streaming at high rates, spread the models over processes instead:
+
+    async with ShardSupervisor(shards=4) as shards:
+        await shards.start_scan()
+        ...
+        model = await shards.create_model()
+        await model.on_measurement(HEART_RATE_MEASUREMENT_UUID, print)
+        await model.set_target(address)
+        await model.connect()
+        await model.stream()
+
+Each worker has its own event loop, scanner and BleakModel class state.
+The proxy exposes the transitions (`set_target`, `unset_target`, `connect`, `stream`,
+`disconnect`, `clean_up`) and mirrors the worker model's `state`.
+Notifications are decoded in the worker and sent to the parent over a pipe in batches
+(every `batch_interval` seconds, or sooner once `max_batch` samples are waiting).
+
+Everything sent to a worker (`model_factory`, `initializer`, decoders) must be picklable,
+and, with the default "spawn" start method, importable from a module.
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import pickle
+import threading
+
+from .bleak_model import BleakModel
+from .decoders import get_decoder
+
+logger = logging.getLogger(__name__)
+
+TRANSITIONS = ("set_target", "unset_target", "connect", "stream", "disconnect", "clean_up")
+
+
+class ModelProxy:
+    """
+    Parent-side handle of a BleakModel living in a worker process. Created by ShardSupervisor.create_model().
+    Transitions are coroutines returning what the worker's transition returned;
+    they return False if the worker is gone.
+    """
+
+    def __init__(self, shard, model_id):
+        self.shard = shard
+        self.model_id = model_id
+        self.state = "Init"
+        self.target = None
+        self.measurement_handlers = {}  # characteristic UUID -> callback
+
+    def __repr__(self):
+        return f"ModelProxy(shard={self.shard.index}, target={self.target!r}, state={self.state!r})"
+
+    def __getattr__(self, name):
+        if name in TRANSITIONS:
+
+            async def transition(*args, **kwargs):
+                return await self.shard.call(self, name, args, kwargs)
+
+            transition.__name__ = name
+            return transition
+        if name.startswith("is_"):
+            return lambda: self.state == name[3:]
+        raise AttributeError(name)
+
+    async def on_measurement(self, characteristic_uuid, callback, decoder=None):
+        """
+        Call `callback` (in the parent) with each decoded notification from `characteristic_uuid`.
+        Decoding happens in the worker, with the built-in decoder or `decoder`.
+        See BleakModel.on_measurement().
+        """
+        if decoder is None and get_decoder(characteristic_uuid) is None:
+            logger.error("No decoder registered for %s", characteristic_uuid)
+            return False
+        self.measurement_handlers[characteristic_uuid] = callback
+        return await self.shard.call(
+            self, "on_measurement", (characteristic_uuid, decoder), {}
+        )
+
+
+class _Shard:
+    """
+    Parent-side end of one worker process.
+    """
+
+    def __init__(self, index, process, connection, loop):
+        self.index = index
+        self.process = process
+        self.connection = connection
+        self.loop = loop
+        self.proxies = {}  # model id -> ModelProxy
+        self.alive = True
+        self.samples = 0
+        self._pending = {}  # request id -> future
+        self._request_ids = itertools.count()
+        self._send_lock = threading.Lock()
+        self._ready = loop.create_future()
+        self._reader = threading.Thread(
+            target=self._read, name=f"bleak_fsm-shard-{index}", daemon=True
+        )
+        self._reader.start()
+
+    def _send(self, message):
+        with self._send_lock:
+            self.connection.send(message)
+
+    def _read(self):
+        """
+        Reader thread: hands messages from the worker over to the event loop.
+        """
+        while True:
+            try:
+                message = self.connection.recv()
+            except (EOFError, OSError):
+                break
+            try:
+                self.loop.call_soon_threadsafe(self._handle, message)
+            except RuntimeError:
+                return  # the event loop is closed
+        try:
+            self.loop.call_soon_threadsafe(self._closed)
+        except RuntimeError:
+            pass
+
+    def _handle(self, message):
+        kind = message[0]
+        if kind == "samples":
+            _, batch, states = message
+            self.samples += len(batch)
+            proxies = self.proxies
+            for model_id, characteristic_uuid, value in batch:
+                callback = proxies[model_id].measurement_handlers.get(characteristic_uuid)
+                if callback is None:
+                    continue
+                try:
+                    callback(value)
+                except Exception as e:
+                    logger.error(
+                        "An error occurred while handling a measurement from %s. Error: %s",
+                        characteristic_uuid,
+                        e,
+                    )
+            for model_id, (state, target) in states.items():
+                proxies[model_id].state = state
+                proxies[model_id].target = target
+        elif kind == "result":
+            _, request_id, ok, value, state, target, model_id = message
+            if model_id is not None:
+                proxy = self.proxies[model_id]
+                proxy.state = state
+                proxy.target = target
+            future = self._pending.pop(request_id, None)
+            if future is None or future.done():
+                return
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        elif kind == "ready":
+            if not self._ready.done():
+                self._ready.set_result(True)
+
+    def _closed(self):
+        self.alive = False
+        if not self._ready.done():
+            self._ready.set_exception(RuntimeError(f"Shard {self.index} failed to start"))
+        for future in self._pending.values():
+            if not future.done():
+                future.set_result(None)
+        self._pending.clear()
+
+    async def request(self, kind, *args):
+        """
+        Send a request to the worker and wait for its result. Returns None if the worker is gone.
+        """
+        if not self.alive:
+            return None
+        request_id = next(self._request_ids)
+        future = self._pending[request_id] = self.loop.create_future()
+        try:
+            self._send((kind, request_id) + args)
+        except (OSError, ValueError) as e:
+            logger.error("Could not reach shard %d. Error: %s", self.index, e)
+            del self._pending[request_id]
+            return None
+        return await future
+
+    async def call(self, proxy, method, args, kwargs):
+        result = await self.request("call", proxy.model_id, method, args, kwargs)
+        if result is None and not self.alive:
+            logger.error("Shard %d is gone, %s of %s failed", self.index, method, proxy.target)
+            return False
+        return result
+
+
+class ShardSupervisor:
+    """
+    Starts `shards` worker processes (default: one per CPU) and places new models on the least loaded one.
+
+    `model_factory(**kwargs)` creates the models in the workers, and `configure(model)`, if given,
+    is called on each of them there (e.g. to call `ingest` or set `wrap`).
+    `initializer(*initargs)` runs once in each worker before anything else,
+    e.g. to configure logging or install a SimulatedEnvironment.
+    `mp_context` is the multiprocessing start method.
+    """
+
+    def __init__(
+        self,
+        shards=None,
+        model_factory=BleakModel,
+        configure=None,
+        initializer=None,
+        initargs=(),
+        batch_interval=0.02,
+        max_batch=512,
+        mp_context="spawn",
+        start_timeout=30.0,
+    ):
+        self.shard_count = shards or os.cpu_count() or 1
+        self.model_factory = model_factory
+        self.configure = configure
+        self.initializer = initializer
+        self.initargs = tuple(initargs)
+        self.batch_interval = batch_interval
+        self.max_batch = max_batch
+        self.mp_context = multiprocessing.get_context(mp_context)
+        self.start_timeout = start_timeout
+        self.shards = []
+        self._model_ids = itertools.count()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def start(self):
+        """
+        Start the worker processes, and wait until each has its event loop running.
+        """
+        loop = asyncio.get_running_loop()
+        for index in range(self.shard_count):
+            parent_end, child_end = self.mp_context.Pipe()
+            process = self.mp_context.Process(
+                target=_run_worker,
+                args=(
+                    child_end,
+                    self.model_factory,
+                    self.configure,
+                    self.initializer,
+                    self.initargs,
+                    self.batch_interval,
+                    self.max_batch,
+                ),
+                name=f"bleak_fsm-shard-{index}",
+                daemon=True,
+            )
+            process.start()
+            child_end.close()
+            self.shards.append(_Shard(index, process, parent_end, loop))
+        await asyncio.wait_for(
+            asyncio.gather(*(shard._ready for shard in self.shards)), self.start_timeout
+        )
+        return True
+
+    async def create_model(self, **kwargs):
+        """
+        Create a model (with `model_factory(**kwargs)`) on the shard with the fewest models,
+        and return its ModelProxy.
+        """
+        shard = min(
+            (shard for shard in self.shards if shard.alive),
+            key=lambda shard: len(shard.proxies),
+        )
+        model_id = next(self._model_ids)
+        proxy = shard.proxies[model_id] = ModelProxy(shard, model_id)
+        if not await shard.request("create", model_id, kwargs):
+            del shard.proxies[model_id]
+            raise RuntimeError(f"Shard {shard.index} could not create a model")
+        return proxy
+
+    @property
+    def models(self):
+        return [proxy for shard in self.shards for proxy in shard.proxies.values()]
+
+    async def _broadcast(self, kind, *args):
+        results = await asyncio.gather(
+            *(shard.request(kind, *args) for shard in self.shards)
+        )
+        return all(results)
+
+    async def start_scan(self, **kwargs):
+        """
+        Run BleakModel.start_scan(**kwargs) in every worker.
+        """
+        return await self._broadcast("class_call", "start_scan", kwargs)
+
+    async def stop_scan(self):
+        return await self._broadcast("class_call", "stop_scan", {})
+
+    async def clean_up_all(self, timeout=None):
+        """
+        Run BleakModel.clean_up_all(timeout=timeout) in every worker.
+        """
+        return await self._broadcast("class_call", "clean_up_all", {"timeout": timeout})
+
+    async def close(self, timeout=5.0):
+        """
+        Clean up every model, stop the workers, and wait for them to exit
+        (terminating those that don't within `timeout` seconds).
+        """
+        if any(shard.alive for shard in self.shards):
+            try:
+                await asyncio.wait_for(self.clean_up_all(timeout=timeout), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Timed out while cleaning up the shards")
+        for shard in self.shards:
+            if shard.alive:
+                try:
+                    shard._send(("stop",))
+                except (OSError, ValueError):
+                    pass
+        loop = asyncio.get_running_loop()
+        for shard in self.shards:
+            await loop.run_in_executor(None, shard.process.join, timeout)
+            if shard.process.is_alive():
+                logger.warning("Shard %d didn't stop, terminating it", shard.index)
+                shard.process.terminate()
+                await loop.run_in_executor(None, shard.process.join)
+            shard.connection.close()
+        self.shards = []
+        return True
+
+
+def _run_worker(
+    connection, model_factory, configure, initializer, initargs, batch_interval, max_batch
+):
+    """
+    Entry point of a worker process.
+    """
+    if initializer is not None:
+        initializer(*initargs)
+    worker = _Worker(connection, model_factory, configure, batch_interval, max_batch)
+    asyncio.run(worker.run())
+
+
+class _Worker:
+    """
+    Worker-side end: runs the models, answers requests and batches samples.
+    """
+
+    def __init__(self, connection, model_factory, configure, batch_interval, max_batch):
+        self.connection = connection
+        self.model_factory = model_factory
+        self.configure = configure
+        self.batch_interval = batch_interval
+        self.max_batch = max_batch
+        self.models = {}  # model id -> BleakModel
+        self._batch = []
+        self._states = {}  # model id -> (state, target) last sent
+        self._stopped = None
+
+    def _send(self, message):
+        try:
+            self.connection.send(message)
+        except (OSError, ValueError):
+            self._stopped.set()  # the parent is gone
+
+    def _read(self, loop, requests):
+        while True:
+            try:
+                message = self.connection.recv()
+            except (EOFError, OSError):
+                message = ("stop",)
+            loop.call_soon_threadsafe(requests.put_nowait, message)
+            if message[0] == "stop":
+                return
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        requests = asyncio.Queue()
+        threading.Thread(target=self._read, args=(loop, requests), daemon=True).start()
+        flusher = asyncio.ensure_future(self._flush_periodically())
+        tasks = set()
+        self._send(("ready",))
+        while not self._stopped.is_set():
+            message = await requests.get()
+            if message[0] == "stop":
+                break
+            # each request runs on its own, so that a slow connect doesn't hold up the other models
+            task = asyncio.ensure_future(self._serve(message))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await BleakModel.clean_up_all()
+        flusher.cancel()
+        self._flush()
+        self.connection.close()
+
+    async def _serve(self, message):
+        kind, request_id = message[:2]
+        model_id = None
+        try:
+            if kind == "create":
+                _, _, model_id, kwargs = message
+                model = self.model_factory(**kwargs)
+                if self.configure is not None:
+                    self.configure(model)
+                self.models[model_id] = model
+                value = True
+            elif kind == "call":
+                _, _, model_id, method, args, kwargs = message
+                model = self.models[model_id]
+                if method == "on_measurement":
+                    value = self._on_measurement(model_id, model, *args)
+                elif method in TRANSITIONS:
+                    value = await getattr(model, method)(*args, **kwargs)
+                else:
+                    raise AttributeError(method)
+            elif kind == "class_call":
+                _, _, method, kwargs = message
+                value = await getattr(BleakModel, method)(**kwargs)
+            else:
+                raise ValueError(f"Unknown request {kind!r}")
+            reply = (True, value)
+        except Exception as e:
+            reply = (False, e)
+        state, target = None, None
+        if model_id is not None and model_id in self.models:
+            model = self.models[model_id]
+            state, target = model.state, model.target
+            self._states[model_id] = (state, target)
+        ok, value = reply
+        try:
+            pickle.dumps(value)
+        except Exception:
+            ok, value = False, RuntimeError(repr(value))
+        self._flush()  # samples produced before the reply arrive first
+        self._send(("result", request_id, ok, value, state, target, model_id))
+
+    def _on_measurement(self, model_id, model, characteristic_uuid, decoder):
+        batch = self._batch
+
+        def callback(value):
+            batch.append((model_id, characteristic_uuid, value))
+            if len(batch) >= self.max_batch:
+                self._flush()
+
+        return model.on_measurement(characteristic_uuid, callback, decoder=decoder)
+
+    def _changed_states(self):
+        changed = {}
+        for model_id, model in self.models.items():
+            current = (model.state, model.target)
+            if self._states.get(model_id) != current:
+                self._states[model_id] = changed[model_id] = current
+        return changed
+
+    def _flush(self):
+        states = self._changed_states()
+        if not self._batch and not states:
+            return
+        batch = self._batch[:]
+        self._batch.clear()
+        self._send(("samples", batch, states))
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.batch_interval)
+            self._flush()
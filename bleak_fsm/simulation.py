@@ -0,0 +1,468 @@
+"""
+This module contains an in-process simulated Bluetooth backend,
+for testing and benchmarking BleakModel without a Bluetooth adapter or real devices.
+
+A SimulatedEnvironment holds simulated devices (which advertise at a set interval
+and send notifications at a set rate), plus connection latency and failure rate.
+`environment.install()` points BleakModel.scanner_class and BleakModel.client_class
+at SimulatedScanner and SimulatedClient classes bound to that environment:
+
+    environment = SimulatedEnvironment(connect_latency=0.05, seed=1)
+    environment.add_devices(1000, name_prefix="HRM", characteristics={HR_UUID: 100})
+    with environment.install():
+        await BleakModel.start_scan()
+        ...
+"""
+
+import asyncio
+import contextlib
+import heapq
+import inspect
+import random
+import time
+from types import SimpleNamespace
+
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+from bleak.exc import BleakError
+from bleak.uuids import normalize_uuid_str
+
+from .bleak_model import BleakModel
+
+
+def heart_rate_payload(index):
+    """
+    Default notification payload: a Heart Rate Measurement between 60 and 99 bpm.
+    """
+    return bytearray((0x00, 60 + index % 40))
+
+
+# Every simulated device also has these, as real peripherals do.
+GENERIC_SERVICES = {
+    normalize_uuid_str("1800"): [normalize_uuid_str("2a00"), normalize_uuid_str("2a01")],
+    normalize_uuid_str("180a"): [normalize_uuid_str("2a29"), normalize_uuid_str("2a24")],
+}
+DEFAULT_SERVICE_UUID = normalize_uuid_str("fff0")
+
+
+class SimulatedCharacteristic:
+    """
+    A characteristic that notifies `rate` times per second.
+    `payload` is a callable taking the notification index and returning a bytearray.
+    `service_uuid` defaults to the first advertised service of the device.
+    """
+
+    def __init__(self, uuid, rate=10.0, payload=heart_rate_payload, service_uuid=None):
+        self.uuid = normalize_uuid_str(uuid)
+        self.rate = rate
+        self.payload = payload
+        self.service_uuid = None if service_uuid is None else normalize_uuid_str(service_uuid)
+        self.value = payload(0)  # returned by read_gatt_char, updated by write_gatt_char
+
+
+class SimulatedDevice:
+    """
+    An advertising peripheral.
+    `characteristics` maps UUIDs to a SimulatedCharacteristic, or to a notification rate (Hz).
+    """
+
+    def __init__(
+        self,
+        address,
+        name=None,
+        rssi=-60,
+        service_uuids=(),
+        manufacturer_data=None,
+        advertising_interval=0.1,
+        characteristics=None,
+    ):
+        self.address = address
+        self.name = name
+        self.rssi = rssi
+        self.service_uuids = [normalize_uuid_str(uuid) for uuid in service_uuids]
+        self.manufacturer_data = manufacturer_data or {}
+        self.advertising_interval = advertising_interval
+        self.characteristics = {}
+        for uuid, characteristic in (characteristics or {}).items():
+            if not isinstance(characteristic, SimulatedCharacteristic):
+                characteristic = SimulatedCharacteristic(uuid, rate=characteristic)
+            if characteristic.service_uuid is None:
+                characteristic.service_uuid = (
+                    self.service_uuids[0] if self.service_uuids else DEFAULT_SERVICE_UUID
+                )
+            self.characteristics[characteristic.uuid] = characteristic
+
+        self.ble_device = BLEDevice(address, name, None, rssi)
+        self.advertisement_data = self.advertise()
+        self.client = None  # the SimulatedClient connected to this device, if any
+
+    @property
+    def gatt_services(self):
+        """
+        `{service UUID: [characteristic UUID, ...]}`, as found by a full service discovery.
+        """
+        services = {uuid: list(characteristics) for uuid, characteristics in GENERIC_SERVICES.items()}
+        for characteristic in self.characteristics.values():
+            services.setdefault(characteristic.service_uuid, []).append(characteristic.uuid)
+        return services
+
+    def advertise(self, rssi=None):
+        return AdvertisementData(
+            local_name=self.name,
+            manufacturer_data=self.manufacturer_data,
+            service_data={},
+            service_uuids=self.service_uuids,
+            tx_power=None,
+            rssi=self.rssi if rssi is None else rssi,
+            platform_data=(),
+        )
+
+
+class SimulatedEnvironment:
+    """
+    A set of simulated devices, and the radio conditions to connect to them.
+
+    `connect_latency` / `disconnect_latency` are in seconds, with up to `latency_jitter`
+    (a fraction) added at random. Service discovery adds `discovery_latency` seconds
+    per discovered service, so passing `services=` to the client shortens it; services passed
+    along with `dangerous_use_bleak_cache=True` come from the backend's cache, at no cost.
+    A write with response waits `write_latency` seconds for the round trip, and a read `read_latency`.
+    `connect_failure_rate` is the probability that a connection attempt raises BleakError.
+    `rssi_jitter` (dBm) varies the RSSI of each advertisement, which also makes it
+    a new AdvertisementData object.
+    """
+
+    def __init__(
+        self,
+        devices=(),
+        connect_latency=0.0,
+        disconnect_latency=0.0,
+        discovery_latency=0.0,
+        write_latency=0.0,
+        read_latency=0.0,
+        latency_jitter=0.0,
+        connect_failure_rate=0.0,
+        rssi_jitter=0,
+        seed=None,
+    ):
+        self.devices = {}
+        for device in devices:
+            self.devices[device.address] = device
+        self.connect_latency = connect_latency
+        self.disconnect_latency = disconnect_latency
+        self.discovery_latency = discovery_latency
+        self.write_latency = write_latency
+        self.read_latency = read_latency
+        self.latency_jitter = latency_jitter
+        self.connect_failure_rate = connect_failure_rate
+        self.rssi_jitter = rssi_jitter
+        self.random = random.Random(seed)
+
+        self.scanners = []  # running SimulatedScanner instances
+        self.connection_attempts = 0
+
+        environment = self
+
+        class Scanner(SimulatedScanner):
+            pass
+
+        class Client(SimulatedClient):
+            pass
+
+        Scanner.environment = environment
+        Client.environment = environment
+        self.scanner_class = Scanner
+        self.client_class = Client
+
+    def add_device(self, address, **kwargs):
+        device = SimulatedDevice(address, **kwargs)
+        self.devices[address] = device
+        return device
+
+    def add_devices(self, count, name_prefix="SIM", **kwargs):
+        """
+        Add `count` devices named `<name_prefix> <n>`, with generated addresses.
+        Returns the list of devices.
+        """
+        start = len(self.devices)
+        return [
+            self.add_device(
+                ":".join(f"{(i >> shift) & 0xFF:02X}" for shift in (40, 32, 24, 16, 8, 0)),
+                name=f"{name_prefix} {i}",
+                **kwargs,
+            )
+            for i in range(start, start + count)
+        ]
+
+    @contextlib.contextmanager
+    def install(self, model_class=BleakModel):
+        """
+        Use this environment as the backend of `model_class` inside the `with` block.
+        """
+        previous = model_class.scanner_class, model_class.client_class
+        model_class.scanner_class = self.scanner_class
+        model_class.client_class = self.client_class
+        try:
+            yield self
+        finally:
+            model_class.scanner_class, model_class.client_class = previous
+
+    def drop(self, address):
+        """
+        Simulate a peripheral going out of range: its connection drops without being asked to.
+        """
+        client = self.devices[address].client
+        if client is not None:
+            client._drop()
+
+    def _latency(self, base):
+        if not base:
+            return 0.0
+        return base * (1 + self.random.uniform(0, self.latency_jitter))
+
+
+class SimulatedScanner:
+    """
+    Stand-in for BleakScanner. Each device advertises every `advertising_interval` seconds.
+    Use as `async with`, like BleakScanner.
+    """
+
+    environment: SimulatedEnvironment = None
+
+    def __init__(self, detection_callback=None, service_uuids=None, **kwargs):
+        self.detection_callback = detection_callback
+        self.adapter = kwargs.get("adapter")  # controller name, see bleak_fsm.adapter
+        self.service_uuids = (
+            {normalize_uuid_str(uuid) for uuid in service_uuids} if service_uuids else None
+        )
+        self._task = None
+
+    def _visible_devices(self):
+        devices = self.environment.devices.values()
+        if self.service_uuids is None:
+            return list(devices)
+        return [
+            device
+            for device in devices
+            if self.service_uuids.intersection(device.service_uuids)
+        ]
+
+    def _emit(self, device):
+        environment = self.environment
+        if environment.rssi_jitter:
+            advertisement_data = device.advertise(
+                device.rssi
+                + environment.random.randint(-environment.rssi_jitter, environment.rssi_jitter)
+            )
+        else:
+            advertisement_data = device.advertisement_data
+        self.detection_callback(device.ble_device, advertisement_data)
+
+    def burst(self, count):
+        """
+        Deliver `count` advertisements right away, cycling through the visible devices.
+        Used to measure the ingest rate of the detection callback pipeline.
+        """
+        devices = self._visible_devices()
+        for i in range(count):
+            self._emit(devices[i % len(devices)])
+
+    async def _advertise(self):
+        devices = self._visible_devices()
+        start = time.monotonic()
+        # (next advertisement time, index) for every device, staggered over its interval
+        schedule = [
+            (start + self.environment.random.uniform(0, d.advertising_interval), i)
+            for i, d in enumerate(devices)
+        ]
+        heapq.heapify(schedule)
+        while schedule:
+            now = time.monotonic()
+            while schedule and schedule[0][0] <= now:
+                due, i = schedule[0]
+                device = devices[i]
+                if device.client is None:  # connected peripherals stop advertising
+                    self._emit(device)
+                heapq.heapreplace(schedule, (due + device.advertising_interval, i))
+            await asyncio.sleep(max(0.0, schedule[0][0] - time.monotonic()))
+
+    async def start(self):
+        self.environment.scanners.append(self)
+        self._task = asyncio.ensure_future(self._advertise())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self in self.environment.scanners:
+            self.environment.scanners.remove(self)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    @classmethod
+    async def find_device_by_address(cls, address, timeout=10.0, **kwargs):
+        """
+        Returns when the device next advertises. Unknown devices return None right away
+        rather than after `timeout`, to keep tests fast.
+        """
+        device = cls.environment.devices.get(address)
+        if device is None:
+            return None
+        await asyncio.sleep(
+            min(timeout, cls.environment.random.uniform(0, device.advertising_interval))
+        )
+        return device.ble_device
+
+
+class SimulatedClient:
+    """
+    Stand-in for BleakClient, connecting to devices of its SimulatedEnvironment.
+    """
+
+    environment: SimulatedEnvironment = None
+
+    def __init__(
+        self, address_or_ble_device, disconnected_callback=None, services=None, **kwargs
+    ):
+        self.address = getattr(address_or_ble_device, "address", address_or_ble_device)
+        self.disconnected_callback = disconnected_callback
+        self.adapter = kwargs.get("adapter")
+        self.requested_services = (
+            None if services is None else {normalize_uuid_str(uuid) for uuid in services}
+        )
+        self.services = []  # filled in by service discovery on connect
+        self.is_connected = False
+        self.writes = []  # (characteristic UUID, data, response) of every write
+        self._notify_tasks = {}
+
+    @property
+    def _device(self):
+        device = self.environment.devices.get(self.address)
+        if device is None:
+            raise BleakError(f"Device with address {self.address} was not found.")
+        return device
+
+    def _characteristic(self, char_specifier):
+        uuid = normalize_uuid_str(str(getattr(char_specifier, "uuid", char_specifier)))
+        characteristic = self._device.characteristics.get(uuid)
+        if characteristic is None or (
+            self.requested_services is not None
+            and characteristic.service_uuid not in self.requested_services
+        ):
+            raise BleakError(f"Characteristic {char_specifier} was not found!")
+        return characteristic
+
+    async def connect(self, **kwargs):
+        environment = self.environment
+        environment.connection_attempts += 1
+        device = self._device
+        await asyncio.sleep(environment._latency(environment.connect_latency))
+        if environment.random.random() < environment.connect_failure_rate:
+            raise BleakError(f"Simulated connection failure to {self.address}")
+        if device.client is not None and device.client is not self:
+            raise BleakError(f"{self.address} is already connected")
+        device.client = self
+        self.is_connected = True
+        await self._discover_services(device, kwargs.get("dangerous_use_bleak_cache", False))
+        return True
+
+    async def _discover_services(self, device, use_cache=False):
+        table = {
+            uuid: characteristics
+            for uuid, characteristics in device.gatt_services.items()
+            if self.requested_services is None or uuid in self.requested_services
+        }
+        if not (use_cache and self.requested_services is not None):
+            await asyncio.sleep(self.environment.discovery_latency * len(table))
+        self.services = [
+            SimpleNamespace(
+                uuid=uuid,
+                characteristics=[SimpleNamespace(uuid=c) for c in characteristics],
+            )
+            for uuid, characteristics in table.items()
+        ]
+
+    async def disconnect(self):
+        self._stop_all_notify()
+        if self.is_connected:
+            await asyncio.sleep(
+                self.environment._latency(self.environment.disconnect_latency)
+            )
+        self._release()
+        return True
+
+    def _release(self):
+        self.is_connected = False
+        device = self.environment.devices.get(self.address)
+        if device is not None and device.client is self:
+            device.client = None
+
+    def _drop(self):
+        self._stop_all_notify()
+        self._release()
+        if self.disconnected_callback is not None:
+            self.disconnected_callback(self)
+
+    async def start_notify(self, char_specifier, callback, **kwargs):
+        if not self.is_connected:
+            raise BleakError("Not connected")
+        characteristic = self._characteristic(char_specifier)
+        self._notify_tasks[characteristic.uuid] = asyncio.ensure_future(
+            self._notify(characteristic, callback)
+        )
+
+    async def stop_notify(self, char_specifier):
+        characteristic = self._characteristic(char_specifier)
+        task = self._notify_tasks.pop(characteristic.uuid, None)
+        if task is not None:
+            task.cancel()
+
+    def _stop_all_notify(self):
+        for task in self._notify_tasks.values():
+            task.cancel()
+        self._notify_tasks.clear()
+
+    async def _notify(self, characteristic, callback):
+        """
+        Send the notifications that are due, then sleep until the next one.
+        At high rates, several notifications go out per wake-up, as they would in a real adapter's batch.
+        """
+        is_coroutine = inspect.iscoroutinefunction(callback)
+        period = 1.0 / characteristic.rate
+        start = time.monotonic()
+        sent = 0
+        while True:
+            due = int((time.monotonic() - start) / period) + 1
+            while sent < due:
+                data = characteristic.payload(sent)
+                characteristic.value = data
+                if is_coroutine:
+                    asyncio.ensure_future(callback(characteristic, data))
+                else:
+                    callback(characteristic, data)
+                sent += 1
+            await asyncio.sleep(max(0.0, start + sent * period - time.monotonic()))
+
+    async def read_gatt_char(self, char_specifier, **kwargs):
+        if not self.is_connected:
+            raise BleakError("Not connected")
+        characteristic = self._characteristic(char_specifier)
+        if self.environment.read_latency:
+            await asyncio.sleep(self.environment._latency(self.environment.read_latency))
+        return bytearray(characteristic.value)
+
+    async def write_gatt_char(self, char_specifier, data, response=None):
+        if not self.is_connected:
+            raise BleakError("Not connected")
+        characteristic = self._characteristic(char_specifier)
+        if response and self.environment.write_latency:
+            await asyncio.sleep(self.environment._latency(self.environment.write_latency))
+        self.writes.append((characteristic.uuid, bytes(data), response))
+        characteristic.value = bytearray(data)
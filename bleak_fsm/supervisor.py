@@ -0,0 +1,77 @@
+"""
+This module contains the TaskSupervisor class, which owns the background tasks of BleakModel
+(the scan worker, streams, reconnection loops, device lookups).
+
+Tasks are kept until they finish, so that they can be cancelled and awaited
+(instead of being garbage collected or outliving the model), and exceptions they raise
+are passed to an error callback instead of the event loop's exception handler.
+"""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TaskSupervisor:
+    """
+    Spawns and keeps track of named background tasks.
+    `on_error(name, exception)` is called when a task raises; it can be overridden per task.
+    """
+
+    def __init__(self, on_error=None):
+        self.on_error = on_error
+        self._tasks = {}  # task -> (name, on_error)
+
+    def spawn(self, coroutine, name=None, on_error=None):
+        task = asyncio.ensure_future(coroutine)
+        self._tasks[task] = (name, on_error or self.on_error)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        name, on_error = self._tasks.pop(task, (None, None))
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is None:
+            return
+        if on_error is None:
+            logger.error("Background task %s failed. Error: %r", name, error)
+            return
+        try:
+            on_error(name, error)
+        except Exception as e:
+            logger.error("Error handler of background task %s failed. Error: %r", name, e)
+
+    def tasks(self, name=None):
+        """
+        Running tasks, optionally only those spawned with `name`.
+        """
+        return [
+            task
+            for task, (task_name, _) in self._tasks.items()
+            if name is None or task_name == name
+        ]
+
+    def __len__(self):
+        return len(self._tasks)
+
+    async def shutdown(self, name=None, grace=0.0):
+        """
+        Give the tasks (optionally only those named `name`) up to `grace` seconds to finish,
+        then cancel the rest, and wait until all of them are done.
+        The calling task is left alone, so a task can shut down its siblings.
+        """
+        loop = asyncio.get_running_loop()
+        for task in [task for task in self._tasks if task.get_loop() is not loop]:
+            del self._tasks[task]  # left over from an event loop that is gone
+        current = asyncio.current_task()
+        tasks = [task for task in self.tasks(name) if task is not current]
+        if not tasks:
+            return
+        if grace:
+            await asyncio.wait(tasks, timeout=grace)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,41 @@
+import pytest
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _make_advertisement(address, name=None, rssi=-60, service_uuids=()):
+    device = BLEDevice(address, name, None, rssi)
+    advertisement_data = AdvertisementData(
+        local_name=name,
+        manufacturer_data={},
+        service_data={},
+        service_uuids=list(service_uuids),
+        tx_power=None,
+        rssi=rssi,
+        platform_data=(),
+    )
+    return device, advertisement_data
+
+
+@pytest.fixture
+def make_advertisement():
+    """
+    Builds the (BLEDevice, AdvertisementData) pair a scanner would report.
+    """
+    return _make_advertisement
+
+
+@pytest.fixture
+def clock():
+    """
+    A clock for registries and subscriptions that only moves when `clock.now` is set.
+    """
+    return FakeClock()
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from bleak_fsm import Adapter, BleakModel, SimulatedEnvironment
+from bleak_fsm.adapter import best_rssi, least_connections
+
+
+def test_placement_policies(make_advertisement):
+    near, far = Adapter("hci0"), Adapter("hci1")
+    near.bt_devices.add(*make_advertisement("AA", rssi=-40))
+    far.bt_devices.add(*make_advertisement("AA", rssi=-80))
+    assert least_connections([near, far], "AA") is near  # tie broken by RSSI
+    near.acquire()
+    assert least_connections([near, far], "AA") is far
+    assert best_rssi([near, far], "AA") is near
+
+
+def test_connection_limit():
+    adapter = Adapter("hci0", max_connections=1)
+    assert adapter.acquire()
+    assert not adapter.acquire()
+    adapter.release()
+    assert adapter.has_capacity()
+
+
+@pytest.fixture
+def adapters(monkeypatch):
+    environment = SimulatedEnvironment(seed=0)
+    environment.add_devices(5, advertising_interval=0.005)
+    adapters = [Adapter("hci0", max_connections=2), Adapter("hci1", max_connections=2)]
+    monkeypatch.setattr(BleakModel, "adapters", adapters)
+    with environment.install():
+        yield environment, adapters
+
+
+@pytest.mark.asyncio
+async def test_scan_on_every_adapter(adapters):
+    environment, adapters = adapters
+    await BleakModel.start_scan()
+    await asyncio.sleep(0.05)
+    assert sorted(scanner.adapter for scanner in environment.scanners) == ["hci0", "hci1"]
+    await BleakModel.stop_scan()
+    for adapter in adapters:
+        assert set(adapter.bt_devices) == set(environment.devices)
+
+
+@pytest.mark.asyncio
+async def test_discovery_on_every_adapter(adapters):
+    environment, adapters = adapters
+    address = next(iter(environment.devices))
+    model = BleakModel(discovery_timeout=1.0)
+    assert await model.set_target(address, discover=True)
+    assert all(adapter._scanning for adapter in adapters)
+    assert await model.connect()
+    assert all(adapter._pending_targets == {} for adapter in adapters)
+    assert not any(adapter._scanning for adapter in adapters)
+    await model.clean_up()
+
+
+@pytest.mark.asyncio
+async def test_connections_spread_over_adapters(adapters):
+    environment, adapters = adapters
+    await BleakModel.start_scan()
+    await asyncio.sleep(0.05)
+    await BleakModel.stop_scan()
+
+    models = [BleakModel() for _ in environment.devices]
+    for model, address in zip(models, environment.devices):
+        assert await model.set_target(address)
+    results = [await model.connect() for model in models]
+    assert results == [True, True, True, True, False]
+    assert [adapter.connections for adapter in adapters] == [2, 2]
+    assert sorted(model.bleak_client.adapter for model in models[:4]) == [
+        "hci0",
+        "hci0",
+        "hci1",
+        "hci1",
+    ]
+    assert models[4]._failure_reason == "no_capacity"
+
+    await models[0].disconnect()
+    assert await models[4].connect()
+    assert models[4].adapter is models[0].adapter
+    await BleakModel.clean_up_all()
+    assert [adapter.connections for adapter in adapters] == [0, 0]
+
+
+@pytest.mark.asyncio
+async def test_bound_model_uses_its_adapter(adapters):
+    environment, adapters = adapters
+    address = next(iter(environment.devices))
+    device = environment.devices[address]
+    adapters[0].bt_devices[address] = (device.ble_device, device.advertisement_data)
+
+    pinned = BleakModel(adapter=adapters[1])
+    assert not await pinned.set_target(address)  # hci1 hasn't seen it
+    adapters[1].bt_devices[address] = (device.ble_device, device.advertisement_data)
+    assert await pinned.set_target(address)
+    assert await pinned.connect()
+    assert pinned.bleak_client.adapter == "hci1"
+    assert address in adapters[0].bt_devices
+    await pinned.clean_up()
+    assert address in adapters[1].bt_devices
@@ -0,0 +1,123 @@
+import asyncio
+import random
+import statistics
+
+import pytest
+
+from bleak_fsm import BleakModel, ClockEstimate, SampleAligner, SimulatedEnvironment
+
+HEART_RATE_MEASUREMENT_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
+
+
+def test_clock_estimate_removes_link_jitter():
+    rng = random.Random(1)
+    clock = ClockEstimate()
+    raw_errors, corrected_errors = [], []
+    for k in range(500):
+        if k % 50 == 7:
+            continue  # lost notification
+        sent = 100.0 + k * 0.1
+        arrival = sent + 0.02 + rng.uniform(0.0, 0.03)  # connection interval latency
+        time = clock.correct(arrival)
+        if k > 50:
+            raw_errors.append(arrival - sent)
+            corrected_errors.append(time - sent)
+    assert clock.interval == pytest.approx(0.1, abs=0.002)
+    assert 0.0 < clock.jitter < 0.03
+    assert statistics.pstdev(corrected_errors) < statistics.pstdev(raw_errors) / 2
+
+
+def feed(stream, times, value):
+    for time in times:
+        stream.add(time, value(time))
+
+
+def test_linear_and_nearest_frames():
+    for method in ("nearest", "linear"):
+        frames = []
+        aligner = SampleAligner(
+            window=0.1, method=method, correct_clocks=False, on_frame=frames.append
+        )
+        power = aligner.add_stream("power")
+        heart_rate = aligner.add_stream("heart_rate")
+        for k in range(10):
+            power.add(k * 0.04, k * 0.04 * 100)  # 25 Hz, value = 100 * time
+            if k % 5 == 0:
+                heart_rate.add(k * 0.04 + 0.01, 60 + k)
+        assert [round(frame.time, 6) for frame in frames] == [0.0, 0.1, 0.2]
+        frame = frames[1]
+        if method == "linear":
+            assert frame.values["power"] == pytest.approx(10.0)
+            assert frame.values["heart_rate"] == pytest.approx(60 + 5 * (0.1 - 0.01) / 0.2)
+        else:
+            assert frame.values["heart_rate"] == 60  # sample at 0.01, not 0.21
+            frame = frames[2]
+            assert frame.values["power"] == pytest.approx(20.0)
+            assert frame.values["heart_rate"] == 65  # sample at 0.21
+
+
+def test_silent_stream_does_not_stall_frames():
+    aligner = SampleAligner(window=0.1, max_delay=0.3, tolerance=0.1, correct_clocks=False)
+    frames = aligner.iter_frames()
+    power = aligner.add_stream("power")
+    aligner.add_stream("cadence")  # never sends
+    for k in range(10):
+        power.add(k * 0.1, k)
+    aligner.close()
+    times = []
+    values = []
+
+    async def consume():
+        async for frame in frames:
+            times.append(round(frame.time, 6))
+            values.append(frame.values)
+
+    asyncio.run(consume())
+    assert times == [round(k * 0.1, 6) for k in range(10)]
+    assert [v["power"] for v in values] == list(range(10))
+    assert all(v["cadence"] is None for v in values)
+
+
+def test_decoding_errors_are_dropped():
+    aligner = SampleAligner(correct_clocks=False)
+    stream = aligner.add_stream("hr", value=lambda data: data[1])
+    stream.add(0.0, b"")
+    stream.add(0.1, b"\x00\x40")
+    assert stream.count == 1
+
+
+@pytest.mark.asyncio
+async def test_align_two_devices():
+    environment = SimulatedEnvironment()
+    left = environment.add_device("AA", characteristics={HEART_RATE_MEASUREMENT_UUID: 40.0})
+    right = environment.add_device("BB", characteristics={HEART_RATE_MEASUREMENT_UUID: 25.0})
+    frames = []
+    aligner = SampleAligner(window=0.05, method="linear", on_frame=frames.append)
+    BleakModel.bt_devices.clear()
+    with environment.install():
+        models = []
+        for device, name in ((left, "left"), (right, "right")):
+            BleakModel.bt_devices[device.address] = (device.ble_device, device.advertisement_data)
+            model = BleakModel()
+            model.align(
+                HEART_RATE_MEASUREMENT_UUID,
+                aligner,
+                name,
+                value=lambda measurement: measurement.heart_rate,
+            )
+            await model.set_target(device.address)
+            await model.connect()
+            models.append(model)
+        for model in models:
+            await model.stream()
+        await asyncio.sleep(0.4)
+        await BleakModel.clean_up_all()
+    BleakModel.bt_devices.clear()
+
+    assert len(frames) >= 4
+    assert all(b.time - a.time == pytest.approx(0.05) for a, b in zip(frames, frames[1:]))
+    complete = [frame for frame in frames if None not in frame.values.values()]
+    assert complete and all(60 <= value < 100 for frame in complete for value in frame.values.values())
+    clocks = aligner.clock_estimates()
+    assert clocks["left"].interval == pytest.approx(1 / 40, rel=0.3)
+    assert clocks["right"].interval == pytest.approx(1 / 25, rel=0.3)
@@ -1,11 +1,21 @@
 import pytest
 import asyncio
+import logging
 import transitions
 from bleak_fsm import (
     BleakModel,
+    InMemoryMetrics,
+    SimulatedEnvironment,
 )  # Replace 'your_module' with the actual name of your Python file
 
 
+@pytest.fixture(autouse=True)
+def clear_bt_devices():
+    BleakModel.bt_devices.clear()
+    yield
+    BleakModel.bt_devices.clear()
+
+
 @pytest.mark.asyncio
 async def test_scan():
     """
@@ -62,6 +72,16 @@ async def test_set_target_successful():
     assert model.state == "TargetSet"
 
 
+def test_assigning_dict_loads_registry():
+    registry = BleakModel.bt_devices
+    BleakModel.bt_devices = {"some_address": ("device", "advertisement_data")}
+    assert BleakModel.bt_devices is registry
+    assert BleakModel().bt_devices is registry
+    assert tuple(registry["some_address"]) == ("device", "advertisement_data")
+    BleakModel.bt_devices = {}
+    assert "some_address" not in registry
+
+
 @pytest.mark.asyncio
 async def test_set_target_failure():
     model = BleakModel()
@@ -118,3 +138,425 @@ async def test_context_manager_from_failed_connected():
 # and the state shouldn't have changed (should be Connected)
 # This is a regression test that is currently untestable because
 # we never actually connect to a real device.
+
+
+### Reconnecting ###
+
+
+class FakeBleakClient:
+    """
+    Stand-in for BleakClient. `connect_results` scripts the outcome of successive connects.
+    """
+
+    connect_results = []
+
+    def __init__(self, device, disconnected_callback=None):
+        self.device = device
+        self.disconnected_callback = disconnected_callback
+        self.is_connected = False
+        self.notify_callbacks = {}
+
+    async def connect(self):
+        self.is_connected = (
+            FakeBleakClient.connect_results.pop(0)
+            if FakeBleakClient.connect_results
+            else True
+        )
+        return self.is_connected
+
+    async def disconnect(self):
+        self.is_connected = False
+        return True
+
+    async def start_notify(self, characteristic, callback):
+        self.notify_callbacks[characteristic] = callback
+
+    async def stop_notify(self, characteristic):
+        del self.notify_callbacks[characteristic]
+
+    def drop(self):
+        """
+        Simulate the peripheral going away.
+        """
+        self.is_connected = False
+        self.disconnected_callback(self)
+
+
+@pytest.fixture
+def fake_bleak_client(monkeypatch):
+    monkeypatch.setattr(BleakModel, "client_class", FakeBleakClient)
+    FakeBleakClient.connect_results = []
+    return FakeBleakClient
+
+
+async def streaming_model(**kwargs):
+    model = BleakModel(**kwargs)
+    model.notifications_enabled = 0
+
+    async def enable_notifications(client):
+        model.notifications_enabled += 1
+
+    async def disable_notifications(client):
+        pass
+
+    model.enable_notifications = enable_notifications
+    model.disable_notifications = disable_notifications
+    BleakModel.bt_devices["some_address"] = ("device", "advertisement_data")
+    await model.set_target("some_address")
+    await model.connect()
+    await model.stream()
+    assert model.state == "Streaming"
+    return model
+
+
+@pytest.mark.asyncio
+async def test_reconnect_resumes_streaming(fake_bleak_client):
+    model = await streaming_model(reconnect_backoff=0.01)
+    fake_bleak_client.connect_results = [False, True]
+    model.bleak_client.drop()
+    await model._reconnect_task
+    assert model.state == "Streaming"
+    assert model.notifications_enabled == 2
+    assert model.reconnect_metrics["reconnects"] == 1
+    assert model.reconnect_metrics["attempts"] == 2
+    assert model.reconnect_metrics["last_latency"] is not None
+    await model.clean_up()
+    assert model.state == "Init"
+
+
+@pytest.mark.asyncio
+async def test_reconnect_gives_up_after_budget(fake_bleak_client):
+    model = await streaming_model(reconnect_attempts=3, reconnect_backoff=0.01)
+    fake_bleak_client.connect_results = [False, False, False]
+    model.bleak_client.drop()
+    await model._reconnect_task
+    assert model.state == "TargetSet"
+    assert model.reconnect_metrics["failures"] == 1
+    assert "some_address" in BleakModel.bt_devices
+
+
+@pytest.mark.asyncio
+async def test_failed_reconnect_ends_iteration(fake_bleak_client):
+    model = await streaming_model(reconnect_attempts=1)
+    samples = model.iter_notifications("2a37")
+    consumer = asyncio.ensure_future(samples.__anext__())
+    await asyncio.sleep(0.01)
+    fake_bleak_client.connect_results = [False]
+    model.bleak_client.drop()
+    await model._reconnect_task
+    assert model.state == "TargetSet"
+    with pytest.raises(StopAsyncIteration):
+        await asyncio.wait_for(consumer, 1.0)
+    assert model.tasks.tasks("stream") == []
+
+
+@pytest.mark.asyncio
+async def test_disconnect_while_reconnecting_ends_iteration(fake_bleak_client):
+    model = await streaming_model(reconnect_backoff=10.0)
+    samples = model.iter_notifications("2a37")
+    consumer = asyncio.ensure_future(samples.__anext__())
+    await asyncio.sleep(0.01)
+    fake_bleak_client.connect_results = [False]
+    model.bleak_client.drop()
+    await asyncio.sleep(0.01)
+    assert model.state == "Reconnecting"
+    await model.disconnect()
+    with pytest.raises(StopAsyncIteration):
+        await asyncio.wait_for(consumer, 1.0)
+    assert model.tasks.tasks("stream") == []
+
+
+@pytest.mark.asyncio
+async def test_requested_disconnect_does_not_reconnect(fake_bleak_client):
+    model = await streaming_model()
+    client = model.bleak_client
+    await model.disconnect()
+    client.drop()
+    assert model._reconnect_task is None
+    assert model.state == "TargetSet"
+
+
+@pytest.mark.asyncio
+async def test_clean_up_while_reconnecting(fake_bleak_client):
+    model = await streaming_model(reconnect_backoff=10.0)
+    fake_bleak_client.connect_results = [False]
+    model.bleak_client.drop()
+    await asyncio.sleep(0.01)
+    assert model.state == "Reconnecting"
+    await model.clean_up()
+    assert model.state == "Init"
+
+
+### Ring buffer ingestion ###
+
+
+@pytest.mark.asyncio
+async def test_stream_into_ring_buffer(fake_bleak_client):
+    model = BleakModel()
+    buffer = model.ingest("2a37", capacity=16, max_payload=8)
+    BleakModel.bt_devices["some_address"] = ("device", "advertisement_data")
+    await model.set_target("some_address")
+    await model.connect()
+    assert await model.stream()  # no enable_notifications needed
+    notify = model.bleak_client.notify_callbacks["2a37"]
+    notify("2a37", bytearray(b"\x00\x48"))
+    notify("2a37", bytearray(b"\x00\x49"))
+    batch = await buffer.get_batch()
+    assert [bytes(payload) for _, payload in batch] == [b"\x00\x48", b"\x00\x49"]
+    await model.disconnect()
+    assert model.bleak_client.notify_callbacks == {}
+    assert await buffer.get_batch() is None
+
+
+@pytest.mark.asyncio
+async def test_failed_reconnect_closes_ring_buffer(fake_bleak_client):
+    model = BleakModel(reconnect_attempts=1)
+    buffer = model.ingest("2a37", capacity=16, max_payload=8)
+    BleakModel.bt_devices["some_address"] = ("device", "advertisement_data")
+    await model.set_target("some_address")
+    await model.connect()
+    assert await model.stream()
+    fake_bleak_client.connect_results = [False]
+    model.bleak_client.drop()
+    await model._reconnect_task
+    assert model.state == "TargetSet"
+    assert await asyncio.wait_for(buffer.get_batch(), 1.0) is None
+
+
+### Async iteration ###
+
+
+@pytest.mark.asyncio
+async def test_iter_notifications_while_streaming(fake_bleak_client):
+    model = await streaming_model()
+    samples = model.iter_notifications("2a37", maxsize=2)
+    consumer = asyncio.ensure_future(samples.__anext__())
+    await asyncio.sleep(0.01)  # first read starts notifications
+    notify = model.bleak_client.notify_callbacks["2a37"]
+    notify("2a37", bytearray(b"\x00\x48"))
+    sample = await consumer
+    assert sample.characteristic == "2a37"
+    assert bytes(sample.data) == b"\x00\x48"
+
+    for value in range(3):
+        notify("2a37", bytearray([0, value]))
+    assert samples.dropped == 1
+
+    await samples.aclose()
+    assert "2a37" not in model.bleak_client.notify_callbacks
+    await model.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_iter_notifications_ends_when_stream_stops(fake_bleak_client):
+    model = BleakModel()
+    samples = model.iter_notifications("2a37")
+    BleakModel.bt_devices["some_address"] = ("device", "advertisement_data")
+    await model.set_target("some_address")
+    await model.connect()
+    await model.stream()
+    model.bleak_client.notify_callbacks["2a37"]("2a37", bytearray(b"\x01"))
+    await model.disconnect()
+    assert [bytes(sample.data) async for sample in samples] == [b"\x01"]
+
+
+### Built-in decoders ###
+
+
+@pytest.mark.asyncio
+async def test_on_measurement_decodes_notifications(fake_bleak_client):
+    model = BleakModel()
+    heart_rates = []
+    assert model.on_measurement(
+        "2a37", lambda measurement: heart_rates.append(measurement.heart_rate)
+    )
+    assert not model.on_measurement("ffff", print)
+    BleakModel.bt_devices["some_address"] = ("device", "advertisement_data")
+    await model.set_target("some_address")
+    await model.connect()
+    assert await model.stream()
+    model.bleak_client.notify_callbacks["2a37"]("2a37", bytearray([0x00, 72]))
+    assert heart_rates == [72]
+    await model.clean_up()
+
+
+### Shared state machine ###
+
+
+@pytest.mark.asyncio
+async def test_models_share_machine_but_not_state():
+    first = BleakModel()
+    second = BleakModel()
+    assert first.machine is second.machine
+    assert "connect" not in vars(first)  # trigger methods live on the class
+    assert "commands" not in vars(first) and "ring_buffers" not in vars(first)  # created on first use
+    BleakModel.bt_devices["some_address"] = ("device", "advertisement_data")
+    await first.set_target("some_address")
+    assert first.state == "TargetSet" and first.is_TargetSet()
+    assert second.state == "Init" and second.is_Init()
+    assert await first.may_unset_target()
+    assert not await second.may_unset_target()
+    assert not await second.may_set_target("missing_address")  # the condition is checked
+    assert second.state == "Init" and second.target is None
+    await first.clean_up()
+
+
+### Instance tracking ###
+
+
+@pytest.mark.asyncio
+async def test_clean_up_deregisters_and_set_target_reregisters():
+    model = BleakModel()
+    assert model in BleakModel.instances
+    BleakModel.bt_devices["some_address"] = ("device", "advertisement_data")
+    async with model:
+        await model.set_target("some_address")
+    assert model not in BleakModel.instances
+    await model.set_target("some_address")
+    assert model in BleakModel.instances
+    assert await BleakModel.clean_up_all()
+    assert model.state == "Init"
+
+
+def test_discarded_models_do_not_leak():
+    import gc
+    import tracemalloc
+
+    def create_and_discard(count):
+        for _ in range(count):
+            BleakModel()
+
+    gc.collect()
+    create_and_discard(1_000)  # warm up caches and allocator
+    gc.collect()
+    instances_before = len(BleakModel.instances)
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    create_and_discard(10_000)
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(BleakModel.instances) == instances_before
+    assert after - before < 100_000  # bytes; a leak would be ~10_000 x several KB
+
+
+### Logging ###
+
+
+def test_model_does_not_configure_root_logger(monkeypatch):
+    monkeypatch.setattr(logging.getLogger("bleak_fsm"), "level", logging.NOTSET)
+    handlers = list(logging.getLogger().handlers)
+    BleakModel()
+    assert logging.getLogger().handlers == handlers
+    assert logging.getLogger("bleak_fsm").level == logging.NOTSET
+    BleakModel(logging_level=logging.DEBUG)
+    assert logging.getLogger("bleak_fsm").level == logging.DEBUG
+
+
+@pytest.mark.asyncio
+async def test_notifications_are_logged_only_at_trace(fake_bleak_client, caplog):
+    from bleak_fsm import TRACE
+
+    caplog.set_level(logging.DEBUG, logger="bleak_fsm")
+    model = BleakModel()
+    model.ingest("2a37")
+    BleakModel.bt_devices["some_address"] = ("device", "advertisement_data")
+    await model.set_target("some_address")
+    await model.connect()
+    await model.stream()
+    model.bleak_client.notify_callbacks["2a37"]("2a37", bytearray(b"\x00\x48"))
+    assert not [record for record in caplog.records if record.levelno == TRACE]
+    await model.disconnect()
+
+    caplog.set_level(TRACE, logger="bleak_fsm")
+    await model.connect()
+    await model.stream()
+    model.bleak_client.notify_callbacks["2a37"]("2a37", bytearray(b"\x00\x48"))
+    assert [record.getMessage() for record in caplog.records if record.levelno == TRACE] == [
+        "Notification from some_address 2a37: 0048"
+    ]
+    await model.clean_up()
+
+
+### Timeouts and cancellation ###
+
+HEART_RATE_MEASUREMENT_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    metrics = InMemoryMetrics()
+    monkeypatch.setattr(BleakModel, "metrics", metrics)
+    return metrics
+
+
+@pytest.mark.asyncio
+async def test_connect_timeout_rolls_back(metrics):
+    environment = SimulatedEnvironment(connect_latency=1.0)
+    device = environment.add_device("AA")
+    with environment.install():
+        BleakModel.bt_devices["AA"] = (device.ble_device, device.advertisement_data)
+        model = BleakModel()
+        await model.set_target("AA")
+        assert not await model.connect(timeout=0.05)
+        assert model.state == "TargetSet"
+        assert "AA" in BleakModel.bt_devices
+        assert BleakModel.default_adapter.connections == 0
+        assert metrics.find(
+            "transition_duration_seconds", trigger="connect", outcome="cancelled", reason="timeout"
+        )
+
+        environment.connect_latency = 0.0
+        assert await model.connect(timeout=1.0)
+        await model.clean_up()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_trigger_rolls_back(metrics):
+    environment = SimulatedEnvironment(connect_latency=1.0)
+    device = environment.add_device("AA")
+    with environment.install():
+        BleakModel.bt_devices["AA"] = (device.ble_device, device.advertisement_data)
+        model = BleakModel()
+        await model.set_target("AA")
+        connecting = asyncio.ensure_future(model.connect())
+        await asyncio.sleep(0.05)
+        connecting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await connecting
+        assert model.state == "TargetSet"
+        assert "AA" in BleakModel.bt_devices
+        assert metrics.find(
+            "transition_duration_seconds", trigger="connect", outcome="cancelled", reason="cancelled"
+        )
+        await model.clean_up()
+
+
+@pytest.mark.asyncio
+async def test_clean_up_all_deadline_with_wedged_peripherals(metrics):
+    environment = SimulatedEnvironment(disconnect_latency=10.0)
+    devices = environment.add_devices(3, characteristics={HEART_RATE_MEASUREMENT_UUID: 50.0})
+    with environment.install():
+        models = []
+        for device in devices:
+            BleakModel.bt_devices[device.address] = (device.ble_device, device.advertisement_data)
+            model = BleakModel(connection_timeout=0.2)
+            model.ingest(HEART_RATE_MEASUREMENT_UUID)
+            await model.set_target(device.address)
+            await model.connect()
+            models.append(model)
+        await models[0].stream()
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        assert await BleakModel.clean_up_all(timeout=0.1)
+        assert loop.time() - started < 0.5
+        assert [model.state for model in models] == ["Init"] * 3
+        assert all(len(model.tasks) == 0 for model in models)
+        cancelled = metrics.find(
+            "transition_duration_seconds", trigger="clean_up", outcome="cancelled"
+        )
+        assert len(cancelled) == 3
+        for device in devices:
+            assert device.address in BleakModel.bt_devices
+        await asyncio.sleep(0.3)  # the abandoned disconnections give up
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from bleak_fsm import AdvertisementCoalescer, BleakModel, DeviceRegistry, DeviceSubscription
+
+
+@pytest.mark.asyncio
+async def test_coalescer_dedups_and_batches(make_advertisement):
+    batches = []
+    coalescer = AdvertisementCoalescer(batches.append, interval=0.01)
+    for rssi in (-80, -70, -60):
+        coalescer.push(*make_advertisement("AA", rssi=rssi))
+    coalescer.push(*make_advertisement("BB"))
+    assert batches == []
+    await asyncio.sleep(0.05)
+    assert len(batches) == 1
+    assert [device.address for device, _ in batches[0]] == ["AA", "BB"]
+    assert batches[0][0][1].rssi == -60  # latest advertisement wins
+
+
+def test_coalescer_without_interval_passes_through(make_advertisement):
+    batches = []
+    coalescer = AdvertisementCoalescer(batches.append, interval=0)
+    coalescer.push(*make_advertisement("AA"))
+    assert len(batches) == 1
+
+
+def test_subscription_throttle(make_advertisement, clock):
+    registry = DeviceRegistry()
+    seen = []
+    subscription = DeviceSubscription(seen.append, min_interval=1.0, clock=clock)
+    for now in (0.0, 0.5, 1.0):
+        clock.now = now
+        subscription.offer(registry.add(*make_advertisement("AA")))
+    assert len(seen) == 2
+
+
+def test_subscription_change_filters(make_advertisement):
+    registry = DeviceRegistry()
+    seen = []
+    subscription = DeviceSubscription(
+        lambda record: seen.append((record.name, record.rssi)),
+        rssi_delta=5,
+        name_changes=True,
+    )
+    subscription.offer(registry.add(*make_advertisement("AA", name="a", rssi=-60)))
+    subscription.offer(registry.add(*make_advertisement("AA", name="a", rssi=-62)))
+    subscription.offer(registry.add(*make_advertisement("AA", name="a", rssi=-66)))
+    subscription.offer(registry.add(*make_advertisement("AA", name="b", rssi=-66)))
+    assert seen == [("a", -60), ("a", -66), ("b", -66)]
+
+
+def test_on_device_seen_and_cancel(make_advertisement):
+    BleakModel.bt_devices.clear()
+    seen = []
+    subscription = BleakModel.on_device_seen(seen.append)
+    BleakModel.default_adapter._apply_advertisements([make_advertisement("AA")])
+    subscription.cancel()
+    BleakModel.default_adapter._apply_advertisements([make_advertisement("BB")])
+    assert [r.address for r in seen] == ["AA"]
+    assert "BB" in BleakModel.bt_devices
+    BleakModel.bt_devices.clear()
+
+
+def test_subscription_forgets_devices(make_advertisement):
+    registry = DeviceRegistry()
+    subscription = DeviceSubscription(lambda record: None, max_devices=2)
+    for address in ("AA", "BB", "CC"):
+        subscription.offer(registry.add(*make_advertisement(address)))
+    assert list(subscription._delivered) == ["BB", "CC"]
+
+    BleakModel.bt_devices.clear()
+    subscription = BleakModel.on_device_seen(lambda record: None)
+    BleakModel.default_adapter._apply_advertisements([make_advertisement("AA")])
+    assert "AA" in subscription._delivered
+    BleakModel.bt_devices.pop("AA")
+    assert "AA" not in subscription._delivered
+    subscription.cancel()
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from bleak_fsm import BleakModel, CommandQueue, SimulatedEnvironment
+
+CONTROL_POINT_UUID = "00002ad9-0000-1000-8000-00805f9b34fb"
+
+
+class FakeWriter:
+    def __init__(self, latency=0.01):
+        self.latency = latency
+        self.writes = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, characteristic_uuid, data, response):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            self.writes.append((characteristic_uuid, data))
+        finally:
+            self.in_flight -= 1
+
+
+async def run_queue(queue, futures):
+    runner = asyncio.ensure_future(queue.run())
+    results = await asyncio.gather(*futures)
+    queue.close()
+    await runner
+    return results
+
+
+@pytest.mark.asyncio
+async def test_superseded_writes_are_coalesced():
+    writer = FakeWriter()
+    queue = CommandQueue(writer)
+    futures = [queue.submit("resistance", bytes([level])) for level in range(10)]
+    other = queue.submit("fan", b"\x01")
+    assert await run_queue(queue, futures + [other]) == [False] * 9 + [True, True]
+    assert writer.writes == [("resistance", b"\x09"), ("fan", b"\x01")]
+    assert queue.counts["superseded"] == 9
+
+
+@pytest.mark.asyncio
+async def test_in_flight_window():
+    writer = FakeWriter()
+    queue = CommandQueue(writer, window=3)
+    futures = [queue.submit(f"led{i}", b"\x01") for i in range(10)]
+    assert all(await run_queue(queue, futures))
+    assert writer.max_in_flight == 3
+
+    writer = FakeWriter()
+    queue = CommandQueue(writer, window=3)
+    futures = [queue.submit(f"led{i}", b"\x01", response=True) for i in range(5)]
+    assert all(await run_queue(queue, futures))
+    assert writer.max_in_flight == 1  # writes with response go one at a time
+
+
+@pytest.mark.asyncio
+async def test_deadlines():
+    writer = FakeWriter(latency=0.05)
+    queue = CommandQueue(writer, window=1)
+    futures = [
+        queue.submit("a", b"\x01"),
+        queue.submit("b", b"\x02", deadline=0.01),  # still waiting when it expires
+        queue.submit("c", b"\x03", deadline=0.2),
+    ]
+    assert await run_queue(queue, futures) == [True, False, True]
+    assert queue.counts["expired"] == 1
+
+
+@pytest.mark.asyncio
+async def test_send_command():
+    environment = SimulatedEnvironment(write_latency=0.02)
+    device = environment.add_device("AA", characteristics={CONTROL_POINT_UUID: 1.0})
+    BleakModel.bt_devices.clear()
+    with environment.install():
+        BleakModel.bt_devices["AA"] = (device.ble_device, device.advertisement_data)
+        model = BleakModel()
+        assert not await model.send_command(CONTROL_POINT_UUID, b"\x00")  # Init
+        await model.set_target("AA")
+        await model.connect()
+
+        setpoints = [
+            model.send_command(CONTROL_POINT_UUID, bytes([watts])) for watts in (100, 150, 200)
+        ]
+        assert await asyncio.gather(*setpoints) == [False, False, True]
+        assert await model.send_command(CONTROL_POINT_UUID, b"\x05", response=True)
+        assert [data for _, data, _ in model.bleak_client.writes] == [b"\xc8", b"\x05"]
+
+        await model.disconnect()
+        assert not await model.send_command(CONTROL_POINT_UUID, b"\x00")
+        await model.connect()
+        assert await model.send_command(CONTROL_POINT_UUID, b"\x06")
+        await model.clean_up()
+    BleakModel.bt_devices.clear()
+    assert len(model.tasks) == 0
@@ -0,0 +1,86 @@
+import struct
+
+import pytest
+
+from bleak_fsm import NotificationRingBuffer, decode, decode_batch, get_decoder
+from bleak_fsm.decoders import (
+    CSC_MEASUREMENT_UUID,
+    CYCLING_POWER_MEASUREMENT_UUID,
+    HEART_RATE_MEASUREMENT_UUID,
+)
+
+
+def test_lookup_accepts_short_and_long_uuids():
+    assert get_decoder("2a37") is get_decoder(HEART_RATE_MEASUREMENT_UUID.upper())
+    assert get_decoder("ffff") is None
+
+
+def test_heart_rate_uint8():
+    measurement = decode("2a37", bytearray([0x06, 72]))
+    assert measurement.heart_rate == 72
+    assert measurement.sensor_contact is True
+    assert measurement.energy_expended is None
+    assert measurement.rr_intervals == []
+
+
+def test_heart_rate_uint16_energy_and_rr_intervals():
+    data = struct.pack("<BHHHH", 0x19, 300, 12, 1024, 512)
+    measurement = decode("2a37", data)
+    assert measurement.heart_rate == 300
+    assert measurement.sensor_contact is None
+    assert measurement.energy_expended == 12
+    assert measurement.rr_intervals == [1.0, 0.5]
+
+
+def test_battery_level():
+    assert decode("2a19", b"\x55").battery_level == 85
+
+
+def test_csc_crank_only():
+    measurement = decode(CSC_MEASUREMENT_UUID, struct.pack("<BHH", 0x02, 10, 2048))
+    assert measurement.cumulative_wheel_revolutions is None
+    assert measurement.cumulative_crank_revolutions == 10
+    assert measurement.last_crank_event_time == 2048
+
+
+def test_cycling_power_with_balance_crank_and_angles():
+    flags = 0x0001 | 0x0020 | 0x0100
+    # max angle 0x123, min angle 0x456 packed into 3 bytes
+    data = struct.pack("<HhBHHBBB", flags, 250, 100, 5, 1024, 0x23, 0x61, 0x45)
+    measurement = decode(CYCLING_POWER_MEASUREMENT_UUID, data)
+    assert measurement.instantaneous_power == 250
+    assert measurement.pedal_power_balance == 50.0
+    assert measurement.cumulative_crank_revolutions == 5
+    assert measurement.maximum_angle == 0x123
+    assert measurement.minimum_angle == 0x456
+    assert measurement.accumulated_torque is None
+
+
+@pytest.mark.asyncio
+async def test_decode_batch_mixed_flags():
+    np = pytest.importorskip("numpy")
+    buffer = NotificationRingBuffer(capacity=8, max_payload=8)
+    buffer.put(bytes([0x00, 60]), timestamp=1.0)
+    buffer.put(struct.pack("<BH", 0x01, 300), timestamp=2.0)
+    buffer.put(bytes([0x06, 61]), timestamp=3.0)
+    buffer.put(bytes([0x01]), timestamp=4.0)  # truncated packet
+    columns = decode_batch("2a37", await buffer.get_batch())
+    assert columns["timestamp"].tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert columns["heart_rate"][:3].tolist() == [60, 300, 61]
+    assert np.isnan(columns["heart_rate"][3])
+    assert columns["sensor_contact"][2] == 1.0
+    assert np.isnan(columns["sensor_contact"][0])
+    assert "rr_intervals" not in columns
+
+
+@pytest.mark.asyncio
+async def test_decode_batch_cycling_power_angles():
+    pytest.importorskip("numpy")
+    buffer = NotificationRingBuffer(capacity=4, max_payload=16)
+    flags = 0x0100
+    buffer.put(struct.pack("<HhBBB", flags, 200, 0x23, 0x61, 0x45))
+    columns = decode_batch(CYCLING_POWER_MEASUREMENT_UUID, await buffer.get_batch())
+    assert columns["instantaneous_power"].tolist() == [200]
+    assert columns["maximum_angle"].tolist() == [0x123]
+    assert columns["minimum_angle"].tolist() == [0x456]
+    assert not any(name.startswith("_") for name in columns)
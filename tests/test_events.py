@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from bleak_fsm import BleakModel, DeviceRegistry, EventStream, SimulatedEnvironment
+
+
+def test_registry_diffs(make_advertisement):
+    registry = DeviceRegistry(max_size=2)
+    registry.add(*make_advertisement("AA", name="HRM", rssi=-60))
+    events = EventStream()
+    stop = events.watch(registry)
+
+    registry.add(*make_advertisement("AA", name="HRM", rssi=-60))  # nothing changed
+    registry.add(*make_advertisement("AA", name="HRM", rssi=-50))
+    registry.add(*make_advertisement("BB", rssi=-70))
+    registry.add(*make_advertisement("CC", rssi=-80))  # evicts AA
+    registry.pop("BB")
+    stop()
+    registry.clear()
+
+    history = events.since(0)
+    assert [(event.kind, event.address) for event in history] == [
+        ("device_added", "AA"),
+        ("device_updated", "AA"),
+        ("device_added", "BB"),
+        ("device_added", "CC"),
+        ("device_removed", "AA"),
+        ("device_removed", "BB"),
+    ]
+    assert [event.seq for event in history] == list(range(1, 7))
+    assert history[1].data.rssi == -50
+    json.dumps([event._asdict() for event in history])  # plain values only
+    assert list(events.snapshot().devices) == ["CC"]
+
+
+def test_snapshots_are_copy_on_write(make_advertisement):
+    registry = DeviceRegistry()
+    events = EventStream()
+    events.watch(registry)
+    registry.add(*make_advertisement("AA", rssi=-60))
+    first = events.snapshot()
+    assert events.snapshot() is first  # nothing changed
+
+    registry.add(*make_advertisement("BB", rssi=-70))
+    second = events.snapshot()
+    assert first.version == 1 and second.version == 2
+    assert list(first.devices) == ["AA"]
+    assert list(second.devices) == ["AA", "BB"]
+    with pytest.raises(TypeError):
+        second.devices["CC"] = None
+    assert events.since(first.version)[0].address == "BB"
+
+
+def test_rssi_delta(make_advertisement):
+    registry = DeviceRegistry()
+    events = EventStream(rssi_delta=5)
+    events.watch(registry)
+    for rssi in (-60, -62, -58, -66):
+        registry.add(*make_advertisement("AA", rssi=rssi))
+    assert [event.kind for event in events.since(0)] == ["device_added", "device_updated"]
+
+
+def test_small_rssi_changes_are_filtered_by_default(make_advertisement):
+    registry = DeviceRegistry()
+    events = EventStream()
+    events.watch(registry)
+    for rssi in (-60, -61, -59, -63, -58):
+        registry.add(*make_advertisement("AA", rssi=rssi))
+    assert [event.kind for event in events.since(0)] == ["device_added"]
+
+    events = EventStream(rssi_delta=0)
+    events.watch(registry)
+    registry.add(*make_advertisement("AA", rssi=-57))
+    assert [event.kind for event in events.since(0)] == ["device_added", "device_updated"]
+
+
+@pytest.mark.asyncio
+async def test_model_transitions_are_published(monkeypatch):
+    events = EventStream()
+    monkeypatch.setattr(BleakModel, "events", events)
+    environment = SimulatedEnvironment()
+    device = environment.add_device("AA")
+    BleakModel.bt_devices.clear()
+    stop = events.watch(BleakModel.bt_devices)
+    BleakModel.bt_devices["AA"] = (device.ble_device, device.advertisement_data)
+    snapshot = events.snapshot()
+    subscription = events.subscribe(since=snapshot.version)
+    with environment.install():
+        model = BleakModel()
+        await model.set_target("AA")
+        await model.connect()
+        assert events.snapshot().states == {"AA": "Connected"}
+        assert "AA" not in events.snapshot().devices  # taken by the connection
+        await model.clean_up()
+    stop()
+    BleakModel.bt_devices.clear()
+    events.close()
+
+    received = [event async for event in subscription]
+    transitions = [
+        (event.data.source, event.data.dest, event.data.trigger)
+        for event in received
+        if event.kind == "state"
+    ]
+    assert transitions == [
+        ("Init", "TargetSet", "set_target"),
+        ("TargetSet", "Connected", "connect"),
+        ("Connected", "TargetSet", "disconnect"),
+        ("TargetSet", "Init", "unset_target"),
+    ]
+    assert [event.seq for event in received] == list(
+        range(snapshot.version + 1, snapshot.version + 1 + len(received))
+    )
+    assert events.snapshot().states == {}
+    assert "AA" in events.snapshot().devices  # put back by the disconnection
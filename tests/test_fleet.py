@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from bleak_fsm import BleakFleet, BleakModel, SimulatedEnvironment
+
+
+class SlowModel:
+    """
+    Stand-in for BleakModel that takes time to connect and tracks concurrency.
+    """
+
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, connection_timeout=5.0):
+        self.state = "Init"
+        self.clean_up_delay = 0.0
+
+    async def set_target(self, address, discover=False):
+        self.state = "TargetSet"
+        return True
+
+    async def connect(self):
+        SlowModel.in_flight += 1
+        SlowModel.max_in_flight = max(SlowModel.max_in_flight, SlowModel.in_flight)
+        await asyncio.sleep(0.01)
+        SlowModel.in_flight -= 1
+        self.state = "Connected"
+        return True
+
+    async def stream(self):
+        self.state = "Streaming"
+        return True
+
+    async def clean_up(self, timeout=None):
+        if timeout is not None and self.clean_up_delay > timeout:
+            await asyncio.sleep(timeout)
+            self._failure_reason = "timeout"
+        else:
+            await asyncio.sleep(self.clean_up_delay)
+        self.state = "Init"
+        return True
+
+
+@pytest.mark.asyncio
+async def test_fleet_caps_concurrent_connects():
+    SlowModel.max_in_flight = 0
+    addresses = [f"AA:{i:02d}" for i in range(10)]
+    fleet = BleakFleet(addresses, max_concurrent_connects=2, model_factory=SlowModel)
+    results = await fleet.start()
+    assert SlowModel.max_in_flight == 2
+    assert all(result.ok and result.state == "Streaming" for result in results.values())
+
+
+@pytest.mark.asyncio
+async def test_fleet_clean_up_reports_timeouts():
+    def configure(model, address):
+        if address == "slow":
+            model.clean_up_delay = 1.0
+
+    fleet = BleakFleet(["fast", "slow"], configure=configure, model_factory=SlowModel)
+    await fleet.start()
+    results = await fleet.clean_up(timeout=0.05)
+    assert results["fast"].ok
+    assert results["fast"].state == "Init"
+    assert not results["slow"].ok
+    assert results["slow"].reason == "timeout"
+
+
+@pytest.mark.asyncio
+async def test_fleet_reports_failed_stage():
+    BleakModel.bt_devices.clear()
+    environment = SimulatedEnvironment()
+    with environment.install():
+        BleakModel.bt_devices["some_address"] = ("device", "advertisement_data")
+
+        def configure(model, address):
+            model.discovery_timeout = 0.1
+
+        fleet = BleakFleet(
+            ["some_address", "missing_address"], configure=configure, connection_timeout=0.2
+        )
+        results = await fleet.start()
+        assert results["missing_address"].stage == "connect"  # never discovered
+        assert results["missing_address"].state == "TargetSet"
+        assert results["some_address"].stage == "connect"
+        assert results["some_address"].state == "TargetSet"
+        await fleet.clean_up()
+        assert all(model.state == "Init" for model in fleet.models.values())
+    BleakModel.bt_devices.clear()
+
+
+@pytest.mark.asyncio
+async def test_fleet_discovers_unseen_devices():
+    BleakModel.bt_devices.clear()
+    environment = SimulatedEnvironment()
+    devices = environment.add_devices(3, advertising_interval=0.01)
+    with environment.install():
+        fleet = BleakFleet([device.address for device in devices], connection_timeout=0.5)
+        for model in fleet.models.values():
+            model.enable_notifications = lambda client: asyncio.sleep(0)
+            model.disable_notifications = lambda client: asyncio.sleep(0)
+        results = await fleet.start()  # no scan beforehand
+        assert all(result.ok and result.state == "Streaming" for result in results.values())
+        await fleet.clean_up()
+    BleakModel.bt_devices.clear()
+
+
+@pytest.mark.asyncio
+async def test_fleet_clean_up_timeout_reaches_init():
+    BleakModel.bt_devices.clear()
+    environment = SimulatedEnvironment(disconnect_latency=10.0)
+    devices = environment.add_devices(2)
+    with environment.install():
+        for device in devices:
+            BleakModel.bt_devices[device.address] = (device.ble_device, device.advertisement_data)
+        fleet = BleakFleet([device.address for device in devices], connection_timeout=0.5)
+        for model in fleet.models.values():
+            model.enable_notifications = lambda client: asyncio.sleep(0)
+            model.disable_notifications = lambda client: asyncio.sleep(0)
+        results = await fleet.start()
+        assert all(result.ok for result in results.values())
+
+        results = await fleet.clean_up(timeout=0.05)
+        assert all(not result.ok and result.reason == "timeout" for result in results.values())
+        assert all(result.state == "Init" for result in results.values())
+        assert not any(model in BleakModel.instances for model in fleet.models.values())
+    BleakModel.bt_devices.clear()
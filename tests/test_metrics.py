@@ -0,0 +1,158 @@
+import asyncio
+import math
+
+import pytest
+from transitions.core import MachineError
+
+from bleak_fsm import (
+    BleakModel,
+    InMemoryMetrics,
+    PrometheusExporter,
+    SimulatedEnvironment,
+    StreamStats,
+)
+from bleak_fsm.metrics import Histogram
+
+HEART_RATE_MEASUREMENT_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
+
+
+@pytest.fixture
+def metrics():
+    previous = BleakModel.metrics
+    metrics = BleakModel.metrics = InMemoryMetrics()
+    BleakModel.bt_devices.clear()
+    yield metrics
+    BleakModel.metrics = previous
+    BleakModel.bt_devices.clear()
+
+
+def test_histogram_quantile():
+    histogram = Histogram(buckets=(1.0, 2.0, 3.0))
+    for value in (0.5, 1.5, 1.5, 2.5):
+        histogram.observe(value)
+    assert histogram.count == 4
+    assert histogram.counts == [1, 2, 1, 0]
+    assert histogram.mean == pytest.approx(1.5)
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    assert histogram.quantile(1.0) == pytest.approx(3.0)
+    assert math.isnan(Histogram().quantile(0.5))
+
+
+def test_stream_stats():
+    stats = StreamStats()
+    for i in range(11):
+        stats.add(i * 0.1 + (0.01 if i % 2 else 0.0), 4)
+    assert stats.count == 11
+    assert stats.bytes == 44
+    assert stats.mean_interval == pytest.approx(0.1)
+    assert stats.notifications_per_second == pytest.approx(10.0)
+    assert stats.jitter == pytest.approx(0.0105, abs=1e-3)
+
+    sink = InMemoryMetrics()
+    stats.report(sink, {"address": "A"})
+    stats.add(1.1, 4)
+    stats.report(sink, {"address": "A"})
+    assert sink.counter("notifications_total", address="A") == 12
+    assert sink.counter("notification_bytes_total", address="A") == 48
+
+
+def test_prometheus_render():
+    metrics = InMemoryMetrics(buckets=(0.1, 1.0))
+    metrics.increment("transitions_total", labels={"trigger": "connect"})
+    metrics.set_gauge("notifications_per_second", 50.0, {"address": 'A"1'})
+    metrics.observe("transition_duration_seconds", 0.5, {"trigger": "connect"})
+    text = PrometheusExporter(metrics).render()
+    assert "# TYPE bleak_fsm_transitions_total counter" in text
+    assert 'bleak_fsm_transitions_total{trigger="connect"} 1' in text
+    assert 'bleak_fsm_notifications_per_second{address="A\\"1"} 50.0' in text
+    assert 'bleak_fsm_transition_duration_seconds_bucket{trigger="connect",le="0.1"} 0' in text
+    assert 'bleak_fsm_transition_duration_seconds_bucket{trigger="connect",le="1.0"} 1' in text
+    assert 'bleak_fsm_transition_duration_seconds_bucket{trigger="connect",le="+Inf"} 1' in text
+    assert 'bleak_fsm_transition_duration_seconds_count{trigger="connect"} 1' in text
+
+
+@pytest.mark.asyncio
+async def test_exporter_serves_locally(metrics):
+    metrics.increment("transitions_total", 1, {"trigger": "connect"})
+    server = await PrometheusExporter(metrics).serve(port=0)
+    host, port = server.sockets[0].getsockname()[:2]
+    assert host == "127.0.0.1"
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b"GET /metrics HTTP/1.1\r\n\r\n")
+    response = await reader.read()
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    assert response.startswith(b"HTTP/1.1 200 OK")
+    assert b'bleak_fsm_transitions_total{trigger="connect"} 1' in response
+
+
+@pytest.mark.asyncio
+async def test_transition_metrics(metrics):
+    environment = SimulatedEnvironment(connect_latency=0.01, seed=0)
+    device = environment.add_device(
+        "AA", characteristics={HEART_RATE_MEASUREMENT_UUID: 200.0}
+    )
+    BleakModel.bt_devices["AA"] = (device.ble_device, device.advertisement_data)
+
+    with environment.install():
+        model = BleakModel()
+        assert not await model.set_target("BB")
+        with pytest.raises(MachineError):
+            await model.connect()
+        await model.set_target("AA")
+        model.ingest(HEART_RATE_MEASUREMENT_UUID)
+        await model.connect()
+        await model.stream()
+        await asyncio.sleep(0.1)
+        await model.clean_up()
+
+    missing = metrics.histogram(
+        "transition_duration_seconds",
+        trigger="set_target",
+        outcome="failure",
+        reason="missing_device",
+        address="",
+    )
+    assert missing.count == 1
+    assert (
+        metrics.counter(
+            "transitions_total",
+            trigger="connect",
+            outcome="error",
+            reason="invalid_transition",
+            address="",
+        )
+        == 1
+    )
+    (labels, connect), = metrics.find(
+        "transition_duration_seconds", trigger="connect", outcome="success"
+    )
+    assert labels["address"] == "AA"
+    assert connect.sum >= 0.01
+    for trigger in ("stream", "disconnect", "unset_target", "clean_up"):
+        assert metrics.find("transition_duration_seconds", trigger=trigger, outcome="success")
+
+    labels = {"address": "AA", "characteristic": HEART_RATE_MEASUREMENT_UUID}
+    assert metrics.counter("notifications_total", **labels) >= 10
+    assert metrics.counter("notification_bytes_total", **labels) == 2 * metrics.counter(
+        "notifications_total", **labels
+    )
+    assert metrics.gauge("notifications_per_second", **labels) > 100
+
+
+@pytest.mark.asyncio
+async def test_connect_timeout_reason(metrics):
+    environment = SimulatedEnvironment(connect_latency=1.0)
+    device = environment.add_device("AA")
+    BleakModel.bt_devices["AA"] = (device.ble_device, device.advertisement_data)
+
+    with environment.install():
+        model = BleakModel(connection_timeout=0.01)
+        await model.set_target("AA")
+        assert not await model.connect()
+        await model.clean_up()
+
+    assert metrics.find(
+        "transition_duration_seconds", trigger="connect", outcome="failure", reason="timeout"
+    )
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from bleak_fsm import NotificationQueue
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest_keeps_latest_samples():
+    queue = NotificationQueue(maxsize=2, overflow="drop_oldest")
+    for i in range(5):
+        queue.put(i)
+    assert queue.queued == 5
+    assert queue.dropped == 3
+    assert [await queue.get(), await queue.get()] == [3, 4]
+
+
+def test_count_and_drop_keeps_earliest_samples():
+    queue = NotificationQueue(maxsize=2, overflow="count_and_drop")
+    results = [queue.put(i) for i in range(3)]
+    assert results == [True, True, False]
+    assert list(queue._items) == [0, 1]
+    assert queue.dropped == 1
+
+
+@pytest.mark.asyncio
+async def test_block_waits_for_consumer():
+    queue = NotificationQueue(maxsize=1, overflow="block")
+    await queue.put_wait("a")
+    producer = asyncio.ensure_future(queue.put_wait("b"))
+    await asyncio.sleep(0.01)
+    assert not producer.done()
+    assert await queue.get() == "a"
+    assert await producer
+    assert await queue.get() == "b"
+
+
+@pytest.mark.asyncio
+async def test_block_bounds_waiting_producers():
+    queue = NotificationQueue(maxsize=1, overflow="block", max_waiting=1)
+    await queue.put_wait("a")
+    producers = [asyncio.ensure_future(queue.put_wait(item)) for item in "bc"]
+    await asyncio.sleep(0.01)
+    assert [producer.done() for producer in producers] == [False, True]
+    assert queue.dropped == 1
+    assert await queue.get() == "a"
+    assert await producers[0]
+    assert await queue.get() == "b"
+
+
+@pytest.mark.asyncio
+async def test_iteration_drains_then_ends_on_close():
+    queue = NotificationQueue()
+    queue.put(1)
+    queue.put(2)
+    queue.close()
+    assert [sample async for sample in queue] == [1, 2]
+
+
+def test_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        NotificationQueue(overflow="ignore")
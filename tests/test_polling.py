@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from bleak_fsm import BleakModel, PollScheduler, SimulatedEnvironment
+
+BATTERY_LEVEL_UUID = "00002a19-0000-1000-8000-00805f9b34fb"
+
+
+class Spawner:
+    def __init__(self):
+        self.tasks = []
+
+    def __call__(self, coroutine, name):
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.append(task)
+        return task
+
+
+@pytest.mark.asyncio
+async def test_reads_are_staggered_and_limited():
+    scheduler = PollScheduler(tick=0.005, max_concurrent_reads=2)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    first_reads = {}
+    reads = {}
+    in_flight = [0, 0]  # current, max
+
+    def make_read(device):
+        async def read():
+            first_reads.setdefault(device, loop.time() - started)
+            reads[device] = reads.get(device, 0) + 1
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+            await asyncio.sleep(0.001)
+            in_flight[0] -= 1
+
+        return read
+
+    spawn = Spawner()
+    entries = [scheduler.add(0.05, make_read(device), spawn) for device in range(10)]
+    first_ticks = [entry.due for entry in entries]
+    await asyncio.sleep(0.2)
+    for entry in entries:
+        entry.cancel()
+    await asyncio.gather(*spawn.tasks)
+
+    # ten devices with the same period start one tick apart instead of together
+    assert sorted(first_ticks) == list(range(first_ticks[0], first_ticks[0] + 10))
+    assert len(first_reads) == 10 and max(first_reads.values()) < 0.1
+    assert in_flight[1] <= 2
+    assert all(2 <= count <= 6 for count in reads.values())
+    await asyncio.sleep(0.02)
+    assert scheduler._task is None  # stops once nothing is registered
+
+
+@pytest.mark.asyncio
+async def test_slow_read_is_skipped_not_queued():
+    scheduler = PollScheduler(tick=0.005)
+    reads = []
+
+    async def read():
+        reads.append(None)
+        await asyncio.sleep(0.03)
+
+    spawn = Spawner()
+    entry = scheduler.add(0.01, read, spawn)
+    await asyncio.sleep(0.1)
+    entry.cancel()
+    await asyncio.gather(*spawn.tasks)
+    assert 2 <= len(reads) <= 4
+    assert entry.stats.skipped >= 4
+
+
+@pytest.mark.asyncio
+async def test_poll_without_notifications():
+    environment = SimulatedEnvironment(read_latency=0.005)
+    device = environment.add_device(
+        "AA",
+        characteristics={BATTERY_LEVEL_UUID: 1.0},
+    )
+    device.characteristics[BATTERY_LEVEL_UUID].value = bytearray([87])
+    BleakModel.bt_devices.clear()
+    with environment.install():
+        BleakModel.bt_devices["AA"] = (device.ble_device, device.advertisement_data)
+        model = BleakModel()
+        levels = []
+        model.on_measurement(BATTERY_LEVEL_UUID, levels.append)
+        model.poll(BATTERY_LEVEL_UUID, 0.02)
+        queue = model.iter_notifications(BATTERY_LEVEL_UUID)
+        await model.set_target("AA")
+        await model.connect()
+        await model.stream()
+        assert BATTERY_LEVEL_UUID not in model.bleak_client._notify_tasks
+        samples = []
+        async for sample in queue:
+            samples.append(sample)
+            if len(samples) == 3:
+                break
+        await asyncio.sleep(0.1)
+        await model.clean_up()
+    BleakModel.bt_devices.clear()
+
+    assert [bytes(sample.data) for sample in samples] == [b"\x57"] * 3
+    assert {level.battery_level for level in levels} == {87} and len(levels) >= 5
+    stats = model.poll_stats[BATTERY_LEVEL_UUID]
+    assert stats.reads == len(levels) and stats.failures == 0
+    assert stats.latency.count == stats.reads and stats.latency.mean >= 0.005
+    assert model.stream_stats[BATTERY_LEVEL_UUID].count == stats.reads
+    assert len(BleakModel.poll_scheduler) == 0
+    assert len(model.tasks) == 0
@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+
+from bleak_fsm import (
+    BleakModel,
+    NotificationRecorder,
+    RecordingReader,
+    ReplaySource,
+    SimulatedEnvironment,
+)
+
+HEART_RATE_MEASUREMENT_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "log.bfsm"
+    with NotificationRecorder(path) as recorder:
+        recorder.write(1.0, "AA", HEART_RATE_MEASUREMENT_UUID, bytearray(b"\x00\x40"))
+        recorder.write(1.5, "BB", HEART_RATE_MEASUREMENT_UUID, b"\x00\x41")
+    with NotificationRecorder(path) as recorder:  # appends a second session
+        recorder.write(2.0, "AA", "2a19", b"\x64")
+
+    with RecordingReader(path) as reader:
+        records = list(reader)
+    assert [(r.timestamp, r.address, r.characteristic_uuid, r.data) for r in records] == [
+        (1.0, "AA", HEART_RATE_MEASUREMENT_UUID, b"\x00\x40"),
+        (1.5, "BB", HEART_RATE_MEASUREMENT_UUID, b"\x00\x41"),
+        (2.0, "AA", "2a19", b"\x64"),
+    ]
+    expected = time.time() - time.monotonic()
+    assert abs(records[0].wall_time - 1.0 - expected) < 1.0
+
+
+def test_truncated_record_ends_the_log(tmp_path):
+    path = tmp_path / "log.bfsm"
+    with NotificationRecorder(path) as recorder:
+        for i in range(10):
+            recorder.write(float(i), "AA", "2a19", bytes([i]))
+    with open(path, "r+b") as f:
+        f.truncate(path.stat().st_size - 2)
+    with RecordingReader(path) as reader:
+        assert [r.data[0] for r in reader] == list(range(9))
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "log.txt"
+    path.write_text("Heart Rate: 64 beats per minute\n")
+    with pytest.raises(ValueError):
+        RecordingReader(path)
+
+
+async def collect(buffer):
+    return [
+        (timestamp, bytes(data)) async for batch in buffer for timestamp, data in batch
+    ]
+
+
+@pytest.mark.asyncio
+async def test_record_stream_and_replay(tmp_path):
+    path = tmp_path / "session.bfsm"
+    environment = SimulatedEnvironment()
+    device = environment.add_device(
+        "AA", characteristics={HEART_RATE_MEASUREMENT_UUID: 200.0}
+    )
+    BleakModel.bt_devices.clear()
+    with environment.install(), NotificationRecorder(path) as recorder:
+        BleakModel.bt_devices["AA"] = (device.ble_device, device.advertisement_data)
+        model = BleakModel()
+        model.record(HEART_RATE_MEASUREMENT_UUID, recorder)
+        buffer = model.ingest(HEART_RATE_MEASUREMENT_UUID)
+        await model.set_target("AA")
+        await model.connect()
+        await model.stream()
+        await asyncio.sleep(0.1)
+        await model.clean_up()
+    BleakModel.bt_devices.clear()
+    live = await collect(buffer)
+    assert recorder.notifications == len(live) > 5
+
+    offline = BleakModel()
+    heart_rates = []
+    offline.on_measurement(HEART_RATE_MEASUREMENT_UUID, heart_rates.append)
+    replayed = offline.ingest(HEART_RATE_MEASUREMENT_UUID)
+    assert await offline.replay(path) == len(live)
+    assert await collect(replayed) == live
+    assert len(heart_rates) == len(live)
+    assert offline.stream_stats[HEART_RATE_MEASUREMENT_UUID].count == len(live)
+
+    assert await offline.replay(ReplaySource(path, address="BB")) == 0
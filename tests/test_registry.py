@@ -0,0 +1,119 @@
+from bleak_fsm import DeviceRegistry
+
+HEART_RATE_SERVICE_UUID = "0000180d-0000-1000-8000-00805f9b34fb"
+
+
+def test_record_unpacks_like_legacy_tuple(make_advertisement):
+    registry = DeviceRegistry()
+    device, advertisement_data = make_advertisement("AA", name="HRM")
+    registry.add(device, advertisement_data)
+    unpacked_device, unpacked_advertisement_data = registry["AA"]
+    assert unpacked_device is device
+    assert unpacked_advertisement_data is advertisement_data
+    assert registry["AA"][0].name == "HRM"
+    for address, (ble_device, _) in registry.items():
+        assert address == ble_device.address
+
+
+def test_repeated_advertisements_reuse_record(make_advertisement):
+    registry = DeviceRegistry()
+    first = registry.add(*make_advertisement("AA", rssi=-80))
+    second = registry.add(*make_advertisement("AA", rssi=-40))
+    assert first is second
+    assert len(registry) == 1
+    assert [r.address for r in registry.with_min_rssi(-50)] == ["AA"]
+
+
+def test_max_size_evicts_least_recently_seen(make_advertisement, clock):
+    registry = DeviceRegistry(max_size=2, clock=clock)
+    for address in ("AA", "BB", "CC"):
+        clock.now += 1
+        registry.add(*make_advertisement(address))
+    assert "AA" not in registry
+    assert sorted(registry.keys()) == ["BB", "CC"]
+
+
+def test_ttl_evicts_stale_devices(make_advertisement, clock):
+    registry = DeviceRegistry(ttl=10.0, clock=clock)
+    registry.add(*make_advertisement("AA", name="old"))
+    clock.now = 5.0
+    registry.add(*make_advertisement("BB"))
+    clock.now = 12.0
+    assert "AA" not in registry
+    assert "BB" in registry
+    assert registry.with_name("old") == []
+
+
+def test_find_intersects_indexes(make_advertisement, clock):
+    registry = DeviceRegistry(clock=clock)
+    registry.add(
+        *make_advertisement("AA", rssi=-50, service_uuids=[HEART_RATE_SERVICE_UUID])
+    )
+    clock.now = 20.0
+    registry.add(
+        *make_advertisement("BB", rssi=-90, service_uuids=[HEART_RATE_SERVICE_UUID])
+    )
+    registry.add(*make_advertisement("CC", rssi=-40))
+    clock.now = 25.0
+
+    recent_hr = registry.find(
+        service_uuid=HEART_RATE_SERVICE_UUID.upper(), seen_within=10.0
+    )
+    assert [r.address for r in recent_hr] == ["BB"]
+    strong_hr = registry.find(service_uuid=HEART_RATE_SERVICE_UUID, min_rssi=-70)
+    assert [r.address for r in strong_hr] == ["AA"]
+
+
+def test_pop_removes_from_indexes(make_advertisement):
+    registry = DeviceRegistry()
+    registry.add(*make_advertisement("AA", name="HRM", rssi=-50))
+    record = registry.pop("AA")
+    assert record.address == "AA"
+    assert registry.with_name("HRM") == []
+    assert registry.with_min_rssi(-100) == []
+    assert len(registry) == 0
+
+
+def test_snapshot_round_trip(tmp_path, make_advertisement, clock):
+    registry = DeviceRegistry(clock=clock)
+    clock.now = 100.0
+    registry.add(
+        *make_advertisement(
+            "AA", name="HRM", rssi=-50, service_uuids=[HEART_RATE_SERVICE_UUID]
+        )
+    )
+    clock.now = 160.0
+    registry.add(*make_advertisement("BB", name="Phone", rssi=-70))
+    path = tmp_path / "devices.json"
+    registry.save(path)
+
+    restored = DeviceRegistry(clock=lambda: 0.0)  # a fresh clock
+    assert restored.load(path, max_age=30.0) == 1  # AA was last seen 60 s before saving
+    assert restored.load(tmp_path / "missing.json") == 0
+    assert restored.load(path) == 1  # BB is already known
+    record = restored["AA"]
+    assert record.cached
+    assert tuple(record) == (None, None)
+    assert (record.name, record.rssi) == ("HRM", -50)
+    assert restored.with_service(HEART_RATE_SERVICE_UUID) == [record]
+    assert [r.address for r in restored.seen_within(3600)] == ["BB", "AA"]
+
+
+def test_restored_record_is_replaced_when_seen(make_advertisement):
+    registry = DeviceRegistry()
+    registry.restore(
+        [
+            {
+                "address": "AA",
+                "name": "HRM",
+                "rssi": -50,
+                "service_uuids": [],
+                "last_seen": 0.0,
+            }
+        ],
+        wall_now=10.0,
+    )
+    assert registry["AA"].cached
+    registry.add(*make_advertisement("AA", name="HRM", rssi=-40))
+    assert not registry["AA"].cached
+    assert registry.with_min_rssi(-100) == [registry["AA"]]
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from bleak_fsm import NotificationRingBuffer
+
+
+@pytest.mark.asyncio
+async def test_batches_are_views_of_payloads():
+    buffer = NotificationRingBuffer(capacity=8, max_payload=4)
+    buffer.put(bytearray(b"\x01\x02"), timestamp=1.0)
+    buffer.put(bytearray(b"\x03\x04\x05"), timestamp=2.0)
+    batch = await buffer.get_batch()
+    assert len(batch) == 2
+    assert [(t, bytes(p)) for t, p in batch] == [
+        (1.0, b"\x01\x02"),
+        (2.0, b"\x03\x04\x05"),
+    ]
+    assert len(buffer) == 0
+
+
+@pytest.mark.asyncio
+async def test_batches_do_not_wrap_around():
+    buffer = NotificationRingBuffer(capacity=4, max_payload=1)
+
+    async def next_payloads(max_batch=None):
+        batch = await buffer.get_batch(max_batch)
+        return [bytes(payload) for _, payload in batch]
+
+    for i in range(3):
+        buffer.put(bytes([i]))
+    assert await next_payloads(max_batch=2) == [b"\x00", b"\x01"]
+    buffer.put(b"\x03")
+    assert await next_payloads(max_batch=1) == [b"\x02"]
+    buffer.put(b"\x04")
+    buffer.put(b"\x05")
+    # slots 3, 0, 1 are unread: handed out as two contiguous batches
+    assert await next_payloads() == [b"\x03"]
+    assert await next_payloads() == [b"\x04", b"\x05"]
+
+
+def test_drop_oldest_and_count_and_drop():
+    oldest = NotificationRingBuffer(capacity=2, max_payload=1, overflow="drop_oldest")
+    newest = NotificationRingBuffer(capacity=2, max_payload=1, overflow="count_and_drop")
+    for i in range(3):
+        oldest.put(bytes([i]))
+        newest.put(bytes([i]))
+    assert oldest.dropped == 1
+    assert newest.dropped == 1
+    assert oldest._view[oldest._read % 2 : oldest._read % 2 + 1] == b"\x01"
+    assert bytes(newest._view[0:1]) == b"\x00"
+
+
+def test_truncates_long_payloads():
+    buffer = NotificationRingBuffer(capacity=2, max_payload=2)
+    buffer.put(b"\x01\x02\x03")
+    assert buffer.truncated == 1
+    assert buffer._lengths[0] == 2
+
+
+@pytest.mark.asyncio
+async def test_block_policy_waits_for_consumer():
+    buffer = NotificationRingBuffer(capacity=1, max_payload=1, overflow="block")
+    await buffer.put_wait(b"\x01")
+    producer = asyncio.ensure_future(buffer.put_wait(b"\x02"))
+    await asyncio.sleep(0.01)
+    assert not producer.done()
+    batch = await buffer.get_batch()
+    assert bytes(batch.payload(0)) == b"\x01"
+    await buffer.get_batch()  # releases the first batch, waits for the second
+    assert await producer
+    assert buffer.dropped == 0
+
+
+@pytest.mark.asyncio
+async def test_block_policy_bounds_waiting_producers():
+    buffer = NotificationRingBuffer(capacity=1, max_payload=1, overflow="block", max_waiting=2)
+    await buffer.put_wait(b"\x01")
+    producers = [asyncio.ensure_future(buffer.put_wait(bytes([i]))) for i in range(4)]
+    await asyncio.sleep(0.01)
+    assert [producer.done() for producer in producers] == [False, False, True, True]
+    assert buffer.dropped == 2
+    buffer.close()
+    await asyncio.gather(*producers)
+
+
+@pytest.mark.asyncio
+async def test_iteration_ends_after_close():
+    buffer = NotificationRingBuffer(capacity=4, max_payload=1)
+    buffer.put(b"\x01")
+    buffer.close()
+    batches = [len(batch) async for batch in buffer]
+    assert batches == [1]
+
+
+@pytest.mark.asyncio
+async def test_to_numpy_shares_memory():
+    np = pytest.importorskip("numpy")
+    buffer = NotificationRingBuffer(capacity=4, max_payload=2)
+    buffer.put(b"\x06\x48", timestamp=1.5)
+    buffer.put(b"\x06\x49", timestamp=2.5)
+    timestamps, lengths, payloads = (await buffer.get_batch()).to_numpy()
+    assert timestamps.tolist() == [1.5, 2.5]
+    assert lengths.tolist() == [2, 2]
+    assert payloads[:, 1].tolist() == [0x48, 0x49]
+    assert np.shares_memory(payloads, np.frombuffer(buffer._data, dtype=np.uint8))
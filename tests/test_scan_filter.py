@@ -0,0 +1,28 @@
+from bleak_fsm.scan_filter import make_scan_filter
+
+
+def test_no_criteria_returns_none():
+    assert make_scan_filter() is None
+
+
+def test_name_prefix(make_advertisement):
+    accept = make_scan_filter(name_prefix=("HRM", "KICKR"))
+    assert accept(*make_advertisement("AA", name="KICKR CORE"))
+    assert not accept(*make_advertisement("AA", name="Phone"))
+    assert not accept(*make_advertisement("AA", name=None))
+
+
+def test_min_rssi(make_advertisement):
+    accept = make_scan_filter(min_rssi=-70)
+    assert accept(*make_advertisement("AA", rssi=-70))
+    assert not accept(*make_advertisement("AA", rssi=-71))
+
+
+def test_combined_criteria(make_advertisement):
+    accept = make_scan_filter(
+        name_prefix="HRM", min_rssi=-70, address_allowlist=["aa:bb"]
+    )
+    assert accept(*make_advertisement("AA:BB", name="HRM 1", rssi=-50))
+    assert not accept(*make_advertisement("AA:CC", name="HRM 1", rssi=-50))
+    assert not accept(*make_advertisement("AA:BB", name="HRM 1", rssi=-90))
+    assert not accept(*make_advertisement("AA:BB", name="Other", rssi=-50))
@@ -0,0 +1,140 @@
+import time
+
+import pytest
+
+from bleak_fsm import BleakModel, ServiceCache, SimulatedCharacteristic, SimulatedEnvironment
+from bleak_fsm.service_cache import advertisement_hash
+
+HEART_RATE_SERVICE_UUID = "0000180d-0000-1000-8000-00805f9b34fb"
+HEART_RATE_MEASUREMENT_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
+FITNESS_MACHINE_SERVICE_UUID = "00001826-0000-1000-8000-00805f9b34fb"
+CONTROL_POINT_UUID = "00002ad9-0000-1000-8000-00805f9b34fb"
+TABLE = {HEART_RATE_SERVICE_UUID: [HEART_RATE_MEASUREMENT_UUID]}
+
+
+def test_advertisement_hash_ignores_volatile_fields(make_advertisement):
+    first = make_advertisement("AA", name="HRM", rssi=-50, service_uuids=["180d"])
+    second = make_advertisement("AA", name="HRM", rssi=-80, service_uuids=["180D"])
+    renamed = make_advertisement("AA", name="HRM 2", rssi=-50, service_uuids=["180d"])
+    assert advertisement_hash(*first) == advertisement_hash(*second)
+    assert advertisement_hash(*first) != advertisement_hash(*renamed)
+
+
+def test_persists_across_instances(tmp_path, make_advertisement):
+    path = tmp_path / "services.json"
+    device, advertisement_data = make_advertisement("AA", name="HRM")
+    ServiceCache(path).put("AA", device, advertisement_data, TABLE)
+
+    cache = ServiceCache(path)
+    assert cache.get("AA", device, advertisement_data) == TABLE
+    assert cache.get("BB", device, advertisement_data) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_invalidated_on_mismatch_and_age(tmp_path, make_advertisement):
+    path = tmp_path / "services.json"
+    cache = ServiceCache(path)
+    cache.put("AA", *make_advertisement("AA", name="HRM"), TABLE)
+    assert cache.get("AA", *make_advertisement("AA", name="Other")) is None
+    assert "AA" not in cache
+    assert "AA" not in ServiceCache(path)
+
+    cache = ServiceCache(path, max_age=0.01)
+    cache.put("AA", *make_advertisement("AA", name="HRM"), TABLE)
+    time.sleep(0.02)
+    assert cache.get("AA", *make_advertisement("AA", name="HRM")) is None
+    assert cache.invalidations == 1
+
+
+def test_unreadable_file_is_ignored(tmp_path):
+    path = tmp_path / "services.json"
+    path.write_text("{not json")
+    assert len(ServiceCache(path)) == 0
+
+
+@pytest.fixture
+def cached_environment(tmp_path, monkeypatch):
+    environment = SimulatedEnvironment(discovery_latency=0.05)
+    device = environment.add_device(
+        "AA",
+        name="HRM",
+        service_uuids=["180d"],
+        characteristics={
+            HEART_RATE_MEASUREMENT_UUID: 100.0,
+            CONTROL_POINT_UUID: SimulatedCharacteristic(
+                CONTROL_POINT_UUID, rate=0.0, service_uuid=FITNESS_MACHINE_SERVICE_UUID
+            ),
+        },
+    )
+    cache = ServiceCache(tmp_path / "services.json")
+    monkeypatch.setattr(BleakModel, "service_cache", cache)
+    BleakModel.bt_devices.clear()
+    with environment.install():
+        yield environment, device, cache
+    BleakModel.bt_devices.clear()
+
+
+async def connect_and_stream(device):
+    BleakModel.bt_devices["AA"] = (device.ble_device, device.advertisement_data)
+    model = BleakModel()
+    model.ingest(HEART_RATE_MEASUREMENT_UUID)
+    await model.set_target("AA")
+    started = time.monotonic()
+    assert await model.connect()
+    elapsed = time.monotonic() - started
+    assert await model.stream()
+    return model, elapsed
+
+
+@pytest.mark.asyncio
+async def test_cached_connect_skips_discovery(cached_environment):
+    environment, device, cache = cached_environment
+
+    model, full = await connect_and_stream(device)
+    assert model.bleak_client.requested_services is None
+    assert cache.get("AA", device.ble_device, device.advertisement_data) is not None
+    await model.clean_up()
+
+    model, cached = await connect_and_stream(device)
+    assert model.bleak_client.requested_services == set(device.gatt_services)
+    assert cached < full
+    # in a service the model doesn't consume
+    assert await model.send_command(CONTROL_POINT_UUID, b"\x00", response=True)
+    await model.clean_up()
+
+
+@pytest.mark.asyncio
+async def test_restored_device_hits_cache(cached_environment, tmp_path):
+    environment, device, cache = cached_environment
+    model, _ = await connect_and_stream(device)
+    await model.clean_up()
+    path = tmp_path / "devices.json"
+    assert BleakModel.save_snapshot(path)
+    BleakModel.bt_devices.clear()  # as in a new process
+
+    assert BleakModel.load_snapshot(path) == 1
+    model = BleakModel()
+    model.ingest(HEART_RATE_MEASUREMENT_UUID)
+    assert await model.set_target("AA")
+    assert await model.connect()
+    assert model.bleak_client.requested_services == set(device.gatt_services)
+    assert cache.hits == 1
+    await model.clean_up()
+
+
+@pytest.mark.asyncio
+async def test_stale_cache_entry_is_rediscovered(cached_environment):
+    environment, device, cache = cached_environment
+    model, _ = await connect_and_stream(device)
+    await model.clean_up()
+
+    # new firmware moves the characteristic to another service
+    device.characteristics[HEART_RATE_MEASUREMENT_UUID].service_uuid = "0000fff0-0000-1000-8000-00805f9b34fb"
+    model, _ = await connect_and_stream(device)
+    assert model.state == "Streaming"
+    assert model.bleak_client.requested_services is None
+    assert cache.invalidations == 1
+    assert "0000fff0-0000-1000-8000-00805f9b34fb" in cache.get(
+        "AA", device.ble_device, device.advertisement_data
+    )
+    await model.clean_up()
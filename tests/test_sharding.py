@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+from transitions.core import MachineError
+
+from bleak_fsm import ShardSupervisor, SimulatedEnvironment
+
+HEART_RATE_SERVICE_UUID = "180d"
+HEART_RATE_MEASUREMENT_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
+ADDRESSES = [f"00:00:00:00:00:{n:02X}" for n in range(4)]
+_installed = []  # keeps the worker's environment installed
+
+
+def install_environment():
+    """
+    Worker initializer: every shard sees the same simulated devices.
+    """
+    environment = SimulatedEnvironment(seed=0)
+    for address in ADDRESSES:
+        environment.add_device(
+            address,
+            name=f"HRM {address[-2:]}",
+            service_uuids=[HEART_RATE_SERVICE_UUID],
+            advertising_interval=0.01,
+            characteristics={HEART_RATE_MEASUREMENT_UUID: 100.0},
+        )
+    installation = environment.install()
+    installation.__enter__()
+    _installed.append(installation)
+
+
+@pytest.mark.asyncio
+async def test_models_stream_from_worker_processes():
+    received = {address: [] for address in ADDRESSES}
+    async with ShardSupervisor(shards=2, initializer=install_environment) as shards:
+        models = [await shards.create_model() for _ in ADDRESSES]
+        assert sorted(model.shard.index for model in models) == [0, 0, 1, 1]
+        for model, address in zip(models, ADDRESSES):
+            assert await model.on_measurement(
+                HEART_RATE_MEASUREMENT_UUID, received[address].append
+            )
+            assert await model.set_target(address, discover=True)
+            assert await model.connect()
+            assert await model.stream()
+            assert model.state == "Streaming" and model.is_Streaming()
+        await asyncio.sleep(0.3)
+
+        assert await models[0].disconnect()
+        assert models[0].state == "TargetSet"
+        with pytest.raises(MachineError):
+            await models[0].stream()
+    for samples in received.values():
+        assert len(samples) > 5
+        assert all(sample.heart_rate > 0 for sample in samples)
+    assert all(model.state == "Init" for model in models)
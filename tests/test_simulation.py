@@ -0,0 +1,210 @@
+import asyncio
+import logging
+
+import pytest
+
+from bleak_fsm import BleakModel, SimulatedEnvironment
+
+HEART_RATE_SERVICE_UUID = "180d"
+HEART_RATE_MEASUREMENT_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
+
+
+@pytest.fixture
+def environment():
+    environment = SimulatedEnvironment(seed=1)
+    environment.add_devices(
+        50,
+        name_prefix="HRM",
+        service_uuids=[HEART_RATE_SERVICE_UUID],
+        advertising_interval=0.01,
+        characteristics={HEART_RATE_MEASUREMENT_UUID: 200.0},
+    )
+    environment.add_devices(50, name_prefix="Phone", advertising_interval=0.01)
+    BleakModel.bt_devices.clear()
+    with environment.install():
+        yield environment
+    BleakModel.bt_devices.clear()
+
+
+@pytest.mark.asyncio
+async def test_simulated_scan(environment):
+    await BleakModel.start_scan(service_uuids=[HEART_RATE_SERVICE_UUID])
+    await asyncio.sleep(0.1)
+    await BleakModel.stop_scan()
+    assert len(BleakModel.bt_devices) == 50
+    assert all(record.name.startswith("HRM") for record in BleakModel.bt_devices.values())
+
+
+@pytest.mark.asyncio
+async def test_simulated_stream(environment):
+    address = next(iter(environment.devices))
+    BleakModel.bt_devices[address] = (
+        environment.devices[address].ble_device,
+        environment.devices[address].advertisement_data,
+    )
+    model = BleakModel()
+    heart_rates = []
+    model.on_measurement(
+        HEART_RATE_MEASUREMENT_UUID, lambda m: heart_rates.append(m.heart_rate)
+    )
+    await model.set_target(address)
+    await model.connect()
+    await model.stream()
+    assert model.state == "Streaming"
+    await asyncio.sleep(0.1)
+    assert len(heart_rates) >= 10
+    assert all(60 <= hr < 100 for hr in heart_rates)
+
+    environment.drop(address)
+    await model._reconnect_task
+    assert model.state == "Streaming"
+    await model.clean_up()
+    assert model.state == "Init"
+    assert environment.devices[address].client is None
+
+
+@pytest.mark.asyncio
+async def test_simulated_connect_failure(environment):
+    environment.connect_failure_rate = 1.0
+    address = next(iter(environment.devices))
+    BleakModel.bt_devices[address] = (environment.devices[address].ble_device, None)
+    model = BleakModel()
+    await model.set_target(address)
+    assert not await model.connect()
+    assert model.state == "TargetSet"
+    await model.clean_up()
+
+
+@pytest.mark.asyncio
+async def test_connect_from_snapshot_without_scanning(environment, tmp_path):
+    address = next(iter(environment.devices))
+    path = tmp_path / "devices.json"
+    device = environment.devices[address]
+    BleakModel.bt_devices[address] = (device.ble_device, device.advertisement_data)
+    assert BleakModel.save_snapshot(path)
+    BleakModel.bt_devices.clear()  # as in a new process
+
+    assert BleakModel.load_snapshot(path) == 1
+    model = BleakModel()
+    assert await model.set_target(address)  # no scan needed
+    assert model._confirm_task is not None
+    model.ingest(HEART_RATE_MEASUREMENT_UUID)
+    assert await model.connect()
+    assert model.ble_device is device.ble_device
+    assert await model.stream()
+    await model.clean_up()
+
+
+@pytest.mark.asyncio
+async def test_connect_timeout_keeps_snapshot_record(environment):
+    environment.add_device("slow", name="HRM slow", advertising_interval=10.0)
+    BleakModel.bt_devices.restore(
+        [
+            {
+                "address": "slow",
+                "name": "HRM slow",
+                "rssi": -70,
+                "service_uuids": [HEART_RATE_SERVICE_UUID],
+                "last_seen": 0.0,
+            }
+        ],
+        wall_now=0.0,
+    )
+    model = BleakModel(connection_timeout=0.01)
+    assert await model.set_target("slow")
+    assert not await model.connect()  # times out while looking for the device
+    record = BleakModel.bt_devices.get("slow")
+    assert (record.name, record.rssi) == ("HRM slow", -70)
+    assert record.service_uuids
+    await model.clean_up()
+
+
+@pytest.mark.asyncio
+async def test_connect_timeout_before_client_logs_no_error(environment, caplog):
+    environment.add_device("slow", name="HRM slow", advertising_interval=10.0)
+    BleakModel.bt_devices.restore(
+        [{"address": "slow", "name": "HRM slow", "rssi": -70, "service_uuids": [], "last_seen": 0.0}],
+        wall_now=0.0,
+    )
+    model = BleakModel(connection_timeout=0.01)
+    assert await model.set_target("slow")
+    caplog.set_level(logging.DEBUG, logger="bleak_fsm")
+    assert not await model.connect()  # times out before a client is created
+    assert model.bleak_client is None
+    assert not [record for record in caplog.records if record.levelno >= logging.ERROR]
+    assert "slow" in BleakModel.bt_devices
+    await model.clean_up()
+
+
+@pytest.mark.asyncio
+async def test_snapshot_device_not_nearby(environment):
+    BleakModel.bt_devices.restore(
+        [
+            {
+                "address": "gone",
+                "name": None,
+                "rssi": None,
+                "service_uuids": [],
+                "last_seen": 0.0,
+            }
+        ]
+    )
+    model = BleakModel()
+    assert await model.set_target("gone")
+    assert not await model.connect()
+    assert model.state == "TargetSet"
+    assert "gone" in BleakModel.bt_devices  # kept for a later attempt
+    await model.clean_up()
+
+
+@pytest.mark.asyncio
+async def test_connect_on_discovery(environment):
+    first, second = list(environment.devices)[:2]
+    models = [BleakModel(discovery_timeout=1.0) for _ in range(2)]
+    assert await models[0].set_target(first, discover=True)
+    assert await models[1].set_target(second, discover=True)
+    assert BleakModel.default_adapter._scanning  # started for the pending targets
+
+    results = await asyncio.gather(models[0].connect(), models[1].connect())
+    assert results == [True, True]
+    assert [model.state for model in models] == ["Connected", "Connected"]
+    assert BleakModel.default_adapter._pending_targets == {}
+    assert not BleakModel.default_adapter._scanning  # stopped once both were found
+    await BleakModel.clean_up_all()
+
+
+@pytest.mark.asyncio
+async def test_stop_scan_ends_discovery(environment):
+    model = BleakModel(discovery_timeout=10.0)
+    assert await model.set_target("nowhere", discover=True)
+    connecting = asyncio.ensure_future(model.connect())
+    await asyncio.sleep(0.01)
+    await BleakModel.stop_scan()
+    assert not await asyncio.wait_for(connecting, 1.0)
+    assert model._failure_reason == "missing_device"
+    assert model.state == "TargetSet"
+    await model.clean_up()
+
+
+@pytest.mark.asyncio
+async def test_start_scan_restarts_discovery_scan_with_filters(environment):
+    model = BleakModel(discovery_timeout=10.0)
+    assert await model.set_target("nowhere", discover=True)
+    await asyncio.sleep(0.01)
+    await BleakModel.start_scan(service_uuids=[HEART_RATE_SERVICE_UUID])
+    await asyncio.sleep(0.05)
+    await BleakModel.stop_scan()
+    assert len(BleakModel.bt_devices) == 50  # only the heart rate monitors
+    await model.clean_up()
+
+
+@pytest.mark.asyncio
+async def test_connect_on_discovery_deadline(environment):
+    model = BleakModel(discovery_timeout=0.05)
+    assert not await model.set_target("nowhere")
+    assert await model.set_target("nowhere", discover=True)
+    assert not await model.connect()
+    assert model.state == "TargetSet"
+    assert BleakModel.default_adapter._pending_targets == {}
+    assert not BleakModel.default_adapter._scanning
+    await model.clean_up()
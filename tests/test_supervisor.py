@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from bleak_fsm import BleakModel, SimulatedEnvironment, TaskSupervisor
+
+
+@pytest.mark.asyncio
+async def test_errors_go_to_callback():
+    errors = []
+    supervisor = TaskSupervisor(on_error=lambda name, error: errors.append((name, error)))
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    supervisor.spawn(fail(), name="failing")
+    await asyncio.sleep(0.01)
+    assert [(name, str(error)) for name, error in errors] == [("failing", "boom")]
+    assert len(supervisor) == 0
+
+
+@pytest.mark.asyncio
+async def test_shutdown_waits_then_cancels():
+    supervisor = TaskSupervisor()
+    finished = []
+
+    async def quick():
+        await asyncio.sleep(0.01)
+        finished.append("quick")
+
+    async def stuck():
+        await asyncio.sleep(10)
+        finished.append("stuck")
+
+    quick_task = supervisor.spawn(quick(), name="work")
+    stuck_task = supervisor.spawn(stuck(), name="work")
+    other = supervisor.spawn(asyncio.sleep(10), name="other")
+    await supervisor.shutdown("work", grace=0.05)
+    assert finished == ["quick"]
+    assert quick_task.done() and stuck_task.cancelled()
+    assert supervisor.tasks() == [other]
+    await supervisor.shutdown()
+    assert len(supervisor) == 0
+
+
+@pytest.mark.asyncio
+async def test_shutdown_skips_calling_task():
+    supervisor = TaskSupervisor()
+
+    async def shut_down_siblings():
+        await supervisor.shutdown()
+        return "done"
+
+    sibling = supervisor.spawn(asyncio.sleep(10))
+    task = supervisor.spawn(shut_down_siblings())
+    assert await task == "done"
+    assert sibling.cancelled()
+
+
+@pytest.fixture
+def environment():
+    environment = SimulatedEnvironment(seed=0)
+    environment.add_devices(20, advertising_interval=0.005)
+    BleakModel.bt_devices.clear()
+    with environment.install():
+        yield environment
+    BleakModel.bt_devices.clear()
+
+
+@pytest.mark.asyncio
+async def test_rapid_scan_restarts(environment):
+    handler = asyncio.get_running_loop().get_exception_handler()
+    for _ in range(20):
+        await BleakModel.start_scan()
+        await asyncio.sleep(0)
+        await BleakModel.stop_scan()
+        assert environment.scanners == []  # the scanner is down when stop_scan returns
+        assert len(BleakModel.default_adapter._scan_tasks) == 0
+    await BleakModel.start_scan()
+    await BleakModel.start_scan()  # restarting stops the previous scanner first
+    await asyncio.sleep(0.01)
+    assert len(environment.scanners) == 1
+    await BleakModel.stop_scan()
+    assert asyncio.get_running_loop().get_exception_handler() is handler
+
+
+@pytest.mark.asyncio
+async def test_scan_failure_fails_pending_connects(environment, monkeypatch):
+    class BrokenScanner(environment.scanner_class):
+        async def start(self):
+            raise OSError("No Bluetooth adapter")
+
+    monkeypatch.setattr(BleakModel, "scanner_class", BrokenScanner)
+    model = BleakModel()
+    assert await model.set_target(next(iter(environment.devices)), discover=True)
+    assert not await model.connect()
+    assert isinstance(BleakModel.default_adapter.last_scan_error, OSError)
+    assert not BleakModel.default_adapter._scanning
+    await model.clean_up()
+
+
+@pytest.mark.asyncio
+async def test_task_failure_triggers_fault(environment):
+    address = next(iter(environment.devices))
+    device = environment.devices[address]
+    BleakModel.bt_devices[address] = (device.ble_device, device.advertisement_data)
+    model = BleakModel()
+    await model.set_target(address)
+    await model.connect()
+
+    async def reconnect():
+        raise RuntimeError("reconnect bug")
+
+    model._reconnect = reconnect
+    environment.drop(address)
+    await asyncio.sleep(0.01)
+    assert model.state == "TargetSet"
+    assert str(model.last_error) == "reconnect bug"
+    assert address in BleakModel.bt_devices
+    await model.clean_up()
+    assert len(model.tasks) == 0